@@ -1,28 +1,44 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import json
 import logging
 import os
+import random
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import Literal
+from typing import AsyncIterator, Literal
 
-import httpx
+import numpy as np
 from dotenv import load_dotenv
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 
-from backend.rag.embedding_index import EmbeddingRagIndex
+from backend import metrics
+from backend.http_clients import close_clients, get_client, open_clients
+from backend.llm_scheduler import LlmBusy, flight_key, get_scheduler, scheduler_stats
+from backend.rag.answer_cache import SemanticAnswerCache, context_key
+from backend.rag.context_pack import context_token_budget, estimate_tokens, pack_context
+from backend.rag.embedding_index import EmbeddingRagIndex, shutdown_scoring_pool
+from backend.rag.reindex_job import ReindexJobs
 from backend.rag.teacher_match import TeacherMatchService
+from backend.rag.teacher_profiles import TeacherProfileStore
+from backend.rag.writer_lock import IndexLocked
 
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
-DOCS_DIR = REPO_ROOT / "docs"
 FRONTEND_DIR = REPO_ROOT / "frontend"
 
 load_dotenv(REPO_ROOT / ".env", override=False)
 
+# Overridable so benchmarks / extra deployments can point the app at another corpus and state directory
+DOCS_DIR = Path(os.getenv("CAMPUS_DOCS_DIR") or REPO_ROOT / "docs")
+DATA_DIR = Path(os.getenv("CAMPUS_DATA_DIR") or REPO_ROOT / "data")
+
 logger = logging.getLogger("campus_assistant")
 
 
@@ -49,12 +65,50 @@ def _truncate(s: str, limit: int) -> str:
     return s[:limit] + f"...(truncated,{len(s)} chars)"
 
 
+def _clip(obj, limit: int):
+    if isinstance(obj, str):
+        return obj if limit <= 0 or len(obj) <= limit else obj[:limit]
+    if isinstance(obj, dict):
+        return {k: _clip(v, limit) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_clip(v, limit) for v in obj]
+    return obj
+
+
+class _LazyJson:
+    """
+    Log argument formatted only if the record is actually emitted; strings are clipped before dumping,
+    so the cost is bounded by the limit rather than by the prompt size.
+    """
+
+    __slots__ = ("obj", "limit")
+
+    def __init__(self, obj, limit: int):
+        self.obj = obj
+        self.limit = limit
+
+    def __str__(self) -> str:
+        return _truncate(json.dumps(_clip(self.obj, self.limit), ensure_ascii=False), self.limit)
+
+
+def _log_llm_io() -> bool:
+    """
+    Whether this LLM call logs its request/response: LOG_LLM_IO on, INFO enabled, and picked by
+    LOG_LLM_IO_SAMPLE (fraction of calls, 1 = all).
+    """
+    if not _bool_env("LOG_LLM_IO", default=True) or not logger.isEnabledFor(logging.INFO):
+        return False
+    rate = float(os.getenv("LOG_LLM_IO_SAMPLE", "1"))
+    return rate >= 1 or random.random() < rate
+
+
 class ChatRequest(BaseModel):
     message: str = Field(min_length=1, description="User message")
+    collection: str | None = Field(default=None, description="Only search this RAG collection (default: routed)")
 
 
 class ChatResponse(BaseModel):
-    type: Literal["answer", "human"]
+    type: Literal["answer", "human", "busy"]
     answer: str
 
 
@@ -72,23 +126,20 @@ async def call_ollama(messages: list[dict], model: str) -> str:
     Call local Ollama: https://ollama.com
     """
     base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
-    timeout = float(os.getenv("OLLAMA_TIMEOUT", "120"))
-    log_io = _bool_env("LOG_LLM_IO", default=True)
+    log_io = _log_llm_io()
     max_chars = int(os.getenv("LOG_LLM_MAX_CHARS", "4000"))
+    payload = {"model": model, "messages": messages, "stream": False}
     if log_io:
-        payload = {"model": model, "messages": messages, "stream": False}
-        logger.info("LLM request (ollama): %s", _truncate(json.dumps(payload, ensure_ascii=False), max_chars))
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        resp = await client.post(
-            f"{base_url}/api/chat",
-            json={"model": model, "messages": messages, "stream": False},
-        )
+        logger.info("LLM request (ollama): %s", _LazyJson(payload, max_chars))
+    with metrics.LlmTiming("ollama") as timing:
+        resp = await get_client("ollama").post(f"{base_url}/api/chat", json=payload)
         resp.raise_for_status()
         data = resp.json()
         out = (data.get("message") or {}).get("content", "").strip()
-        if log_io:
-            logger.info("LLM response (ollama): %s", _truncate(out, max_chars))
-        return out
+        timing.chars = len(out)
+    if log_io:
+        logger.info("LLM response (ollama): %s", _truncate(out, max_chars))
+    return out
 
 
 async def call_deepseek(messages: list[dict], model: str) -> str:
@@ -99,24 +150,94 @@ async def call_deepseek(messages: list[dict], model: str) -> str:
     if not api_key:
         return "系统未配置 `DEEPSEEK_API_KEY`，无法调用 DeepSeek。请先配置环境变量后重试。"
     base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com").rstrip("/")
-    timeout = float(os.getenv("DEEPSEEK_TIMEOUT", "60"))
-    log_io = _bool_env("LOG_LLM_IO", default=True)
+    log_io = _log_llm_io()
     max_chars = int(os.getenv("LOG_LLM_MAX_CHARS", "4000"))
+    payload = {"model": model, "messages": messages, "temperature": 0.3}
     if log_io:
-        payload = {"model": model, "messages": messages, "temperature": 0.3}
-        logger.info("LLM request (deepseek): %s", _truncate(json.dumps(payload, ensure_ascii=False), max_chars))
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        resp = await client.post(
+        logger.info("LLM request (deepseek): %s", _LazyJson(payload, max_chars))
+    with metrics.LlmTiming("deepseek") as timing:
+        resp = await get_client("deepseek").post(
             f"{base_url}/chat/completions",
             headers={"Authorization": f"Bearer {api_key}"},
-            json={"model": model, "messages": messages, "temperature": 0.3},
+            json=payload,
         )
         resp.raise_for_status()
         data = resp.json()
         out = (((data.get("choices") or [{}])[0].get("message") or {}).get("content") or "").strip()
-        if log_io:
-            logger.info("LLM response (deepseek): %s", _truncate(out, max_chars))
-        return out
+        timing.chars = len(out)
+    if log_io:
+        logger.info("LLM response (deepseek): %s", _truncate(out, max_chars))
+    return out
+
+
+async def stream_ollama(messages: list[dict], model: str) -> AsyncIterator[str]:
+    """
+    Ollama streaming chat: NDJSON lines {"message": {"content": "..."}, "done": bool}.
+    """
+    base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
+    log_io = _log_llm_io()
+    max_chars = int(os.getenv("LOG_LLM_MAX_CHARS", "4000"))
+    payload = {"model": model, "messages": messages, "stream": True}
+    if log_io:
+        logger.info("LLM request (ollama, stream): %s", _LazyJson(payload, max_chars))
+    parts: list[str] = []
+    with metrics.LlmTiming("ollama") as timing:
+        async with get_client("ollama").stream("POST", f"{base_url}/api/chat", json=payload) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                piece = (data.get("message") or {}).get("content") or ""
+                if piece:
+                    timing.first_output()
+                    timing.chars += len(piece)
+                    parts.append(piece)
+                    yield piece
+                if data.get("done"):
+                    break
+    if log_io:
+        logger.info("LLM response (ollama, stream): %s", _truncate("".join(parts).strip(), max_chars))
+
+
+async def stream_deepseek(messages: list[dict], model: str) -> AsyncIterator[str]:
+    """
+    DeepSeek streaming chat/completions: SSE lines "data: {choices:[{delta:{content}}]}" ... "data: [DONE]".
+    """
+    api_key = os.getenv("DEEPSEEK_API_KEY", "").strip()
+    if not api_key:
+        yield "系统未配置 `DEEPSEEK_API_KEY`，无法调用 DeepSeek。请先配置环境变量后重试。"
+        return
+    base_url = os.getenv("DEEPSEEK_BASE_URL", "https://api.deepseek.com").rstrip("/")
+    log_io = _log_llm_io()
+    max_chars = int(os.getenv("LOG_LLM_MAX_CHARS", "4000"))
+    payload = {"model": model, "messages": messages, "temperature": 0.3, "stream": True}
+    if log_io:
+        logger.info("LLM request (deepseek, stream): %s", _LazyJson(payload, max_chars))
+    parts: list[str] = []
+    with metrics.LlmTiming("deepseek") as timing:
+        async with get_client("deepseek").stream(
+            "POST",
+            f"{base_url}/chat/completions",
+            headers={"Authorization": f"Bearer {api_key}"},
+            json=payload,
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data_str = line[len("data:") :].strip()
+                if data_str == "[DONE]":
+                    break
+                data = json.loads(data_str)
+                delta = ((data.get("choices") or [{}])[0].get("delta") or {}).get("content") or ""
+                if delta:
+                    timing.first_output()
+                    timing.chars += len(delta)
+                    parts.append(delta)
+                    yield delta
+    if log_io:
+        logger.info("LLM response (deepseek, stream): %s", _truncate("".join(parts).strip(), max_chars))
 
 
 def get_llm_provider() -> str:
@@ -128,7 +249,20 @@ def get_llm_model() -> str:
     return os.getenv("LLM_MODEL", "qwen2.5:7b").strip()
 
 
-app = FastAPI(title="SHU Campus Assistant (Local RAG)")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # Pooled keep-alive clients for Ollama / DeepSeek live as long as the app
+    open_clients()
+    try:
+        yield
+    finally:
+        # An interrupted reindex resumes from its checkpoint next time
+        await reindex_jobs.cancel_running()
+        await close_clients()
+        shutdown_scoring_pool()
+
+
+app = FastAPI(title="SHU Campus Assistant (Local RAG)", lifespan=lifespan)
 _setup_logging()
 
 # Static frontend
@@ -153,8 +287,17 @@ def faq():
     return FileResponse(str(faq_file))
 
 
-teacher_service = TeacherMatchService(teachers_json_path=DOCS_DIR / "teachers-ms-shu.json")
-rag_index = EmbeddingRagIndex(docs_dir=DOCS_DIR, db_path=REPO_ROOT / "data" / "rag.sqlite")
+teacher_profiles = TeacherProfileStore(DATA_DIR / "teachers.sqlite")
+teacher_service = TeacherMatchService(teachers_json_path=DOCS_DIR / "teachers-ms-shu.json", profile_store=teacher_profiles)
+rag_index = EmbeddingRagIndex(docs_dir=DOCS_DIR, db_path=DATA_DIR / "rag.sqlite")
+# Started only after claim_writer() succeeded: the job releases the writer lock when it ends
+reindex_jobs = ReindexJobs(functools.partial(rag_index.reindex, claimed=True))
+answer_cache = SemanticAnswerCache(
+    DATA_DIR / "answer_cache.sqlite",
+    min_score=float(os.getenv("ANSWER_CACHE_MIN_SCORE", "0.95")),
+    max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000")),
+    enabled=_bool_env("ANSWER_CACHE_ENABLED", default=True),
+)
 
 
 @app.get("/api/health")
@@ -163,55 +306,159 @@ def health():
 
 @app.get("/api/rag/status")
 def rag_status():
-    return rag_index.status()
+    # Map a generation published by another worker before reporting
+    rag_index.ensure_loaded()
+    job = reindex_jobs.latest()
+    return {
+        **rag_index.status(),
+        "worker_pid": os.getpid(),
+        "reindex_job": job.to_dict() if job else None,
+        "answer_cache": answer_cache.stats(),
+        "teacher_profiles": teacher_profiles.stats(),
+    }
+
+
+@app.post("/api/rag/reindex", status_code=202)
+async def rag_reindex():
+    # Runs in the background; queries keep using the current snapshot until the new one is published.
+    # A reindex already in progress is returned instead of starting another one; otherwise the writer lock
+    # is taken here, before the job exists, and handed to it (409 when another worker or a publish holds it).
+    if reindex_jobs.current is None:
+        try:
+            rag_index.claim_writer()
+        except IndexLocked as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    job, created = reindex_jobs.start()
+    return {**job.to_dict(), "created": created, "status_url": f"/api/rag/reindex/{job.job_id}"}
+
+
+@app.get("/api/rag/reindex/{job_id}")
+def rag_reindex_job(job_id: str):
+    job = reindex_jobs.get(job_id)
+    if job is None:
+        # Jobs live in the worker that started them; /api/rag/status shows the index writer from any worker
+        raise HTTPException(status_code=404, detail="reindex job not found in this worker")
+    return job.to_dict()
+
+
+@app.get("/api/llm/status")
+def llm_status():
+    # Per-provider scheduler: running / queued generations, coalesced and shed requests, queue wait
+    return {"provider": get_llm_provider(), "model": get_llm_model(), "schedulers": scheduler_stats()}
+
+
+_SCHED_GAUGES = {
+    k: metrics.gauge(f"campus_llm_scheduler_{k}", help_text, ["provider"])
+    for k, help_text in (
+        ("running", "Generations running upstream."),
+        ("queued", "Generations waiting for a slot."),
+        ("in_flight", "Distinct prompts in flight (after coalescing)."),
+    )
+}
+_SCHED_COUNTERS = {
+    k: metrics.mirrored_counter(f"campus_llm_scheduler_{k}_total", help_text, ["provider"])
+    for k, help_text in (
+        ("submitted", "Generations admitted."),
+        ("coalesced", "Requests that joined an identical in-flight generation."),
+        ("shed", "Requests rejected because the queue was full."),
+        ("timeouts", "Requests that waited longer than the queue timeout."),
+        ("completed", "Generations completed."),
+        ("failed", "Generations failed or cancelled."),
+    )
+}
+_CACHE_SIZE = metrics.gauge("campus_cache_size", "Entries in the cache.", ["cache"])
+_CACHE_HITS = metrics.mirrored_counter("campus_cache_hits_total", "Cache hits.", ["cache"])
+_CACHE_MISSES = metrics.mirrored_counter("campus_cache_misses_total", "Cache misses.", ["cache"])
+_RAG_CHUNKS = metrics.gauge("campus_rag_chunks", "Chunks in the served snapshot.")
+_RAG_GENERATION = metrics.gauge("campus_rag_generation", "Generation of the served snapshot.")
 
 
-@app.post("/api/rag/reindex")
-async def rag_reindex():
-    return await rag_index.reindex()
+def _collect_status_metrics() -> None:
+    # Scheduler / cache stats are already kept as plain counters; copied in at scrape time
+    for provider, st in scheduler_stats().items():
+        for k, m in (*_SCHED_GAUGES.items(), *_SCHED_COUNTERS.items()):
+            m.set(st[k], provider=provider)
+    for name, st in (("query_embedding", rag_index.query_cache.stats()), ("answer", answer_cache.stats())):
+        _CACHE_SIZE.set(st["size"], cache=name)
+        _CACHE_HITS.set(st["hits"], cache=name)
+        _CACHE_MISSES.set(st["misses"], cache=name)
+    _RAG_CHUNKS.set(rag_index.served_chunks)
+    _RAG_GENERATION.set(rag_index.generation or 0)
 
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
-    msg = (req.message or "").strip()
-    logger.info("chat request: %s", _truncate(msg, int(os.getenv("LOG_MSG_MAX_CHARS", "500"))))
-    if msg == "人工":
-        return ChatResponse(type="human", answer="请联系学长：zhangdreamer@126.com")
+metrics.register_collector(_collect_status_metrics)
 
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+HUMAN_CONTACT = "请联系学长：zhangdreamer@126.com"
+BUSY_MESSAGE = "当前提问的同学较多，请稍后再试～"
+
+
+def _match_teachers(msg: str) -> tuple[list[dict], str | None]:
+    # Name scan + profile snippets from sqlite; runs on a worker thread next to the RAG search
+    with metrics.span("teacher_match"):
+        hits = teacher_service.find_mentions(msg)
+        return hits, teacher_service.build_teacher_context(hits) if hits else None
+
+
+async def build_chat_messages(msg: str, collection: str | None = None) -> tuple[list[dict], dict]:
+    """
+    RAG search + teacher matching -> LLM messages, plus metadata (sources / teacher hits) for the client.
+    """
     context_blocks: list[str] = []
 
-    # Embedding RAG (TopK chunks from docs/*.md)
+    # Embedding RAG (TopK chunks from the documents in docs/) and teacher mentions are independent:
+    # run them concurrently (the search itself overlaps the query embedding with the BM25 side)
     top_k = int(os.getenv("RAG_TOP_K", "5"))
     rag_min_score = float(os.getenv("RAG_MIN_SCORE", "0.38"))
     rag_min_keyword_hits = int(os.getenv("RAG_MIN_KEYWORD_HITS", "1"))
-    rag_hits = await rag_index.search(
-        msg,
-        top_k=top_k,
-        min_score=rag_min_score,
-        min_keyword_hits=rag_min_keyword_hits,
+    rag_hits, (teacher_hits, teacher_block) = await asyncio.gather(
+        rag_index.search(
+            msg,
+            top_k=top_k,
+            min_score=rag_min_score,
+            min_keyword_hits=rag_min_keyword_hits,
+            collection=collection,
+        ),
+        asyncio.to_thread(_match_teachers, msg),
     )
+    # Teacher info is placed after the RAG block, but counted against the budget first
+    if teacher_hits:
+        logger.info("Teacher hits: %s", _LazyJson(teacher_hits, 0))
+    else:
+        logger.info("Teacher hits: none")
+    sources = [
+        {
+            "chunk_id": h["chunk_id"],
+            "collection": h.get("collection", ""),
+            "source": h["source"],
+            "chunk_index": h["chunk_index"],
+            "heading": h.get("heading", ""),
+            "score": round(float(h["score"]), 4),
+            "keyword_hits": int(h.get("keyword_hits", 0)),
+        }
+        for h in rag_hits
+    ]
     if rag_hits:
-        logger.info(
-            "RAG hits: %s",
-            json.dumps(
-                [
-                    {
-                        "source": h["source"],
-                        "chunk_index": h["chunk_index"],
-                        "score": round(float(h["score"]), 4),
-                        "keyword_hits": int(h.get("keyword_hits", 0)),
-                    }
-                    for h in rag_hits
-                ],
-                ensure_ascii=False,
-            ),
-        )
-        lines = ["【本地资料片段：Embedding RAG TopK】"]
-        for h in rag_hits:
-            lines.append(f"- 来源：{h['source']}#{h['chunk_index']}（score={h['score']:.3f}）")
-            lines.append(h["text"])
-            lines.append("")  # spacer
-        context_blocks.append("\n".join(lines).strip())
+        logger.info("RAG hits: %s", _LazyJson(sources, 0))
+        with metrics.span("prompt"):
+            # Merge adjacent chunks, drop repeated spans, and fit the token budget (best blocks first)
+            budget = context_token_budget()
+            if budget > 0 and teacher_block:
+                budget = max(1, budget - estimate_tokens(teacher_block))
+            blocks, pack_stats = pack_context(rag_hits, budget)
+            lines = ["【本地资料片段：Embedding RAG TopK】"]
+            for b in blocks:
+                section = f"｜{b.heading}" if b.heading else ""
+                lines.append(f"- 来源：{b.label}{section}（score={b.score:.3f}）")
+                lines.append(b.text)
+                lines.append("")  # spacer
+            context_blocks.append("\n".join(lines).strip())
+        logger.info("RAG context packed: %s", _LazyJson(pack_stats, 0))
     else:
         logger.info(
             "<-------- RAG hits: none (filtered). min_score=%s min_keyword_hits=%s top_k=%s",
@@ -220,15 +467,8 @@ async def chat(req: ChatRequest):
             top_k,
         )
 
-    # Feature: teacher mention -> add teacher info
-    teacher_hits = teacher_service.find_mentions(msg)
-    if teacher_hits:
-        logger.info("Teacher hits: %s", json.dumps(teacher_hits, ensure_ascii=False))
-        t = teacher_service.build_teacher_context(teacher_hits)
-        if t:
-            context_blocks.append(t.strip())
-    else:
-        logger.info("Teacher hits: none")
+    if teacher_block:
+        context_blocks.append(teacher_block.strip())
 
     context = "\n\n".join(context_blocks).strip()
     user_content = msg if not context else f"{context}\n\n【用户问题】\n{msg}"
@@ -237,21 +477,167 @@ async def chat(req: ChatRequest):
         {"role": "system", "content": build_system_prompt()},
         {"role": "user", "content": user_content},
     ]
+    return messages, {"sources": sources, "teachers": teacher_hits}
+
+
+def _llm_configured(provider: str) -> bool:
+    return provider != "deepseek" or bool(os.getenv("DEEPSEEK_API_KEY", "").strip())
+
+
+async def answer_cache_key(msg: str, meta: dict) -> tuple[np.ndarray, str] | None:
+    """
+    (query embedding, retrieved-context key) for the semantic answer cache; None disables caching for this request.
+    """
+    if not answer_cache.enabled or not rag_index.docs_fingerprint:
+        return None
+    try:
+        q_emb = await rag_index.embed_query(msg)  # LRU hit: search() just embedded the same text
+    except Exception as e:
+        logger.warning("Answer cache skipped: query embedding failed: %s: %s", type(e).__name__, e)
+        return None
+    answer_cache.sync_fingerprint(rag_index.docs_fingerprint)
+    ctx = context_key([int(x["chunk_id"]) for x in meta["sources"]], [str(t["name"]) for t in meta["teachers"]])
+    return q_emb, ctx
+
+
+def _finish_trace(endpoint: str, outcome: str, t0: float, trace: dict) -> None:
+    """
+    Request total into the stage histogram + outcome counter, and one compact per-stage line in the log.
+    """
+    metrics.record(endpoint, time.perf_counter() - t0)
+    metrics.CHAT_REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+    if _bool_env("LOG_CHAT_TRACE", default=True):
+        logger.info("chat trace (%s, %s): %s", endpoint, outcome, _LazyJson(trace, 0))
+
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(req: ChatRequest):
+    msg = (req.message or "").strip()
+    logger.info("chat request: %s", _truncate(msg, int(os.getenv("LOG_MSG_MAX_CHARS", "500"))))
+    trace = metrics.start_trace()
+    t0 = time.perf_counter()
+    resp, outcome = await _chat_answer(msg, req.collection)
+    _finish_trace("chat", outcome, t0, trace)
+    return resp
+
+
+async def _chat_answer(msg: str, collection: str | None = None) -> tuple[ChatResponse, str]:
+    if msg == "人工":
+        return ChatResponse(type="human", answer=HUMAN_CONTACT), "human"
+
+    messages, meta = await build_chat_messages(msg, collection)
 
     provider = get_llm_provider()
     model = get_llm_model()
 
+    cache_key = await answer_cache_key(msg, meta)
+    if cache_key is not None:
+        cached = await asyncio.to_thread(answer_cache.lookup, provider, model, cache_key[1], cache_key[0])
+        if cached:
+            logger.info("Answer cache hit (provider=%s model=%s)", provider, model)
+            return ChatResponse(type="answer", answer=cached), "cached"
+
+    # Identical in-flight prompts share one generation; over the queue limit we answer "busy" right away
+    scheduler = get_scheduler(provider)
+    key = flight_key(provider, model, messages)
     try:
         if provider == "deepseek":
-            answer = await call_deepseek(messages, model=model)
+            answer = await scheduler.call(key, lambda: call_deepseek(messages, model=model))
         else:
-            answer = await call_ollama(messages, model=model)
+            answer = await scheduler.call(key, lambda: call_ollama(messages, model=model))
+    except LlmBusy as e:
+        logger.warning("LLM busy, request shed: %s", e)
+        return ChatResponse(type="busy", answer=BUSY_MESSAGE), "busy"
     except Exception as e:
         logger.exception("LLM call failed")
-        return ChatResponse(type="answer", answer=f"调用模型失败：{type(e).__name__}: {e}")
+        return ChatResponse(type="answer", answer=f"调用模型失败：{type(e).__name__}: {e}"), "error"
 
     if not answer:
         answer = "（模型返回为空）"
-    return ChatResponse(type="answer", answer=answer)
+    elif cache_key is not None and _llm_configured(provider):
+        await asyncio.to_thread(
+            answer_cache.store, provider, model, cache_key[1], msg, cache_key[0], answer, rag_index.docs_fingerprint
+        )
+    return ChatResponse(type="answer", answer=answer), "answer"
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Server-Sent Events:
+    - meta  {sources, teachers, provider, model, cached}  (once, before generation starts)
+    - token {t}                                    (incremental answer text)
+    - done  {}                                     / error {message} / human {answer} / busy {answer}
+    """
+    msg = (req.message or "").strip()
+    logger.info("chat stream request: %s", _truncate(msg, int(os.getenv("LOG_MSG_MAX_CHARS", "500"))))
+
+    async def events():
+        trace = metrics.start_trace()
+        t0 = time.perf_counter()
+        # Replaced as the request progresses; stays "cancelled" if the client goes away first
+        state = {"outcome": "cancelled"}
+        try:
+            async for ev in _stream_events(state, t0):
+                yield ev
+        finally:
+            _finish_trace("chat_stream", state["outcome"], t0, trace)
+
+    async def _stream_events(state: dict, t0: float):
+        if msg == "人工":
+            state["outcome"] = "human"
+            yield _sse("human", {"answer": HUMAN_CONTACT})
+            return
+        provider = get_llm_provider()
+        model = get_llm_model()
+        try:
+            messages, meta = await build_chat_messages(msg, req.collection)
+            cache_key = await answer_cache_key(msg, meta)
+            cached = None
+            if cache_key is not None:
+                cached = await asyncio.to_thread(answer_cache.lookup, provider, model, cache_key[1], cache_key[0])
+            yield _sse("meta", {**meta, "provider": provider, "model": model, "cached": bool(cached)})
+            if cached:
+                logger.info("Answer cache hit (provider=%s model=%s)", provider, model)
+                state["outcome"] = "cached"
+                yield _sse("token", {"t": cached})
+                yield _sse("done", {})
+                return
+            upstream = stream_deepseek if provider == "deepseek" else stream_ollama
+            stream = get_scheduler(provider).stream(
+                flight_key(provider, model, messages), lambda: upstream(messages, model=model)
+            )
+            parts: list[str] = []
+            async for piece in stream:
+                if not parts:
+                    # What the user waits for: request start -> first token on the wire (incl. queueing)
+                    metrics.record("first_token", time.perf_counter() - t0)
+                parts.append(piece)
+                yield _sse("token", {"t": piece})
+            answer = "".join(parts).strip()
+            if not answer:
+                yield _sse("token", {"t": "（模型返回为空）"})
+            elif cache_key is not None and _llm_configured(provider):
+                await asyncio.to_thread(
+                    answer_cache.store, provider, model, cache_key[1], msg, cache_key[0], answer, rag_index.docs_fingerprint
+                )
+            state["outcome"] = "answer"
+            yield _sse("done", {})
+        except LlmBusy as e:
+            logger.warning("LLM busy, stream request shed: %s", e)
+            state["outcome"] = "busy"
+            yield _sse("busy", {"answer": BUSY_MESSAGE})
+        except Exception as e:
+            logger.exception("LLM stream failed")
+            state["outcome"] = "error"
+            yield _sse("error", {"message": f"调用模型失败：{type(e).__name__}: {e}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import importlib.util
+import logging
+import os
+
+import httpx
+
+
+logger = logging.getLogger("campus_assistant")
+
+# One application-lifetime client per upstream ("ollama", "deepseek"); opened in the FastAPI lifespan,
+# created lazily when used outside the app (scripts, benchmarks).
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def _env_float(name: str, default: float) -> float:
+    v = os.getenv(name)
+    return float(v) if v not in (None, "") else default
+
+
+def _env_int(name: str, default: int) -> int:
+    v = os.getenv(name)
+    return int(v) if v not in (None, "") else default
+
+
+def _http2_enabled(prefix: str, default: bool) -> bool:
+    v = os.getenv(f"{prefix}_HTTP2")
+    want = default if v is None else v.strip().lower() in {"1", "true", "yes", "y", "on"}
+    if want and importlib.util.find_spec("h2") is None:
+        logger.info("%s_HTTP2 requested but the 'h2' package is not installed; using HTTP/1.1", prefix)
+        return False
+    return want
+
+
+def _build_client(name: str) -> httpx.AsyncClient:
+    """
+    Per-upstream settings, all overridable by env (<PREFIX> = OLLAMA / DEEPSEEK):
+    - <PREFIX>_TIMEOUT (read/write/pool) and <PREFIX>_CONNECT_TIMEOUT
+    - <PREFIX>_MAX_CONNECTIONS, <PREFIX>_MAX_KEEPALIVE, <PREFIX>_KEEPALIVE_EXPIRY
+    - <PREFIX>_HTTP2 (DeepSeek defaults to on when 'h2' is installed; Ollama is plain HTTP/1.1)
+    """
+    prefix = name.upper()
+    defaults = {
+        "ollama": {"timeout": 120.0, "http2": False},
+        "deepseek": {"timeout": 60.0, "http2": True},
+    }[name]
+    timeout = _env_float(f"{prefix}_TIMEOUT", defaults["timeout"])
+    limits = httpx.Limits(
+        max_connections=_env_int(f"{prefix}_MAX_CONNECTIONS", 20),
+        max_keepalive_connections=_env_int(f"{prefix}_MAX_KEEPALIVE", 10),
+        keepalive_expiry=_env_float(f"{prefix}_KEEPALIVE_EXPIRY", 60.0),
+    )
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=_env_float(f"{prefix}_CONNECT_TIMEOUT", 10.0)),
+        limits=limits,
+        http2=_http2_enabled(prefix, defaults["http2"]),
+    )
+
+
+def get_client(name: str) -> httpx.AsyncClient:
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        client = _clients[name] = _build_client(name)
+    return client
+
+
+def open_clients() -> None:
+    for name in ("ollama", "deepseek"):
+        get_client(name)
+
+
+async def close_clients() -> None:
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+
+logger = logging.getLogger("campus_assistant")
+
+
+class LlmBusy(Exception):
+    """
+    Raised instead of queueing when a provider's wait queue is full (or a queued call waited too long).
+    """
+
+
+def _env_int(name: str, default: int) -> int:
+    v = os.getenv(name)
+    return int(v) if v not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    v = os.getenv(name)
+    return float(v) if v not in (None, "") else default
+
+
+def flight_key(provider: str, model: str, messages: list[dict]) -> str:
+    """
+    Identity of an upstream generation: identical prompts to the same model share one call
+    (streaming and non-streaming callers alike).
+    """
+    h = hashlib.sha1()
+    h.update(json.dumps([provider, model, messages], ensure_ascii=False, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()
+
+
+class _Flight:
+    """
+    One upstream generation shared by every request that asked for the same prompt while it was in flight.
+    Output pieces are buffered, so a late joiner replays what was already produced and then follows live.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.parts: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self.subscribers = 0
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    def _notify(self) -> None:
+        ev, self._changed = self._changed, asyncio.Event()
+        ev.set()
+
+    def push(self, piece: str) -> None:
+        self.parts.append(piece)
+        self._notify()
+
+    def finish(self, error: BaseException | None = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            ev = self._changed
+            while i < len(self.parts):
+                yield self.parts[i]
+                i += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await ev.wait()
+
+
+class LlmScheduler:
+    """
+    Admission control for one LLM provider:
+    - single-flight: identical in-flight prompts are coalesced into one upstream call
+    - at most `max_concurrency` generations run at once; up to `max_queue` more wait for a slot
+    - beyond that (or after waiting `queue_timeout` seconds) callers get LlmBusy right away
+    The upstream call runs as its own task; it is cancelled only when every caller waiting on it has gone.
+    """
+
+    def __init__(self, name: str, *, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = float(queue_timeout)
+        self._sem: asyncio.Semaphore | None = None
+        self._flights: dict[str, _Flight] = {}
+        self.running = 0
+        self.queued = 0
+        self.submitted = 0
+        self.coalesced = 0
+        self.shed = 0
+        self.timeouts = 0
+        self.completed = 0
+        self.failed = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.max_queued = 0
+
+    @classmethod
+    def from_env(cls, name: str) -> LlmScheduler:
+        """
+        <PREFIX>_MAX_CONCURRENCY / <PREFIX>_MAX_QUEUE / <PREFIX>_QUEUE_TIMEOUT, PREFIX = OLLAMA / DEEPSEEK.
+        """
+        prefix = name.upper()
+        defaults = {"ollama": (2, 32), "deepseek": (8, 64)}.get(name, (4, 32))
+        return cls(
+            name,
+            max_concurrency=_env_int(f"{prefix}_MAX_CONCURRENCY", defaults[0]),
+            max_queue=_env_int(f"{prefix}_MAX_QUEUE", defaults[1]),
+            queue_timeout=_env_float(f"{prefix}_QUEUE_TIMEOUT", 60.0),
+        )
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self._sem
+
+    def _admit(self, key: str, produce: Callable[[_Flight], Awaitable[None]]) -> _Flight:
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            return flight
+        if self.running + self.queued >= self.max_concurrency + self.max_queue:
+            self.shed += 1
+            raise LlmBusy(f"{self.name}: {self.running} running, {self.queued} queued")
+        self.submitted += 1
+        # Counted as queued from admission on (the task may not have started yet), until it gets a slot
+        self.queued += 1
+        self.max_queued = max(self.max_queued, self.queued)
+        flight = self._flights[key] = _Flight(key)
+        flight.task = asyncio.ensure_future(self._run(key, flight, produce))
+        return flight
+
+    async def _run(self, key: str, flight: _Flight, produce: Callable[[_Flight], Awaitable[None]]) -> None:
+        sem = self._semaphore()
+        t0 = time.perf_counter()
+        try:
+            try:
+                await asyncio.wait_for(sem.acquire(), timeout=self.queue_timeout if self.queue_timeout > 0 else None)
+            finally:
+                self.queued -= 1
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._forget(key, flight)
+            flight.finish(LlmBusy(f"{self.name}: waited {self.queue_timeout}s for a generation slot"))
+            return
+        except BaseException as e:
+            self._forget(key, flight)
+            flight.finish(e if isinstance(e, Exception) else asyncio.CancelledError())
+            raise
+
+        waited = time.perf_counter() - t0
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.running += 1
+        try:
+            await produce(flight)
+            self.completed += 1
+            flight.finish()
+        except BaseException as e:
+            self.failed += 1
+            flight.finish(e if isinstance(e, Exception) else asyncio.CancelledError())
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            self.running -= 1
+            sem.release()
+            self._forget(key, flight)
+
+    def _forget(self, key: str, flight: _Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    async def _follow(self, flight: _Flight) -> AsyncIterator[str]:
+        flight.subscribers += 1
+        try:
+            async for piece in flight.follow():
+                yield piece
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done and flight.task is not None:
+                # Every caller left (e.g. clients disconnected): stop generating, and let no one join the dying flight
+                self._forget(flight.key, flight)
+                flight.task.cancel()
+
+    async def call(self, key: str, fn: Callable[[], Awaitable[str]]) -> str:
+        """
+        Non-streaming generation through the scheduler. Raises LlmBusy when shedding load.
+        """
+
+        async def produce(flight: _Flight) -> None:
+            flight.push(await fn())
+
+        flight = self._admit(key, produce)
+        return "".join([piece async for piece in self._follow(flight)])
+
+    def stream(self, key: str, fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """
+        Streaming generation through the scheduler. Admission happens right here, so LlmBusy for a full
+        queue is raised before the first token; a queue timeout surfaces as LlmBusy while iterating.
+        """
+
+        async def produce(flight: _Flight) -> None:
+            async for piece in fn():
+                flight.push(piece)
+
+        return self._follow(self._admit(key, produce))
+
+    def stats(self) -> dict:
+        started = self.completed + self.failed + self.running
+        return {
+            "provider": self.name,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "running": self.running,
+            "queued": self.queued,
+            "max_queued": self.max_queued,
+            "in_flight": len(self._flights),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "shed": self.shed,
+            "timeouts": self.timeouts,
+            "completed": self.completed,
+            "failed": self.failed,
+            "avg_wait_ms": round(self.wait_seconds * 1000 / started, 2) if started else None,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+        }
+
+
+_schedulers: dict[str, LlmScheduler] = {}
+
+
+def get_scheduler(name: str) -> LlmScheduler:
+    sched = _schedulers.get(name)
+    if sched is None:
+        sched = _schedulers[name] = LlmScheduler.from_env(name)
+    return sched
+
+
+def scheduler_stats() -> dict:
+    return {name: s.stats() for name, s in sorted(_schedulers.items())}
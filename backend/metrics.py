@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import contextvars
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterable
+
+
+logger = logging.getLogger("campus_assistant")
+
+# Seconds; covers sub-millisecond scoring up to multi-minute local generations
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    @abstractmethod
+    def _samples(self) -> list[str]:
+        """
+        Exposition lines of every label set (without HELP / TYPE).
+        """
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    """
+    Value set at scrape time by a collector (see register_collector).
+    """
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class MirroredCounter(Gauge):
+    """
+    Monotonic total owned elsewhere (scheduler / cache stats), copied in at scrape time.
+    """
+
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        # index of the first bucket >= value (linear: ~17 buckets, cheaper than bisect's call overhead here)
+        i = 0
+        for b in self.buckets:
+            if value <= b:
+                break
+            i += 1
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][i] += 1
+            series[1][0] += value
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, (list(c), s[0])) for k, (c, s) in self._series.items())
+        out: list[str] = []
+        for key, (counts, total) in items:
+            acc = 0
+            for b, c in zip((*self.buckets, math.inf), counts):
+                acc += c
+                le = 'le="%s"' % _num(b)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(round(total, 6))}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {acc}")
+        return out
+
+
+_REGISTRY: list[_Metric] = []
+_COLLECTORS: list[Callable[[], None]] = []
+
+
+def _register(metric):
+    _REGISTRY.append(metric)
+    return metric
+
+
+def counter(name: str, help_text: str, labelnames: Iterable[str] = ()) -> Counter:
+    return _register(Counter(name, help_text, labelnames))
+
+
+def gauge(name: str, help_text: str, labelnames: Iterable[str] = ()) -> Gauge:
+    return _register(Gauge(name, help_text, labelnames))
+
+
+def mirrored_counter(name: str, help_text: str, labelnames: Iterable[str] = ()) -> MirroredCounter:
+    return _register(MirroredCounter(name, help_text, labelnames))
+
+
+def histogram(name: str, help_text: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram(name, help_text, labelnames, buckets))
+
+
+def register_collector(fn: Callable[[], None]) -> None:
+    """
+    `fn` runs on every scrape, e.g. to copy scheduler / cache stats into gauges.
+    """
+    _COLLECTORS.append(fn)
+
+
+def render() -> str:
+    """
+    Prometheus text exposition format (version 0.0.4).
+    """
+    for fn in _COLLECTORS:
+        try:
+            fn()
+        except Exception as e:
+            logger.warning("metrics collector failed: %s: %s", type(e).__name__, e)
+    lines: list[str] = []
+    for m in _REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- chat pipeline ----------------------------------------------------------------------------
+
+STAGE_SECONDS = histogram(
+    "campus_stage_seconds",
+    "Latency of one chat pipeline stage (embed_query, route, lexical, vector, rerank, fuse, teacher_match, prompt, llm_ttfb, llm_total, first_token, chat, chat_stream).",
+    ["stage"],
+)
+CHAT_REQUESTS = counter("campus_chat_requests_total", "Chat requests by endpoint and outcome.", ["endpoint", "outcome"])
+LLM_CALLS = counter("campus_llm_calls_total", "Upstream LLM generations by provider and outcome.", ["provider", "outcome"])
+LLM_TTFB_SECONDS = histogram("campus_llm_ttfb_seconds", "Upstream LLM time to first output (streamed generations).", ["provider"])
+LLM_SECONDS = histogram("campus_llm_seconds", "Upstream LLM total generation time.", ["provider"])
+LLM_OUTPUT_CHARS = counter("campus_llm_output_chars_total", "Characters generated by the upstream LLM.", ["provider"])
+
+# Per-request trace: stage -> milliseconds, filled by span() while a trace is active
+_trace: contextvars.ContextVar[dict | None] = contextvars.ContextVar("campus_trace", default=None)
+
+
+def start_trace() -> dict:
+    trace: dict = {}
+    _trace.set(trace)
+    return trace
+
+
+def record(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    trace = _trace.get()
+    if trace is not None:
+        trace[stage] = round(trace.get(stage, 0.0) + seconds * 1000, 2)
+
+
+class span:
+    """
+    with span("vector"): ...  -- times one stage into the stage histogram and the current request trace.
+    Plain perf_counter bookkeeping; nothing is formatted or logged here.
+    """
+
+    __slots__ = ("stage", "_t0")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self._t0)
+        return False
+
+
+class LlmTiming:
+    """
+    Times one upstream generation: first_output() marks TTFB (streamed generations only), the context exit
+    the total.
+    Only the real upstream call is timed, not callers coalesced onto it.
+    """
+
+    __slots__ = ("provider", "_t0", "_ttfb", "chars")
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self._ttfb: float | None = None
+        self.chars = 0
+
+    def __enter__(self):
+        self._t0 = time.perf_counter()
+        return self
+
+    def first_output(self) -> None:
+        if self._ttfb is None:
+            self._ttfb = time.perf_counter() - self._t0
+            LLM_TTFB_SECONDS.observe(self._ttfb, provider=self.provider)
+            record("llm_ttfb", self._ttfb)
+
+    def __exit__(self, exc_type, exc, tb):
+        total = time.perf_counter() - self._t0
+        LLM_SECONDS.observe(total, provider=self.provider)
+        record("llm_total", total)
+        if exc_type is None:
+            outcome = "ok"
+        elif not issubclass(exc_type, Exception):
+            # CancelledError / GeneratorExit: every caller left
+            outcome = "cancelled"
+        else:
+            outcome = "error"
+        LLM_CALLS.inc(provider=self.provider, outcome=outcome)
+        LLM_OUTPUT_CHARS.inc(self.chars, provider=self.provider)
+        return False
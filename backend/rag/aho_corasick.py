@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Iterable
+
+
+OVERLAP_MODES = ("none", "all")
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher: one pass over the text finds every occurrence of every pattern,
+    independent of the number of patterns (O(len(text) + matches)).
+
+    Built once per pattern set; matching is read-only, so one automaton can be shared across threads.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: list[str] = []
+        # Trie as one dict of transitions per node; node 0 is the root
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # Pattern id ending exactly at this node (-1 if none), and the nearest proper suffix node that ends one
+        self._out: list[int] = [-1]
+        self._dict_link: list[int] = [-1]
+
+        seen: set[str] = set()
+        for p in patterns:
+            if not p or p in seen:
+                continue
+            seen.add(p)
+            self._insert(p, len(self.patterns))
+            self.patterns.append(p)
+        self._build_links()
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def _insert(self, pattern: str, pid: int) -> None:
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(-1)
+                self._dict_link.append(-1)
+            node = nxt
+        self._out[node] = pid
+
+    def _build_links(self) -> None:
+        # BFS: a node's failure link is the longest proper suffix of its path that is also a trie path
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                fc = self._fail[child]
+                self._dict_link[child] = fc if self._out[fc] >= 0 else self._dict_link[fc]
+                queue.append(child)
+
+    def iter_all(self, text: str) -> Iterable[tuple[int, int, int]]:
+        """
+        Every occurrence as (start, end, pattern id), overlapping and nested ones included, ordered by end.
+        """
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            m = node if out[node] >= 0 else dict_link[node]
+            while m > 0:
+                pid = out[m]
+                yield i + 1 - len(self.patterns[pid]), i + 1, pid
+                m = dict_link[m]
+
+    def find(self, text: str, *, overlap: str = "none") -> list[tuple[int, int, int]]:
+        """
+        Matches ordered by position in the text.
+        - overlap="none": leftmost-longest, non-overlapping (a longer name wins over a name it contains)
+        - overlap="all" : every occurrence, including overlapping and nested matches
+        """
+        if overlap not in OVERLAP_MODES:
+            raise ValueError(f"unknown overlap mode: {overlap!r} (expected one of {OVERLAP_MODES})")
+        matches = sorted(self.iter_all(text), key=lambda m: (m[0], -(m[1] - m[0])))
+        if overlap == "all":
+            return matches
+        picked: list[tuple[int, int, int]] = []
+        last_end = 0
+        for start, end, pid in matches:
+            if start >= last_end:
+                picked.append((start, end, pid))
+                last_end = end
+        return picked
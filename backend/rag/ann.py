@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+import time
+from pathlib import Path
+from typing import Protocol
+
+import numpy as np
+
+
+logger = logging.getLogger("campus_assistant")
+
+
+def top_k_cosine(matrix: np.ndarray, q_unit: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Score all rows of a pre-normalized matrix against a unit query vector.
+    Returns (row indices, scores) of the best k rows, best first.
+    """
+    if int(matrix.shape[0]) == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return top_k_scores(matrix @ q_unit, k)
+
+
+def top_k_scores(scores: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (positions, scores) of the best k entries of a score vector, best first.
+    """
+    n = int(scores.shape[0])
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    k = min(int(k), n)
+    if k < n:
+        idx = np.argpartition(-scores, k - 1)[:k]
+    else:
+        idx = np.arange(n)
+    idx = idx[np.argsort(-scores[idx], kind="stable")]
+    return idx, scores[idx]
+
+
+class VectorSearcher(Protocol):
+    name: str
+
+    def search(self, q_unit: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]: ...
+
+    def info(self) -> dict: ...
+
+
+class ExactSearcher:
+    """
+    Brute force: one mat-vec over every row.
+    """
+
+    name = "exact"
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = matrix
+
+    def search(self, q_unit: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        return top_k_cosine(self.matrix, q_unit, k)
+
+    def info(self) -> dict:
+        return {"backend": self.name, "rows": int(self.matrix.shape[0])}
+
+
+class IvfFlatSearcher:
+    """
+    IVF-flat: spherical k-means partitions rows into `nlist` inverted lists; a query scores the `nprobe`
+    closest centroids, then exact cosine over only the rows in those lists.
+    Recall/latency knob: nprobe (more lists probed -> higher recall, more rows scored).
+    """
+
+    name = "ivf"
+
+    def __init__(self, matrix: np.ndarray, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray, nprobe: int):
+        self.matrix = matrix
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.nprobe = max(1, int(nprobe))
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def build(cls, matrix: np.ndarray, *, nlist: int, nprobe: int, iters: int = 8, seed: int = 0) -> IvfFlatSearcher:
+        n = int(matrix.shape[0])
+        nlist = max(1, min(int(nlist), n))
+        rng = np.random.default_rng(seed)
+        sample_n = min(n, max(nlist * 64, 10000))
+        sample = np.asarray(matrix[np.sort(rng.choice(n, size=sample_n, replace=False))], dtype=np.float32)
+
+        centroids = sample[rng.choice(sample_n, size=nlist, replace=False)].copy()
+        for _ in range(max(1, int(iters))):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Re-seed empty lists from random sample rows
+                sums[empty] = sample[rng.choice(sample_n, size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.maximum(norms, 1e-12)
+
+        assign = np.empty(n, dtype=np.int32)
+        for start in range(0, n, 65536):
+            block = np.asarray(matrix[start : start + 65536], dtype=np.float32)
+            assign[start : start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        counts = np.bincount(assign, minlength=nlist)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(matrix, centroids.astype(np.float32), offsets, order, nprobe)
+
+    def search(self, q_unit: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        nprobe = min(self.nprobe, self.nlist)
+        cscores = self.centroids @ q_unit
+        probe = np.argpartition(-cscores, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+        rows = np.concatenate([self.list_rows[self.list_offsets[c] : self.list_offsets[c + 1]] for c in probe])
+        if rows.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows.sort()  # sequential access into the (memory-mapped) matrix
+        local, scores = top_k_cosine(self.matrix[rows], q_unit, k)
+        return rows[local].astype(np.int64), scores
+
+    def save(self, path: Path) -> None:
+        # Per-process temp name: two workers may build the same generation's lists at once
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp.npz")
+        np.savez(tmp, centroids=self.centroids, list_offsets=self.list_offsets, list_rows=self.list_rows)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, matrix: np.ndarray, nprobe: int) -> IvfFlatSearcher | None:
+        try:
+            with np.load(path) as z:
+                centroids, offsets, rows = z["centroids"], z["list_offsets"], z["list_rows"]
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            return None
+        if rows.shape[0] != matrix.shape[0] or centroids.shape[1] != matrix.shape[1]:
+            return None
+        return cls(matrix, centroids, offsets, rows, nprobe)
+
+    def info(self) -> dict:
+        return {"backend": self.name, "rows": int(self.matrix.shape[0]), "nlist": self.nlist, "nprobe": self.nprobe}
+
+
+def ann_backend() -> str:
+    # exact | ivf | auto (ivf once the corpus has >= RAG_ANN_MIN_ROWS chunks)
+    return os.getenv("RAG_ANN_BACKEND", "auto").strip().lower() or "auto"
+
+
+def default_nlist(n: int) -> int:
+    v = int(os.getenv("RAG_IVF_NLIST", "0"))
+    return v if v > 0 else max(1, int(math.sqrt(max(1, n))))
+
+
+def default_nprobe() -> int:
+    return max(1, int(os.getenv("RAG_IVF_NPROBE", "16")))
+
+
+def open_searcher(matrix: np.ndarray, ivf_path: Path, *, build_if_missing: bool = True) -> VectorSearcher:
+    """
+    Pick the configured backend for a snapshot matrix; IVF lists are persisted next to the snapshot files.
+    """
+    n = int(matrix.shape[0])
+    backend = ann_backend()
+    if backend == "auto":
+        backend = "ivf" if n >= int(os.getenv("RAG_ANN_MIN_ROWS", "20000")) else "exact"
+    if backend != "ivf" or n == 0:
+        return ExactSearcher(matrix)
+
+    nlist = default_nlist(n)
+    nprobe = default_nprobe()
+    ivf = IvfFlatSearcher.load(ivf_path, matrix, nprobe)
+    if ivf is not None and ivf.nlist == min(nlist, n):
+        return ivf
+    if not build_if_missing:
+        return ExactSearcher(matrix)
+    t0 = time.time()
+    ivf = IvfFlatSearcher.build(matrix, nlist=nlist, nprobe=nprobe)
+    ivf.save(ivf_path)
+    logger.info("RAG IVF index built: rows=%s nlist=%s seconds=%s", n, ivf.nlist, round(time.time() - t0, 2))
+    return ivf
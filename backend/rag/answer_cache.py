@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+logger = logging.getLogger("campus_assistant")
+
+
+def context_key(chunk_ids: list[int], teacher_names: list[str] | None = None) -> str:
+    """
+    Identity of the retrieved context: an answer is only reusable if the same chunks (and teacher hits) were fed in.
+    """
+    h = hashlib.sha1()
+    h.update(",".join(str(int(i)) for i in sorted(chunk_ids)).encode("utf-8"))
+    h.update(b"|")
+    h.update(",".join(sorted(teacher_names or [])).encode("utf-8"))
+    return h.hexdigest()
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache for near-duplicate questions, persisted in its own sqlite file next to rag.sqlite.
+
+    Lookup key: (provider, model, retrieved-context key) must match exactly, and the query embedding must be
+    within cosine >= min_score of a stored question. All entries belong to one docs fingerprint; when the
+    served index fingerprint changes, older entries are dropped.
+    """
+
+    def __init__(self, db_path: Path, *, min_score: float = 0.95, max_entries: int = 5000, enabled: bool = True):
+        self.db_path = db_path
+        self.min_score = float(min_score)
+        self.max_entries = max(1, int(max_entries))
+        self.enabled = bool(enabled)
+        self._lock = threading.RLock()
+        self._con: sqlite3.Connection | None = None
+        self._fingerprint: str | None = None
+        # (provider, model, ctx_key) -> (row ids, normalized query matrix, answers)
+        self._groups: dict[tuple[str, str, str], tuple[list[int], np.ndarray, list[str]]] = {}
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.lookup_seconds = 0.0
+        if self.enabled:
+            self._init_db()
+            self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._con is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(self.db_path, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._con = con
+        return self._con
+
+    def _init_db(self) -> None:
+        with self._lock, self._connect() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                  id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  provider TEXT NOT NULL,
+                  model TEXT NOT NULL,
+                  ctx_key TEXT NOT NULL,
+                  docs_fingerprint TEXT NOT NULL,
+                  query TEXT NOT NULL,
+                  embedding BLOB NOT NULL,
+                  answer TEXT NOT NULL,
+                  created_at REAL NOT NULL,
+                  hits INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_answers_fp ON answers(docs_fingerprint)")
+
+    def _load(self) -> None:
+        groups: dict[tuple[str, str, str], tuple[list[int], list[np.ndarray], list[str]]] = {}
+        fingerprints: set[str] = set()
+        with self._lock:
+            con = self._connect()
+            for row_id, provider, model, key, fp, blob, answer in con.execute(
+                "SELECT id, provider, model, ctx_key, docs_fingerprint, embedding, answer FROM answers ORDER BY id"
+            ):
+                g = groups.setdefault((provider, model, key), ([], [], []))
+                g[0].append(int(row_id))
+                g[1].append(np.frombuffer(blob, dtype="<f4"))
+                g[2].append(str(answer))
+                fingerprints.add(str(fp))
+            self._groups = {k: (ids, np.vstack(vecs), answers) for k, (ids, vecs, answers) in groups.items()}
+            self._size = sum(len(ids) for ids, _, _ in self._groups.values())
+            self._fingerprint = next(iter(fingerprints)) if len(fingerprints) == 1 else None
+
+    def sync_fingerprint(self, fingerprint: str | None) -> None:
+        """
+        Drop every entry that was produced against another docs fingerprint.
+        """
+        if not self.enabled or not fingerprint or fingerprint == self._fingerprint:
+            return
+        with self._lock:
+            if fingerprint == self._fingerprint:
+                return
+            with self._connect() as con:
+                n = con.execute("DELETE FROM answers WHERE docs_fingerprint != ?", (fingerprint,)).rowcount
+            if n:
+                self.invalidations += n
+                logger.info("Answer cache invalidated: %s entries (docs fingerprint changed)", n)
+            self._load()
+            self._fingerprint = fingerprint
+
+    def lookup(self, provider: str, model: str, ctx_key: str, query_embedding: np.ndarray) -> str | None:
+        if not self.enabled:
+            return None
+        t0 = time.perf_counter()
+        try:
+            group = self._groups.get((provider, model, ctx_key))
+            if group is not None:
+                ids, mat, answers = group
+                q = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+                if q.shape[0] == mat.shape[1]:
+                    q = q / max(1e-12, float(np.linalg.norm(q)))
+                    scores = mat @ q
+                    best = int(np.argmax(scores))
+                    if float(scores[best]) >= self.min_score:
+                        self.hits += 1
+                        with self._lock, self._connect() as con:
+                            con.execute("UPDATE answers SET hits = hits + 1 WHERE id=?", (ids[best],))
+                        return answers[best]
+            self.misses += 1
+            return None
+        finally:
+            self.lookup_seconds += time.perf_counter() - t0
+
+    def store(
+        self,
+        provider: str,
+        model: str,
+        ctx_key: str,
+        query: str,
+        query_embedding: np.ndarray,
+        answer: str,
+        fingerprint: str | None,
+    ) -> None:
+        if not self.enabled or not answer or not fingerprint:
+            return
+        self.sync_fingerprint(fingerprint)
+        q = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+        q = (q / max(1e-12, float(np.linalg.norm(q)))).astype("<f4")
+        with self._lock:
+            with self._connect() as con:
+                cur = con.execute(
+                    "INSERT INTO answers(provider, model, ctx_key, docs_fingerprint, query, embedding, answer, created_at) "
+                    "VALUES(?,?,?,?,?,?,?,?)",
+                    (provider, model, ctx_key, fingerprint, query, q.tobytes(), answer, time.time()),
+                )
+                row_id = int(cur.lastrowid)
+                over = self._size + 1 - self.max_entries
+                if over > 0:
+                    # Evict the least used / oldest entries
+                    con.execute(
+                        "DELETE FROM answers WHERE id IN (SELECT id FROM answers ORDER BY hits ASC, id ASC LIMIT ?)",
+                        (over,),
+                    )
+            if self._size + 1 > self.max_entries:
+                self._load()
+                return
+            key = (provider, model, ctx_key)
+            ids, mat, answers = self._groups.get(key, ([], np.zeros((0, q.shape[0]), dtype=np.float32), []))
+            if mat.shape[1] != q.shape[0]:
+                ids, mat, answers = [], np.zeros((0, q.shape[0]), dtype=np.float32), []
+            # New tuple -> concurrent readers keep a consistent (ids, matrix, answers) triple
+            self._groups[key] = (ids + [row_id], np.vstack([mat, q[None, :]]), answers + [answer])
+            self._size += 1
+            self.stores += 1
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "db_path": str(self.db_path),
+            "min_score": self.min_score,
+            "size": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "avg_lookup_ms": round(self.lookup_seconds * 1000 / total, 3) if total else None,
+        }
@@ -0,0 +1,228 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+
+# Bump when the chunking rules change: stored chunks are then rebuilt on the next reindex
+CHUNKER_VERSION = 2
+
+
+def _chunk_max_chars() -> int:
+    return max(200, int(os.getenv("RAG_CHUNK_MAX_CHARS", "900")))
+
+
+def _chunk_min_chars() -> int:
+    return max(50, int(os.getenv("RAG_CHUNK_MIN_CHARS", "300")))
+
+
+def chunker_signature() -> str:
+    """
+    Identity of the chunking rules + sizes; a different signature means every document must be re-chunked.
+    """
+    return f"v{CHUNKER_VERSION}:{_chunk_min_chars()}:{_chunk_max_chars()}"
+
+
+@dataclass(frozen=True)
+class DocChunk:
+    text: str
+    # Heading path at the start of the chunk, e.g. "第五编 婚姻家庭 > 第一章 一般规定"
+    heading: str = ""
+
+    @property
+    def embed_text(self) -> str:
+        """
+        What gets embedded / hashed / indexed: the heading path gives short chunks their context.
+        """
+        return f"{self.heading}\n{self.text}" if self.heading else self.text
+
+
+_NUM = "一二三四五六七八九十百千零〇两"
+_SPACE_RE = re.compile(r"[\s  　\xa0]+")
+_MD_HEADING_RE = re.compile(r"^(#{1,6})\s+(.+?)\s*#*$")
+_BOLD_RE = re.compile(r"^\*\*(.+?)\*\*$")
+_PART_RE = re.compile(rf"^第[{_NUM}\d]+\s*(编|章|节)(?:\s|$)")
+_SECTION_RE = re.compile(rf"^[{_NUM}]+、\s*\S")
+_ARTICLE_RE = re.compile(rf"^第[{_NUM}\d]+\s*条(?:\s|$)")
+_LIST_RE = re.compile(rf"^(?:[（(][{_NUM}\d]+[）)]|\d+[.、．)]|[-*+]\s|\|)")
+_CJK_GAP_RE = re.compile(r"(?<=[\u4e00-\u9fff]) (?=[\u4e00-\u9fff])")
+_PART_PREFIX_RE = re.compile(rf"^(第[{_NUM}\d]+[编章节])\s*")
+_SENTENCE_RE = re.compile(r"[^。！？!?]*[。！？!?]+[”’」』）)]*|[^。！？!?]+$")
+_PARA_END = tuple("。！？!?：:；;…")
+
+_PART_LEVELS = {"编": 2, "章": 3, "节": 4}
+
+
+def _clean(line: str) -> str:
+    return _SPACE_RE.sub(" ", line).strip()
+
+
+def _title(s: str) -> str:
+    # "第二编  物  权" / "**第一章 总 则**" -> "第二编 物权" / "第一章 总则"
+    s = _CJK_GAP_RE.sub("", s.strip("*# "))
+    return _PART_PREFIX_RE.sub(r"\1 ", s, count=1).strip()
+
+
+def _heading(line: str) -> tuple[int, str] | None:
+    """
+    (level, title) for heading lines: markdown "#", 编/章/节, "一、标题", or a short bold-only line.
+    Smaller level = higher in the tree.
+    """
+    m = _MD_HEADING_RE.match(line)
+    if m:
+        return len(m.group(1)), _title(m.group(2))
+    b = _BOLD_RE.match(line)
+    s = b.group(1).strip() if b else line
+    if len(s) > 40 or s.endswith(_PARA_END):
+        return None
+    m = _PART_RE.match(s)
+    if m:
+        return _PART_LEVELS[m.group(1)], _title(s)
+    if _ARTICLE_RE.match(s):
+        return None
+    if _SECTION_RE.match(s) and len(s) <= 30 and not re.search(r"[，,。；;]", s):
+        return 3, _title(s)
+    if b and len(s) <= 30:
+        return 1, _title(s)
+    return None
+
+
+def _join(a: str, b: str) -> str:
+    # Re-join a hard-wrapped line: no space between CJK characters, one space between latin words
+    if a and b and (a[-1].isascii() and a[-1].isalnum()) and (b[0].isascii() and b[0].isalnum()):
+        return f"{a} {b}"
+    return a + b
+
+
+def _iter_blocks(lines: Iterable[str]) -> Iterator[tuple[str, object]]:
+    """
+    Lines -> ("heading", (level, title)) / ("para", text, starts_article) events.
+    Paragraphs are re-flowed: text extracted from PDFs is hard-wrapped mid-sentence (often with blank lines
+    in between), so a paragraph only ends at sentence-final punctuation or before a heading/list item/article.
+    """
+    buf = ""
+    article = False
+    for raw in lines:
+        line = _clean(raw)
+        if not line or re.fullmatch(r"[#\-=*_ ]+", line):
+            continue
+        h = _heading(line)
+        if h is not None:
+            if buf:
+                yield "para", (buf, article)
+                buf, article = "", False
+            yield "heading", h
+            continue
+        # Emphasis markers carry no meaning for retrieval ("**第九条** 学校…" in PDF extracts)
+        line = line.replace("**", "").strip()
+        starts_article = bool(_ARTICLE_RE.match(line))
+        if buf and (starts_article or _LIST_RE.match(line) or buf.endswith(_PARA_END)):
+            yield "para", (buf, article)
+            buf, article = "", False
+        if not buf:
+            article = starts_article
+            # "**第一条**" on its own line: keep the article number apart, the text follows on the next lines
+            buf = line + " " if _ARTICLE_RE.fullmatch(line + " ") else line
+        else:
+            buf = _join(buf, line)
+    if buf:
+        yield "para", (buf, article)
+
+
+def _sentences(text: str, max_chars: int) -> list[str]:
+    out: list[str] = []
+    for m in _SENTENCE_RE.finditer(text):
+        s = m.group(0)
+        # A "sentence" without punctuation (tables, lists) longer than a chunk is cut at a comma/space
+        while len(s) > max_chars:
+            cut = max(s.rfind("，", 0, max_chars), s.rfind(",", 0, max_chars), s.rfind(" ", 0, max_chars))
+            cut = cut + 1 if cut > max_chars // 2 else max_chars
+            out.append(s[:cut])
+            s = s[cut:]
+        if s.strip():
+            out.append(s)
+    return out
+
+
+def _is_cut_point(sentence: str) -> bool:
+    # Content-defined boundary: depends only on the sentence itself, so edits elsewhere in the
+    # document do not move it (about 1 in 6 sentences qualifies once a chunk has min_chars)
+    return hashlib.blake2b(sentence.encode("utf-8"), digest_size=4).digest()[0] % 6 == 0
+
+
+def chunk_lines(lines: Iterable[str], *, max_chars: int | None = None, min_chars: int | None = None) -> Iterator[DocChunk]:
+    """
+    Structure-aware chunking over a stream of lines (a whole document never needs to be in memory).
+
+    - Headings (markdown "#", 编/章/节, "一、…", short bold lines) form a heading path kept as chunk metadata;
+      a heading closes the current chunk unless it is still tiny (then the title is kept inline).
+    - An article ("第…条") starts a new chunk once the current one has min_chars.
+    - Chunks end on sentence boundaries (。！？): at a content-defined cut point after min_chars,
+      or before the sentence that would exceed max_chars.
+    Boundaries are anchored on headings, articles and sentence content rather than on offsets from the
+    document start, so an edit only changes the chunks around it.
+    """
+    max_chars = max_chars or _chunk_max_chars()
+    min_chars = min(min_chars or _chunk_min_chars(), max_chars // 2)
+    tiny = max(1, min_chars // 3)
+
+    path: list[tuple[int, str]] = []
+    chunk_heading = ""
+    paras: list[str] = []
+    cur = ""
+    size = 0
+
+    def heading_str() -> str:
+        return " > ".join(t for _, t in path)
+
+    def flush() -> Iterator[DocChunk]:
+        nonlocal paras, cur, size
+        if cur:
+            paras.append(cur)
+        text = "\n".join(p.strip() for p in paras if p.strip())
+        paras, cur, size = [], "", 0
+        if text:
+            yield DocChunk(text=text, heading=chunk_heading)
+
+    for kind, payload in _iter_blocks(lines):
+        if kind == "heading":
+            level, title = payload
+            if size >= tiny:
+                yield from flush()
+            elif size:
+                # Too little text to stand alone: keep going, with the new title inline
+                paras.append(cur)
+                cur = title
+                size += len(title)
+            while path and path[-1][0] >= level:
+                path.pop()
+            path.append((level, title))
+            if not size:
+                chunk_heading = heading_str()
+            continue
+
+        text, starts_article = payload
+        if starts_article and size >= min_chars:
+            yield from flush()
+        if not size:
+            chunk_heading = heading_str()
+        if cur:
+            paras.append(cur)
+            cur = ""
+        for s in _sentences(text, max_chars):
+            if size and size + len(s) > max_chars:
+                yield from flush()
+                chunk_heading = heading_str()
+            cur += s
+            size += len(s)
+            if size >= min_chars and _is_cut_point(s):
+                yield from flush()
+                chunk_heading = heading_str()
+    yield from flush()
+
+
+def chunk_text(text: str, **kwargs) -> list[DocChunk]:
+    return list(chunk_lines(text.replace("\r\n", "\n").split("\n"), **kwargs))
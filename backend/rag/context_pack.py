@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass, field
+
+
+def context_token_budget() -> int:
+    # 0 disables the budget (all merged blocks are kept)
+    return int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "1800"))
+
+
+_CJK_RE = re.compile(r"[　-〿㐀-䶿一-鿿＀-￯]")
+_SENTENCE_END_RE = re.compile(r"[。！？!?；;\n]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Local tokenizer estimate (no model vocab needed): Qwen/Llama-style BPE spends about one token per
+    CJK character / full-width punctuation, and about one per 4 characters of other text.
+    Deliberately on the high side so the budget is not overrun.
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _overlap_len(a: str, b: str, max_len: int = 400) -> int:
+    """
+    Length of the longest suffix of `a` that is also a prefix of `b` (the chunker's tail overlap).
+    """
+    n = min(len(a), len(b), max_len)
+    for k in range(n, 0, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def _norm_span(s: str) -> str:
+    return re.sub(r"\s+", "", s)
+
+
+@dataclass
+class PackedBlock:
+    source: str
+    chunk_start: int
+    chunk_end: int
+    score: float
+    text: str
+    chunk_ids: list[int] = field(default_factory=list)
+    truncated: bool = False
+    # Heading path of the first chunk in the block
+    heading: str = ""
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.text)
+
+    @property
+    def label(self) -> str:
+        span = f"{self.chunk_start}" if self.chunk_start == self.chunk_end else f"{self.chunk_start}-{self.chunk_end}"
+        return f"{self.source}#{span}"
+
+
+def _merge_adjacent(hits: list[dict]) -> list[PackedBlock]:
+    """
+    Hits of the same source with consecutive chunk indexes become one block; the text the chunker
+    repeated at each boundary is stitched out.
+    """
+    by_source: dict[str, list[dict]] = {}
+    for h in hits:
+        by_source.setdefault(str(h["source"]), []).append(h)
+    blocks: list[PackedBlock] = []
+    for source, group in by_source.items():
+        group.sort(key=lambda h: int(h["chunk_index"]))
+        cur: PackedBlock | None = None
+        for h in group:
+            idx = int(h["chunk_index"])
+            text = str(h["text"]).strip()
+            if cur is not None and idx <= cur.chunk_end + 1:
+                if idx > cur.chunk_end:
+                    k = _overlap_len(cur.text, text)
+                    cur.text = cur.text + ("\n\n" if k == 0 else "") + text[k:]
+                    cur.chunk_end = idx
+                cur.score = max(cur.score, float(h["score"]))
+                cur.chunk_ids.append(int(h.get("chunk_id", 0)))
+                continue
+            cur = PackedBlock(
+                source, idx, idx, float(h["score"]), text, [int(h.get("chunk_id", 0))], heading=str(h.get("heading") or "")
+            )
+            blocks.append(cur)
+    return blocks
+
+
+def _sentences(para: str) -> list[str]:
+    return [s for s in re.split(r"(?<=[。！？!?；;\n])", para) if s.strip()]
+
+
+def _drop_seen_spans(text: str, seen: set[str], min_chars: int = 12) -> str:
+    """
+    Remove paragraphs/sentences already present in an earlier (higher-scored) block, e.g. the same
+    notice quoted in two documents or an overlap that was not adjacent.
+    """
+    kept: list[str] = []
+    for para in re.split(r"\n\s*\n", text):
+        sentences = _sentences(para)
+        out: list[str] = []
+        for s in sentences:
+            key = _norm_span(s)
+            if len(key) >= min_chars:
+                if key in seen:
+                    continue
+                seen.add(key)
+            out.append(s)
+        para_out = "".join(out).strip()
+        if para_out:
+            kept.append(para_out)
+    return "\n\n".join(kept)
+
+
+def _mark_seen(text: str, seen: set[str], min_chars: int = 12) -> None:
+    """
+    Record the sentences of a packed block, so later blocks drop them.
+    """
+    for para in re.split(r"\n\s*\n", text):
+        for s in _sentences(para):
+            key = _norm_span(s)
+            if len(key) >= min_chars:
+                seen.add(key)
+
+
+def _truncate_to_tokens(text: str, budget: int) -> str:
+    """
+    Longest prefix within `budget` tokens, cut back to the last sentence end when there is one.
+    """
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    cut = text[:lo]
+    ends = [m.end() for m in _SENTENCE_END_RE.finditer(cut)]
+    if ends and ends[-1] >= len(cut) // 2:
+        cut = cut[: ends[-1]]
+    return cut.rstrip()
+
+
+def pack_context(hits: list[dict], budget_tokens: int, *, min_block_tokens: int = 48) -> tuple[list[PackedBlock], dict]:
+    """
+    RAG hits -> blocks for the prompt:
+    1) merge adjacent/overlapping chunks of the same source
+    2) best block first; drop sentences already emitted by a better block
+    3) fill `budget_tokens` (0 = unlimited); the block that would overflow is cut at a sentence
+       boundary if at least `min_block_tokens` remain, otherwise it is dropped
+    """
+    tokens_in = sum(estimate_tokens(str(h["text"])) for h in hits)
+    blocks = sorted(_merge_adjacent(hits), key=lambda b: b.score, reverse=True)
+
+    seen: set[str] = set()
+    packed: list[PackedBlock] = []
+    used = 0
+    dropped = 0
+    for b in blocks:
+        # Dedupe against a copy: only what is actually packed (after truncation) counts as seen
+        b.text = _drop_seen_spans(b.text, set(seen))
+        if not b.text:
+            dropped += 1
+            continue
+        t = b.tokens
+        if budget_tokens > 0 and used + t > budget_tokens:
+            remaining = budget_tokens - used
+            if remaining < min_block_tokens:
+                dropped += 1
+                continue
+            b.text = _truncate_to_tokens(b.text, remaining)
+            b.truncated = True
+            t = b.tokens
+            if not b.text:
+                dropped += 1
+                continue
+        _mark_seen(b.text, seen)
+        packed.append(b)
+        used += t
+
+    stats = {
+        "hits": len(hits),
+        "blocks": len(packed),
+        "dropped_blocks": dropped,
+        "truncated_blocks": sum(1 for b in packed if b.truncated),
+        "tokens_in": tokens_in,
+        "tokens_out": used,
+        "budget": budget_tokens,
+    }
+    return packed, stats
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import fnmatch
+import json
+import math
+import os
+from pathlib import Path
+
+import numpy as np
+
+from backend.rag.ingest import read_front_matter
+
+
+# CORI collection selection (Callan et al.): belief = B + (1 - B) * T * I per query term
+_CORI_B = 0.4
+_CORI_DF_BASE = 50.0
+_CORI_DF_FACTOR = 150.0
+
+
+def default_collection() -> str:
+    return os.getenv("RAG_DEFAULT_COLLECTION", "general").strip() or "general"
+
+
+def collection_rules() -> list[tuple[str, list[str]]]:
+    """
+    RAG_COLLECTIONS="law=civil_code*;admissions=*招生*;it=*vpn*,*信息化*": collection name -> file name globs,
+    first matching rule wins.
+    """
+    rules: list[tuple[str, list[str]]] = []
+    for part in os.getenv("RAG_COLLECTIONS", "").split(";"):
+        name, _, globs = part.partition("=")
+        patterns = [g.strip().lower() for g in globs.split(",") if g.strip()]
+        if name.strip() and patterns:
+            rules.append((name.strip(), patterns))
+    return rules
+
+
+def collections_signature() -> str:
+    """
+    Identifies the collection config in the meta table; "" for the default (everything in one collection).
+    """
+    rules = collection_rules()
+    if not rules and default_collection() == "general":
+        return ""
+    return json.dumps({"default": default_collection(), "rules": rules}, ensure_ascii=False, sort_keys=True)
+
+
+def collection_for(path: Path) -> str:
+    """
+    `collection:` in the document's front matter, else the first RAG_COLLECTIONS rule matching its file name,
+    else RAG_DEFAULT_COLLECTION.
+    """
+    name = read_front_matter(path).get("collection", "").strip()
+    if name:
+        return name
+    file_name = path.name.lower()
+    for collection, patterns in collection_rules():
+        if any(fnmatch.fnmatchcase(file_name, p) for p in patterns):
+            return collection
+    return default_collection()
+
+
+def cori_beliefs(df: np.ndarray, tokens: np.ndarray) -> np.ndarray | None:
+    """
+    CORI belief per collection for one query, from df (query terms x collections: rows of the collection
+    containing the term) and tokens (total token count per collection). None when no query term occurs
+    in any collection (no routing signal).
+    """
+    n_coll = df.shape[1]
+    cf = np.count_nonzero(df, axis=1)
+    present = cf > 0
+    if n_coll == 0 or not present.any():
+        return None
+    df = df[present].astype(np.float64)
+    idf = np.log((n_coll + 0.5) / cf[present]) / math.log(n_coll + 1.0)
+    cw = np.asarray(tokens, dtype=np.float64)
+    t = df / (df + _CORI_DF_BASE + _CORI_DF_FACTOR * cw / max(float(cw.mean()), 1.0))
+    return (_CORI_B + (1.0 - _CORI_B) * t * idf[:, None]).mean(axis=0)
+
+
+def route(names: list[str], df: np.ndarray, tokens: np.ndarray, first: int) -> tuple[list[str], list[str]]:
+    """
+    Split collections into (searched first, searched only if the first pass comes up short): the `first`
+    best by CORI belief among those containing any query term. Without a signal everything goes first.
+    """
+    belief = cori_beliefs(df, tokens)
+    if belief is None:
+        return list(names), []
+    order = np.argsort(-belief, kind="stable")
+    picked = [names[i] for i in order[:first] if belief[i] > _CORI_B]
+    if not picked:
+        return list(names), []
+    return picked, [names[i] for i in order if names[i] not in picked]
@@ -1,18 +1,38 @@
 from __future__ import annotations
 
+import asyncio
+import contextvars
+import functools
 import hashlib
 import json
 import logging
 import os
-import re
 import sqlite3
 import struct
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
+from itertools import islice
 from pathlib import Path
-from typing import Iterable
+from typing import Iterable, Iterator
 
 import httpx
+import numpy as np
+
+from backend.http_clients import get_client
+from backend.metrics import span
+from backend.rag.ann import open_searcher, top_k_scores
+from backend.rag.chunker import chunk_lines, chunker_signature
+from backend.rag.doc_collections import collection_for, collections_signature, default_collection, route
+from backend.rag.ingest import file_sha256, iter_documents, reader_for
+from backend.rag.lexical import LexicalIndex, query_terms, rrf_fuse, term_vector
+from backend.rag.quantize import QUANTIZATION_MODES, quantization_mode
+from backend.rag.query_cache import EmbeddingCache
+from backend.rag.reindex_job import ReindexProgress
+from backend.rag.snapshot import IndexSnapshot, SnapshotRow, write_snapshot
+from backend.rag.writer_lock import IndexLocked, IndexWriterLock
 
 
 logger = logging.getLogger("campus_assistant")
@@ -27,86 +47,83 @@ def _ollama_base_url() -> str:
     return os.getenv("OLLAMA_BASE_URL", "http://localhost:11434").rstrip("/")
 
 
-def _chunk_text_by_paragraphs(text: str) -> list[str]:
-    # Split by blank lines, then compact
-    parts = re.split(r"\n\s*\n+", text.replace("\r\n", "\n"))
-    out: list[str] = []
-    for p in parts:
-        s = (p or "").strip()
-        if not s:
-            continue
-        if re.fullmatch(r"[#\-=*_ \t]+", s):
-            continue
-        out.append(s)
-    return out
+def _reload_check_seconds() -> float:
+    return max(0.0, float(os.getenv("RAG_RELOAD_CHECK_SECONDS", "5")))
 
 
-def _merge_to_chunks(paragraphs: list[str], max_chars: int = 900, overlap: int = 120) -> list[str]:
-    """
-    Merge paragraphs into ~max_chars chunks with a simple char-overlap.
-    """
-    chunks: list[str] = []
-    buf: list[str] = []
-    cur_len = 0
+def _query_cache_size() -> int:
+    return int(os.getenv("RAG_QUERY_CACHE_SIZE", "2048"))
 
-    def flush():
-        nonlocal buf, cur_len
-        if not buf:
-            return
-        chunk = "\n\n".join(buf).strip()
-        if chunk:
-            chunks.append(chunk)
-        # overlap by tail chars
-        if overlap > 0 and chunk:
-            tail = chunk[-overlap:]
-            buf = [tail]
-            cur_len = len(tail)
-        else:
-            buf = []
-            cur_len = 0
 
-    for p in paragraphs:
-        if cur_len + len(p) + 2 > max_chars and buf:
-            flush()
-        buf.append(p)
-        cur_len += len(p) + 2
-    flush()
-    return chunks
+def _query_cache_ttl() -> float:
+    return float(os.getenv("RAG_QUERY_CACHE_TTL", "0"))
 
 
-def _extract_keywords_for_filter(msg: str) -> list[str]:
-    """
-    A lightweight keyword extractor used only for filtering obvious false positives.
-    """
-    msg = (msg or "").strip()
-    if not msg:
-        return []
-    zh = re.findall(r"[\u4e00-\u9fff]{2,4}", msg)
-    en = re.findall(r"[A-Za-z0-9]{2,}", msg.lower())
-    kws: list[str] = []
-    seen = set()
-    for k in zh + en:
-        if k in seen:
-            continue
-        seen.add(k)
-        kws.append(k)
-    stop = {"什么", "怎么", "如何", "可以", "是否", "老师", "同学", "上海", "大学", "校园"}
-    kws = [k for k in kws if k not in stop]
-    kws.sort(key=len, reverse=True)
-    return kws[:12]
+def _read_only() -> bool:
+    return os.getenv("RAG_READ_ONLY", "").strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
-def _keyword_overlap_count(text: str, keywords: list[str]) -> int:
-    if not text or not keywords:
-        return 0
-    return sum(1 for k in keywords if k and (k in text))
+def _embed_batch_size() -> int:
+    return max(1, int(os.getenv("EMBED_BATCH_SIZE", "32")))
 
 
-def _iter_docs_markdown(docs_dir: Path) -> Iterable[Path]:
-    for p in sorted(docs_dir.glob("*.md")):
-        if p.name.startswith("."):
-            continue
-        yield p
+def _embed_concurrency() -> int:
+    return max(1, int(os.getenv("EMBED_CONCURRENCY", "4")))
+
+
+def _lexical_candidates() -> int:
+    return max(1, int(os.getenv("RAG_LEXICAL_CANDIDATES", "2000")))
+
+
+def _rrf_k() -> int:
+    return max(1, int(os.getenv("RAG_RRF_K", "60")))
+
+
+def _filtered_scan_fraction() -> float:
+    # With the keyword filter on, an exact block is scanned only at its passing rows when they are at most
+    # this fraction of it (gathering scattered rows costs more per row than one contiguous mat-vec)
+    return max(0.0, float(os.getenv("RAG_FILTERED_SCAN_FRACTION", "0.2")))
+
+
+def _route_collections() -> int:
+    # Collections searched first when the query router is on (0 = always search every collection)
+    return max(0, int(os.getenv("RAG_ROUTE_COLLECTIONS", "1")))
+
+
+def _scoring_threads() -> int:
+    return max(0, int(os.getenv("RAG_SCORING_THREADS", str(min(4, os.cpu_count() or 1)))))
+
+
+_scoring_pool: ThreadPoolExecutor | None = None
+_scoring_pool_lock = threading.Lock()
+
+
+async def _offload(fn, *args):
+    """
+    Run CPU-bound retrieval work (BM25, mat-vec, fusion) on the scoring threads so the event loop keeps
+    serving other connections; numpy releases the GIL for the heavy parts. RAG_SCORING_THREADS=0 runs it inline.
+    The caller's context (current request trace) is carried over, so spans still land in it.
+    """
+    global _scoring_pool
+    if _scoring_threads() <= 0:
+        return fn(*args)
+    if _scoring_pool is None:
+        with _scoring_pool_lock:
+            if _scoring_pool is None:
+                _scoring_pool = ThreadPoolExecutor(max_workers=_scoring_threads(), thread_name_prefix="rag-scoring")
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_scoring_pool, functools.partial(ctx.run, fn, *args))
+
+
+def shutdown_scoring_pool() -> None:
+    """
+    Stop the scoring threads (app shutdown); a later _offload starts a new pool.
+    """
+    global _scoring_pool
+    with _scoring_pool_lock:
+        pool, _scoring_pool = _scoring_pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
 
 
 def _fingerprint_files(paths: Iterable[Path]) -> str:
@@ -122,52 +139,84 @@ def _fingerprint_files(paths: Iterable[Path]) -> str:
     return h.hexdigest()
 
 
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
 def _pack_floats(vec: list[float]) -> bytes:
     return struct.pack(f"<{len(vec)}f", *vec)
 
 
-def _unpack_floats(blob: bytes) -> list[float]:
-    n = len(blob) // 4
-    return list(struct.unpack(f"<{n}f", blob))
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    """
+    L2-normalize each row in place (float32), so cosine becomes a plain dot product.
+    """
+    if mat.size == 0:
+        return mat
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    mat /= norms
+    return mat
+
+
+def _normalize_vec(vec: list[float] | np.ndarray) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32).reshape(-1)
+    return v / max(1e-12, float(np.linalg.norm(v)))
 
 
-def _dot(a: list[float], b: list[float]) -> float:
-    return sum(x * y for x, y in zip(a, b))
+class _BatchEmbedder:
+    """
+    Ollama embeddings over one pooled client:
+    - Newer: POST /api/embed {model, input:[...]} -> {embeddings:[[...]]}  (batched)
+    - Older: POST /api/embeddings {model, prompt} -> {embedding:[...]}    (one text per call)
+    Batches run concurrently, bounded by a semaphore. Once /api/embed is found unusable,
+    the rest of the run goes straight to the legacy per-item endpoint.
+    """
 
+    def __init__(self, client: httpx.AsyncClient, model: str, *, batch_size: int = 1, concurrency: int = 1):
+        self.client = client
+        self.model = model
+        self.batch_size = max(1, int(batch_size))
+        self._sem = asyncio.Semaphore(max(1, int(concurrency)))
+        self._legacy = False
 
-def _norm(a: list[float]) -> float:
-    return max(1e-12, sum(x * x for x in a) ** 0.5)
+    async def _embed_legacy(self, texts: list[str]) -> list[list[float]]:
+        base = _ollama_base_url()
+        out: list[list[float]] = []
+        for t in texts:
+            r = await self.client.post(f"{base}/api/embeddings", json={"model": self.model, "prompt": t})
+            r.raise_for_status()
+            data = r.json()
+            out.append([float(x) for x in (data.get("embedding") or [])])
+        return out
 
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        async with self._sem:
+            if not self._legacy:
+                # Try /api/embed first
+                try:
+                    r = await self.client.post(
+                        f"{_ollama_base_url()}/api/embed", json={"model": self.model, "input": texts}
+                    )
+                    if r.status_code == 200:
+                        embs = r.json().get("embeddings") or []
+                        if len(embs) == len(texts) and all(isinstance(e, list) for e in embs):
+                            return [[float(x) for x in e] for e in embs]
+                    if r.status_code == 404:
+                        self._legacy = True
+                except Exception:
+                    pass
+            return await self._embed_legacy(texts)
 
-def _cosine(a: list[float], b: list[float]) -> float:
-    return _dot(a, b) / (_norm(a) * _norm(b))
+    async def embed_many(self, texts: list[str]) -> list[list[float]]:
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(b) for b in batches))
+        return [emb for batch in results for emb in batch]
 
 
 async def _ollama_embed(text: str, model: str) -> list[float]:
-    """
-    Ollama embeddings:
-    - Newer: POST /api/embed {model, input:[...]} -> {embeddings:[[...]]}
-    - Older: POST /api/embeddings {model, prompt} -> {embedding:[...]}
-    """
-    base = _ollama_base_url()
-    timeout = float(os.getenv("OLLAMA_TIMEOUT", "120"))
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        # Try /api/embed first
-        try:
-            r = await client.post(f"{base}/api/embed", json={"model": model, "input": [text]})
-            if r.status_code == 200:
-                data = r.json()
-                embs = data.get("embeddings") or []
-                if embs and isinstance(embs[0], list):
-                    return [float(x) for x in embs[0]]
-        except Exception:
-            pass
-
-        r = await client.post(f"{base}/api/embeddings", json={"model": model, "prompt": text})
-        r.raise_for_status()
-        data = r.json()
-        emb = data.get("embedding") or []
-        return [float(x) for x in emb]
+    embs = await _BatchEmbedder(get_client("ollama"), model).embed_many([text])
+    return embs[0] if embs else []
 
 
 @dataclass(frozen=True)
@@ -175,28 +224,88 @@ class RagChunk:
     source: str
     chunk_index: int
     text: str
-    embedding: list[float]
+    chunk_id: int = 0
+    heading: str = ""
 
 
 class EmbeddingRagIndex:
     """
-    Local embedding index for docs/*.md:
-    - Cached in SQLite
-    - Loaded in-memory for fast cosine search
+    Local embedding index for the documents in docs/ (markdown, text, HTML, JSON lines; see backend.rag.ingest):
+    - Cached in SQLite (source of truth for reindex)
+    - Published as a memory-mapped snapshot (pre-normalized float32 matrix + row/text sidecars)
+      next to the db, which every worker maps read-only for search
+    - Optionally quantized in the snapshot (`quantization`: int8, recorded in the meta table);
+      the preselected pool is then re-ranked with the exact float32 vectors from sqlite
+    - Split into named collections (front matter / RAG_COLLECTIONS, see backend.rag.doc_collections):
+      one vector block + backend per collection; a search can be limited to some of them, or routed
+      to the likely ones first
+    - Written by one process at a time (IndexWriterLock on <db>.lock); other workers pick up each newly
+      published generation on their next reload check
     """
 
-    def __init__(self, docs_dir: Path, db_path: Path):
+    def __init__(self, docs_dir: Path, db_path: Path, *, quantization: str | None = None, read_only: bool | None = None):
         self.docs_dir = docs_dir
         self.db_path = db_path
+        self.snapshot_dir = db_path.with_suffix(".index")
         self.embed_model = _default_embed_model()
-        self._chunks: list[RagChunk] = []
+        # Vector representation the next reindex publishes (RAG_QUANTIZATION unless given)
+        self.quantization = quantization_mode(quantization)
+        # The published snapshot currently served. Replaced by a single reference assignment, never
+        # mutated, so a search that captured it keeps a consistent view even if a reload swaps it.
+        self._snapshot: IndexSnapshot | None = None
         self._fingerprint: str | None = None
+        self._stale = False
+        self._last_check = 0.0
+        self._check_lock = threading.Lock()
+        # Set while reindex runs: the served snapshot is then only replaced by reindex itself
+        self._reindexing = False
+        # Read-only workers never write sqlite / publish; the writer (another worker or a sidecar) does
+        self.read_only = _read_only() if read_only is None else read_only
+        self.writer_lock = IndexWriterLock(db_path.with_suffix(".lock"))
+        self.reload_check_seconds = _reload_check_seconds()
+        self.query_cache = EmbeddingCache(max_size=_query_cache_size(), ttl_seconds=_query_cache_ttl())
+        # One long-lived connection per process (WAL); the lock serializes use across threads
+        self._con: sqlite3.Connection | None = None
+        self._db_lock = threading.RLock()
+        # Per-thread read connections for the float32 re-rank of quantized snapshots
+        self._readers = threading.local()
+        self._reader_cons: list[sqlite3.Connection] = []
 
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        if self._con is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(self.db_path, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("PRAGMA busy_timeout=5000")
+            self._con = con
+        return self._con
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        """
+        Run a block on the shared connection inside one transaction (commit on success, rollback on error).
+        """
+        with self._db_lock:
+            con = self._connect()
+            with con:
+                yield con
+
+    def close(self) -> None:
+        with self._db_lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+            for con in self._reader_cons:
+                con.close()
+            self._reader_cons = []
+            self._readers = threading.local()
+        self._swap_snapshot(None)
+
     def _init_db(self) -> None:
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        with sqlite3.connect(self.db_path) as con:
+        with self._tx() as con:
             con.execute(
                 """
                 CREATE TABLE IF NOT EXISTS meta (
@@ -212,65 +321,530 @@ class EmbeddingRagIndex:
                   source TEXT NOT NULL,
                   chunk_index INTEGER NOT NULL,
                   text TEXT NOT NULL,
-                  embedding BLOB NOT NULL
+                  embedding BLOB NOT NULL,
+                  text_hash TEXT
                 )
                 """
             )
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                  source TEXT PRIMARY KEY,
+                  content_hash TEXT NOT NULL,
+                  chunks INTEGER NOT NULL,
+                  updated_at REAL NOT NULL
+                )
+                """
+            )
+            # Lexical side: hashed term frequencies per chunk; inverted per snapshot generation for BM25
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunk_terms (
+                  chunk_id INTEGER PRIMARY KEY,
+                  length INTEGER NOT NULL,
+                  term_ids BLOB NOT NULL,
+                  tfs BLOB NOT NULL
+                )
+                """
+            )
+            # Resume point of a document whose ingestion was interrupted (crash / cancelled reindex)
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ingest_progress (
+                  source TEXT PRIMARY KEY,
+                  content_hash TEXT NOT NULL,
+                  chunker TEXT NOT NULL,
+                  chunks_done INTEGER NOT NULL,
+                  updated_at REAL NOT NULL
+                )
+                """
+            )
+        if self.read_only:
+            # Read-only workers leave schema upgrades to the writer
+            return
+        with self._tx() as con:
+            if not self._migrations_pending(con):
+                return
+        # Upgrading a db from an older version: under the writer lock (blocking), so workers starting
+        # together against the same file do not race; whoever comes second finds nothing left to do
+        self.writer_lock.acquire(blocking=True)
+        try:
+            with self._tx() as con:
+                self._migrate(con)
+        finally:
+            self.writer_lock.release()
+
+    def _migrations_pending(self, con: sqlite3.Connection) -> bool:
+        cols = {row[1] for row in con.execute("PRAGMA table_info(chunks)")}
+        if not {"text_hash", "heading", "pending"} <= cols:
+            return True
+        if "collection" not in {row[1] for row in con.execute("PRAGMA table_info(documents)")}:
+            return True
+        indexes = {row[0] for row in con.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        if not {"idx_chunks_text_hash", "idx_chunks_source_chunk"} <= indexes:
+            return True
+        row = con.execute(
+            "SELECT 1 FROM chunks c LEFT JOIN chunk_terms t ON t.chunk_id = c.id WHERE t.chunk_id IS NULL LIMIT 1"
+        ).fetchone()
+        return row is not None
+
+    def _migrate(self, con: sqlite3.Connection) -> None:
+        cols = {row[1] for row in con.execute("PRAGMA table_info(chunks)")}
+        if "text_hash" not in cols:
+            # db from an older version: add + backfill so existing embeddings can be reused
+            con.execute("ALTER TABLE chunks ADD COLUMN text_hash TEXT")
+            rows = con.execute("SELECT id, text FROM chunks").fetchall()
+            con.executemany(
+                "UPDATE chunks SET text_hash=? WHERE id=?", [(_hash_text(str(t)), i) for i, t in rows]
+            )
+        if "heading" not in cols:
+            # Heading path of the chunk (structure-aware chunker); older rows have none until re-chunked
+            con.execute("ALTER TABLE chunks ADD COLUMN heading TEXT NOT NULL DEFAULT ''")
+        if "pending" not in cols:
+            # 1 while a document is being (re)ingested; swapped in for the old rows once it is complete
+            con.execute("ALTER TABLE chunks ADD COLUMN pending INTEGER NOT NULL DEFAULT 0")
+        if "collection" not in {row[1] for row in con.execute("PRAGMA table_info(documents)")}:
+            # Collection of the document; NULL (older rows) means the default collection
+            con.execute("ALTER TABLE documents ADD COLUMN collection TEXT")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_chunks_text_hash ON chunks(text_hash)")
+        con.execute("CREATE INDEX IF NOT EXISTS idx_chunks_source_chunk ON chunks(source, chunk_index)")
+        rows = con.execute(
+            "SELECT c.id, c.text FROM chunks c LEFT JOIN chunk_terms t ON t.chunk_id = c.id WHERE t.chunk_id IS NULL"
+        ).fetchall()
+        if rows:
+            # db from an older version: backfill term vectors without re-embedding
+            con.executemany(
+                "INSERT INTO chunk_terms(chunk_id, length, term_ids, tfs) VALUES(?,?,?,?)",
+                [(i, *term_vector(str(t))) for i, t in rows],
+            )
 
     def _get_meta(self, key: str) -> str | None:
-        with sqlite3.connect(self.db_path) as con:
+        with self._tx() as con:
             row = con.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
             return row[0] if row else None
 
+    def _cached_quantization(self) -> str:
+        """
+        Mode of the published vectors; a mode no longer supported (float16) falls back to float32, which
+        sqlite can republish without re-embedding.
+        """
+        mode = self._get_meta("quantization") or "f32"
+        return mode if mode in QUANTIZATION_MODES else "f32"
+
     def _set_meta(self, key: str, value: str) -> None:
-        with sqlite3.connect(self.db_path) as con:
+        with self._tx() as con:
             con.execute(
                 "INSERT INTO meta(key,value) VALUES(?,?) ON CONFLICT(key) DO UPDATE SET value=excluded.value",
                 (key, value),
             )
-            con.commit()
 
-    def _load_from_db(self) -> list[RagChunk]:
-        chunks: list[RagChunk] = []
-        with sqlite3.connect(self.db_path) as con:
-            for source, chunk_index, text, emb_blob in con.execute(
-                "SELECT source, chunk_index, text, embedding FROM chunks ORDER BY source, chunk_index"
-            ):
-                chunks.append(
-                    RagChunk(
-                        source=source,
-                        chunk_index=int(chunk_index),
-                        text=str(text),
-                        embedding=_unpack_floats(emb_blob),
-                    )
+    def _iter_db_rows(self, con: sqlite3.Connection, dim: int) -> Iterable[SnapshotRow]:
+        """
+        Stream chunks out of sqlite one row at a time, normalized, for the snapshot writer;
+        grouped by collection, then by source (each document read in chunk order through its index).
+        """
+        default = default_collection()
+        by_collection: dict[str, list[str]] = {}
+        for source, collection in con.execute("SELECT source, collection FROM documents").fetchall():
+            by_collection.setdefault(str(collection or default), []).append(str(source))
+        documented = {s for sources in by_collection.values() for s in sources}
+        orphans = [str(r[0]) for r in con.execute("SELECT DISTINCT source FROM chunks WHERE pending=0").fetchall()]
+        by_collection.setdefault(default, []).extend(s for s in orphans if s not in documented)
+        for collection in sorted(by_collection):
+            for source in sorted(by_collection[collection]):
+                yield from self._iter_source_rows(con, source, collection, dim)
+
+    def _iter_source_rows(self, con: sqlite3.Connection, source: str, collection: str, dim: int) -> Iterable[SnapshotRow]:
+        for chunk_id, chunk_index, text, heading, emb_blob in con.execute(
+            "SELECT id, chunk_index, text, heading, embedding FROM chunks WHERE source=? AND pending=0 ORDER BY chunk_index",
+            (source,),
+        ):
+            vec = np.frombuffer(emb_blob, dtype="<f4")
+            if vec.shape[0] != dim:
+                logger.warning(
+                    "RAG skip chunk with mismatched embedding dim: source=%s chunk_index=%s dim=%s expected=%s",
+                    source,
+                    chunk_index,
+                    vec.shape[0],
+                    dim,
                 )
-        return chunks
+                continue
+            yield SnapshotRow(
+                chunk_id=int(chunk_id),
+                source=str(source),
+                chunk_index=int(chunk_index),
+                text=str(text),
+                embedding=_normalize_vec(vec),
+                heading=str(heading or ""),
+                collection=collection,
+            )
+
+    def _publish_snapshot(self, fingerprint: str) -> IndexSnapshot | None:
+        """
+        Write the current sqlite contents as a new snapshot generation and open it.
+        """
+        generation = int(self._get_meta("generation") or 0) + 1
+        with self._tx() as con:
+            row = con.execute("SELECT embedding FROM chunks LIMIT 1").fetchone()
+            dim = len(row[0]) // 4 if row else 0
+            write_snapshot(
+                self.snapshot_dir,
+                generation=generation,
+                dim=dim,
+                rows=self._iter_db_rows(con, dim),
+                embed_model=self.embed_model,
+                docs_fingerprint=fingerprint,
+                quantization=self._cached_quantization(),
+            )
+        self._set_meta("generation", str(generation))
+        return self._attach_searcher(IndexSnapshot.open_current(self.snapshot_dir))
+
+    def _attach_searcher(self, snap: IndexSnapshot | None) -> IndexSnapshot | None:
+        """
+        Attach the configured vector backend (exact / IVF) per collection and the BM25 index before the
+        snapshot is swapped in.
+        """
+        if snap is not None and not snap.searchers:
+            snap.searchers = {
+                name: open_searcher(snap.block(name), snap.path(f"ivf.{i}.npz")) for i, name in enumerate(snap.collections)
+            }
+        if snap is not None and snap.lexical is None:
+            snap.lexical = LexicalIndex.load(snap.path("bm25"), len(snap))
+            if snap.lexical is None:
+                t0 = time.time()
+                snap.lexical = LexicalIndex.build(snap.path("bm25"), self._snapshot_term_vectors(snap))
+                logger.info("RAG BM25 index built: rows=%s seconds=%s", len(snap), round(time.time() - t0, 2))
+        if snap is not None and snap.collection_tokens is None:
+            # Collection sizes in tokens, for the query router
+            doc_len = snap.lexical.doc_len
+            snap.collection_tokens = np.array([int(doc_len[a:b].sum()) for a, b in snap.collections.values()], dtype=np.int64)
+        return snap
+
+    def _snapshot_term_vectors(self, snap: IndexSnapshot) -> Iterator[tuple[int, bytes, bytes]]:
+        """
+        Stored term vectors in snapshot row order; rows no longer in sqlite are re-tokenized from the snapshot text.
+        """
+        ids = [int(x) for x in snap.rows["chunk_id"]]
+        stored: dict[int, tuple[int, bytes, bytes]] = {}
+        with self._tx() as con:
+            for i in range(0, len(ids), 500):
+                part = ids[i : i + 500]
+                marks = ",".join("?" * len(part))
+                for cid, length, term_ids, tfs in con.execute(
+                    f"SELECT chunk_id, length, term_ids, tfs FROM chunk_terms WHERE chunk_id IN ({marks})", part
+                ):
+                    stored[int(cid)] = (int(length), bytes(term_ids), bytes(tfs))
+        for row, cid in enumerate(ids):
+            tv = stored.get(cid)
+            if tv is None:
+                heading = snap.heading(row)
+                tv = term_vector(f"{heading}\n{snap.text(row)}" if heading else snap.text(row))
+            yield tv
+
+    def _swap_snapshot(self, snap: IndexSnapshot | None) -> None:
+        # The previous generation is retired, not closed: in-flight searches hold a lease on it, and its
+        # text map is closed when the last one releases it (vector maps go with the last reference).
+        old, self._snapshot = self._snapshot, snap
+        if old is not None and old is not snap:
+            old.retire()
+
+    def _acquire_snapshot(self) -> IndexSnapshot | None:
+        """
+        The served snapshot, leased for one search (release() it when done).
+        """
+        while True:
+            snap = self._snapshot
+            if snap is None or snap.acquire():
+                return snap
+
+    @property
+    def generation(self) -> int | None:
+        snap = self._snapshot
+        return snap.generation if snap is not None else None
 
-    def ensure_loaded(self) -> None:
+    @property
+    def served_chunks(self) -> int:
+        snap = self._snapshot
+        return len(snap) if snap is not None else 0
+
+    @property
+    def docs_fingerprint(self) -> str | None:
+        """
+        Fingerprint of the docs the served snapshot was built from.
         """
-        Load chunks from sqlite; rebuild if docs changed or embedding model changed.
+        snap = self._snapshot
+        return snap.docs_fingerprint if snap is not None else None
+
+    def ensure_loaded(self, *, force: bool = False) -> None:
         """
-        doc_paths = list(_iter_docs_markdown(self.docs_dir))
+        Cheap on the hot path: once a snapshot is mapped, the docs dir / meta are only re-checked
+        at most every `reload_check_seconds` (RAG_RELOAD_CHECK_SECONDS).
+        """
+        now = time.monotonic()
+        if not force and now - self._last_check < self.reload_check_seconds:
+            return
+        if not self._check_lock.acquire(blocking=False):
+            # Another thread is already checking; keep serving the current snapshot
+            return
+        try:
+            self._last_check = now
+            self._check_for_changes()
+        finally:
+            self._check_lock.release()
+
+    def _check_for_changes(self) -> None:
+        """
+        Map the published snapshot if a newer generation exists; flag the index as stale if docs changed.
+        """
+        if self._reindexing:
+            return
+        embed_model = _default_embed_model()
+        if embed_model != self.embed_model:
+            logger.info("RAG embed_model changed %s -> %s, clearing query cache", self.embed_model, embed_model)
+            self.embed_model = embed_model
+            self.query_cache.clear()
+
+        doc_paths = list(iter_documents(self.docs_dir))
         fp = _fingerprint_files(doc_paths)
         cached_fp = self._get_meta("docs_fingerprint")
         cached_embed_model = self._get_meta("embed_model")
 
-        if cached_fp == fp and cached_embed_model == self.embed_model:
-            self._chunks = self._load_from_db()
-            self._fingerprint = fp
+        if cached_embed_model != self.embed_model:
+            # Stored vectors are from another model: nothing usable until reindex
+            self._swap_snapshot(None)
+            self._fingerprint = None
+            self._stale = True
             return
 
-        # Rebuild synchronously on demand
-        # (Indexing can take a while for very large docs; you can also call /api/rag/reindex explicitly)
-        self._chunks = []
-        self._fingerprint = None
+        snap = self._snapshot
+        if snap is None or snap.generation != int(self._get_meta("generation") or 0):
+            snap = self._attach_searcher(IndexSnapshot.open_current(self.snapshot_dir)) or snap
+        cached_quantization = self._cached_quantization()
+        if (
+            snap is None
+            or snap.docs_fingerprint != cached_fp
+            or snap.embed_model != self.embed_model
+            or snap.quantization != cached_quantization
+        ):
+            # sqlite is up to date but no matching snapshot yet (e.g. db from an older version, or a
+            # writer in another process between updating meta and publishing)
+            published = self._try_publish(cached_fp or fp)
+            if published is not None:
+                if snap is not None and snap is not self._snapshot:
+                    # Opened above but superseded before it was ever served
+                    snap.close()
+                snap = published
+        if snap is not self._snapshot:
+            logger.info("RAG snapshot loaded: generation=%s chunks=%s", snap.generation if snap else None, len(snap or []))
+        self._swap_snapshot(snap)
+        self._fingerprint = cached_fp
+
+        stale = (
+            cached_fp != fp
+            or self._get_meta("chunker") != chunker_signature()
+            or cached_quantization != self.quantization
+            or (self._get_meta("collections") or "") != collections_signature()
+        )
+        if stale and not self._stale:
+            # Keep serving the previous index until /api/rag/reindex publishes a new generation
+            logger.info("RAG docs changed since last reindex; serving generation=%s until reindex", self.generation)
+        self._stale = stale
 
-    async def reindex(self) -> dict:
+    def _try_publish(self, fingerprint: str) -> IndexSnapshot | None:
         """
-        Rebuild the sqlite cache + in-memory chunks using Ollama embeddings.
+        Publish from sqlite if this process can take the writer lock; otherwise keep serving what is
+        mapped and let the writer's next generation arrive through the reload check.
         """
+        if self.read_only or not self.writer_lock.acquire():
+            return None
+        try:
+            # Another process may have published while this one was checking
+            snap = IndexSnapshot.open_current(self.snapshot_dir)
+            if (
+                snap is not None
+                and snap.docs_fingerprint == fingerprint
+                and snap.embed_model == self.embed_model
+                and snap.quantization == self._cached_quantization()
+            ):
+                return self._attach_searcher(snap)
+            if snap is not None:
+                # Stale generation, never served: superseded by the one published below
+                snap.close()
+            return self._publish_snapshot(fingerprint)
+        finally:
+            self.writer_lock.release()
+
+    def claim_writer(self) -> None:
+        """
+        Take the writer lock for a reindex, synchronously: the caller learns at once whether it may run one
+        (an HTTP handler answers 409 instead of starting a job that would fail). Hand the claim over with
+        reindex(claimed=True), which releases it when done.
+        Raises IndexLocked when another process (or a publish / reindex of this one) holds the lock, or this
+        worker is read-only.
+        """
+        if self.read_only:
+            raise IndexLocked("read-only worker (RAG_READ_ONLY): reindex through the index writer")
+        if self._reindexing:
+            raise IndexLocked("reindex already running")
+        if not self.writer_lock.acquire():
+            raise IndexLocked(f"index is being written: {json.dumps(self.writer_lock.holder())}")
+        self._reindexing = True
+
+    def _lookup_embeddings(self, con: sqlite3.Connection, hashes: list[str]) -> dict[str, bytes]:
+        found: dict[str, bytes] = {}
+        uniq = list(dict.fromkeys(hashes))
+        for i in range(0, len(uniq), 500):
+            part = uniq[i : i + 500]
+            marks = ",".join("?" * len(part))
+            for h, blob in con.execute(
+                f"SELECT text_hash, embedding FROM chunks WHERE text_hash IN ({marks})", part
+            ):
+                found.setdefault(str(h), blob)
+        return found
+
+    def _begin_document(self, name: str, content_hash: str, chunker: str) -> int:
+        """
+        Chunk index to resume from: the checkpoint of an interrupted run of the same file/chunker, else 0
+        (leftover pending rows of another version are dropped).
+        """
+        with self._tx() as con:
+            row = con.execute(
+                "SELECT content_hash, chunker, chunks_done FROM ingest_progress WHERE source=?", (name,)
+            ).fetchone()
+            if row is not None and row[0] == content_hash and row[1] == chunker:
+                return int(row[2])
+            con.execute(
+                "DELETE FROM chunk_terms WHERE chunk_id IN (SELECT id FROM chunks WHERE source=? AND pending=1)",
+                (name,),
+            )
+            con.execute("DELETE FROM chunks WHERE source=? AND pending=1", (name,))
+            con.execute(
+                "INSERT INTO ingest_progress(source, content_hash, chunker, chunks_done, updated_at) VALUES(?,?,?,0,?) "
+                "ON CONFLICT(source) DO UPDATE SET content_hash=excluded.content_hash, chunker=excluded.chunker, "
+                "chunks_done=0, updated_at=excluded.updated_at",
+                (name, content_hash, chunker, time.time()),
+            )
+            return 0
+
+    def _write_pending(self, name: str, start: int, batch: list, embed_texts: list[str], hashes: list[str], blobs: dict) -> None:
+        with self._tx() as con:
+            for i, (chunk, h) in enumerate(zip(batch, hashes)):
+                cur = con.execute(
+                    "INSERT INTO chunks(source, chunk_index, text, heading, embedding, text_hash, pending) "
+                    "VALUES(?,?,?,?,?,?,1)",
+                    (name, start + i, chunk.text, chunk.heading, blobs[h], h),
+                )
+                con.execute(
+                    "INSERT INTO chunk_terms(chunk_id, length, term_ids, tfs) VALUES(?,?,?,?)",
+                    (cur.lastrowid, *term_vector(embed_texts[i])),
+                )
+            con.execute(
+                "UPDATE ingest_progress SET chunks_done=?, updated_at=? WHERE source=?",
+                (start + len(batch), time.time(), name),
+            )
+
+    def _finish_document(self, name: str, content_hash: str, chunks: int) -> None:
+        with self._tx() as con:
+            # Swap: drop the previous version of the document, publish the pending rows
+            con.execute(
+                "DELETE FROM chunk_terms WHERE chunk_id IN (SELECT id FROM chunks WHERE source=? AND pending=0)", (name,)
+            )
+            con.execute("DELETE FROM chunks WHERE source=? AND pending=0", (name,))
+            con.execute("UPDATE chunks SET pending=0 WHERE source=?", (name,))
+            con.execute(
+                "INSERT INTO documents(source, content_hash, chunks, updated_at) VALUES(?,?,?,?) "
+                "ON CONFLICT(source) DO UPDATE SET content_hash=excluded.content_hash, "
+                "chunks=excluded.chunks, updated_at=excluded.updated_at",
+                (name, content_hash, chunks, time.time()),
+            )
+            con.execute("DELETE FROM ingest_progress WHERE source=?", (name,))
+
+    def _lookup_embeddings_tx(self, hashes: list[str]) -> dict[str, bytes]:
+        with self._tx() as con:
+            return self._lookup_embeddings(con, hashes)
+
+    async def _ingest_document(
+        self,
+        p: Path,
+        content_hash: str,
+        chunker: str,
+        embedder: _BatchEmbedder,
+        batch_chunks: int,
+        progress: ReindexProgress | None = None,
+    ) -> dict:
+        """
+        Streaming pipeline for one document: reader lines -> chunker -> batches of `batch_chunks` chunks ->
+        embed the ones without a stored vector -> write as pending rows + advance the checkpoint.
+        Memory stays bounded by one batch whatever the file size. The old rows keep serving (and keep
+        their vectors reusable) until the last batch is written, then both are swapped in one transaction.
+        After a crash the same file/chunker resumes after the checkpointed chunk: chunking is deterministic,
+        so the chunks already written are just skipped.
+        Reading/chunking and sqlite work run in worker threads so the event loop keeps serving queries.
+        """
+        resume_from = await asyncio.to_thread(self._begin_document, p.name, content_hash, chunker)
+        chunks = chunk_lines(reader_for(p)(p))
+
+        def next_batch(skip: int) -> list:
+            for _ in islice(chunks, skip):
+                pass
+            return list(islice(chunks, batch_chunks))
+
+        done = resume_from
+        embedded = 0
+        embed_seconds = 0.0
+        batch = await asyncio.to_thread(next_batch, resume_from)
+        while batch:
+            # Hash/embed/index the heading path together with the text: the same sentence under
+            # another heading is a different chunk
+            embed_texts = [c.embed_text for c in batch]
+            hashes = [_hash_text(t) for t in embed_texts]
+            blobs = await asyncio.to_thread(self._lookup_embeddings_tx, hashes)
+            missing = [i for i, h in enumerate(hashes) if h not in blobs]
+            if missing:
+                t0 = time.perf_counter()
+                embs = await embedder.embed_many([embed_texts[i] for i in missing])
+                embed_seconds += time.perf_counter() - t0
+                for i, emb in zip(missing, embs):
+                    blobs[hashes[i]] = _pack_floats(emb)
+            await asyncio.to_thread(self._write_pending, p.name, done, batch, embed_texts, hashes, blobs)
+            done += len(batch)
+            embedded += len(missing)
+            if progress is not None:
+                progress.advance(len(batch), len(missing), sum(len(c.text.encode("utf-8")) for c in batch))
+            batch = await asyncio.to_thread(next_batch, 0)
+
+        await asyncio.to_thread(self._finish_document, p.name, content_hash, done)
+        return {"chunks": done, "embedded": embedded, "resumed_from": resume_from, "embed_seconds": embed_seconds}
+
+    async def reindex(self, progress: ReindexProgress | None = None, *, claimed: bool = False) -> dict:
+        """
+        Incrementally rebuild the sqlite cache + published snapshot using Ollama embeddings:
+        - documents whose content hash is unchanged are skipped
+        - chunks whose text hash already exists (in any document/position) reuse the stored embedding
+        - documents that disappeared from docs/ are removed
+        - a change of chunking rules/sizes (chunker signature) re-chunks every document
+        - documents are streamed (read -> chunk -> embed -> write in bounded batches) and checkpointed,
+          so an interrupted run resumes where it stopped
+        - searches keep using the previously published snapshot until the new generation is swapped in;
+          `progress` (optional) receives docs/chunks/bytes counters for the job API
+        - the snapshot is published in this index's `quantization` (a change of mode needs no re-embedding)
+        - every document's collection is re-resolved (front matter / RAG_COLLECTIONS), so a config change
+          only regroups the snapshot
+        A change of embedding model invalidates everything.
+        Raises IndexLocked when the writer lock is taken (see claim_writer), unless `claimed` says the caller
+        already holds it.
+        """
+        if not claimed:
+            self.claim_writer()
+        try:
+            return await self._reindex(progress)
+        finally:
+            self._reindexing = False
+            self.writer_lock.release()
+
+    async def _reindex(self, progress: ReindexProgress | None) -> dict:
         start_ts = time.time()
-        doc_paths = list(_iter_docs_markdown(self.docs_dir))
+        doc_paths = list(iter_documents(self.docs_dir))
         fp = _fingerprint_files(doc_paths)
 
         logger.info(
@@ -281,40 +855,133 @@ class EmbeddingRagIndex:
             len(doc_paths),
         )
 
-        # Clear
-        with sqlite3.connect(self.db_path) as con:
-            con.execute("DELETE FROM chunks")
-            con.commit()
+        cached_embed_model = self._get_meta("embed_model")
+        if cached_embed_model is not None and cached_embed_model != self.embed_model:
+            logger.info("RAG reindex: embed_model changed %s -> %s, dropping all embeddings", cached_embed_model, self.embed_model)
+            with self._tx() as con:
+                con.execute("DELETE FROM chunk_terms")
+                con.execute("DELETE FROM chunks")
+                con.execute("DELETE FROM documents")
+                con.execute("DELETE FROM ingest_progress")
+
+        with self._tx() as con:
+            known_docs = {str(src): str(h) for src, h in con.execute("SELECT source, content_hash FROM documents")}
+        chunker = chunker_signature()
+        if self._get_meta("chunker") != chunker:
+            # Chunking rules/sizes changed: re-chunk every document (identical chunks still reuse their embeddings)
+            logger.info("RAG reindex: chunker changed %s -> %s, re-chunking all docs", self._get_meta("chunker"), chunker)
+            known_docs = {}
+
+        # Drop documents that no longer exist
+        current_names = {p.name for p in doc_paths}
+        with self._tx() as con:
+            stored_sources = {str(r[0]) for r in con.execute("SELECT DISTINCT source FROM chunks")} | set(known_docs)
+            removed_docs = sorted(stored_sources - current_names)
+            for name in removed_docs:
+                con.execute("DELETE FROM chunk_terms WHERE chunk_id IN (SELECT id FROM chunks WHERE source=?)", (name,))
+                con.execute("DELETE FROM chunks WHERE source=?", (name,))
+                con.execute("DELETE FROM documents WHERE source=?", (name,))
+                con.execute("DELETE FROM ingest_progress WHERE source=?", (name,))
 
         total_chunks = 0
+        reused_chunks = 0
+        embedded_chunks = 0
+        skipped_docs: list[str] = []
+        resumed_docs: list[str] = []
+        embed_seconds = 0.0
         per_doc_chunks: dict[str, int] = {}
+        batch_size = _embed_batch_size()
+        concurrency = _embed_concurrency()
+        # Shared keep-alive pool; in-flight requests are bounded by the embedder's semaphore
+        embedder = _BatchEmbedder(get_client("ollama"), self.embed_model, batch_size=batch_size, concurrency=concurrency)
+        sizes = {p.name: p.stat().st_size for p in doc_paths}
+        if progress is not None:
+            progress.plan(len(doc_paths), sum(sizes.values()))
         for p in doc_paths:
             doc_start = time.time()
-            text = p.read_text(encoding="utf-8", errors="ignore")
-            paras = _chunk_text_by_paragraphs(text)
-            merged = _merge_to_chunks(paras)
-            for i, chunk in enumerate(merged):
-                emb = await _ollama_embed(chunk, model=self.embed_model)
-                with sqlite3.connect(self.db_path) as con:
+            content_hash = await asyncio.to_thread(file_sha256, p)
+            if known_docs.get(p.name) == content_hash:
+                if progress is not None:
+                    progress.doc_skipped(sizes[p.name])
+                with self._tx() as con:
+                    # Leftovers of an interrupted re-ingest (the file is back to the indexed content)
                     con.execute(
-                        "INSERT INTO chunks(source, chunk_index, text, embedding) VALUES(?,?,?,?)",
-                        (p.name, i, chunk, _pack_floats(emb)),
+                        "DELETE FROM chunk_terms WHERE chunk_id IN (SELECT id FROM chunks WHERE source=? AND pending=1)",
+                        (p.name,),
+                    )
+                    con.execute("DELETE FROM chunks WHERE source=? AND pending=1", (p.name,))
+                    con.execute("DELETE FROM ingest_progress WHERE source=?", (p.name,))
+                    n = int(
+                        con.execute("SELECT COUNT(*) FROM chunks WHERE source=? AND pending=0", (p.name,)).fetchone()[0]
                     )
-                    con.commit()
-                total_chunks += 1
-                per_doc_chunks[p.name] = per_doc_chunks.get(p.name, 0) + 1
+                skipped_docs.append(p.name)
+                per_doc_chunks[p.name] = n
+                total_chunks += n
+                reused_chunks += n
+                continue
+
+            if progress is not None:
+                progress.doc_started(p.name, sizes[p.name])
+            res = await self._ingest_document(p, content_hash, chunker, embedder, batch_size * concurrency, progress)
+            if progress is not None:
+                progress.doc_done()
+            if res["resumed_from"]:
+                resumed_docs.append(p.name)
+            embed_seconds += res["embed_seconds"]
+            per_doc_chunks[p.name] = res["chunks"]
+            total_chunks += res["chunks"]
+            embedded_chunks += res["embedded"]
+            reused_chunks += res["chunks"] - res["embedded"]
 
             logger.info(
-                "RAG reindex doc done: source=%s chunks=%s seconds=%s",
+                "RAG reindex doc done: source=%s chunks=%s embedded=%s reused=%s resumed_from=%s seconds=%s",
                 p.name,
-                per_doc_chunks.get(p.name, 0),
+                res["chunks"],
+                res["embedded"],
+                res["chunks"] - res["embedded"],
+                res["resumed_from"],
                 round(time.time() - doc_start, 2),
             )
+        chunks_per_sec = round(embedded_chunks / embed_seconds, 2) if embed_seconds > 0 else None
+
+        assigned = {p.name: await asyncio.to_thread(collection_for, p) for p in doc_paths}
+        with self._tx() as con:
+            previous = {str(src): c for src, c in con.execute("SELECT source, collection FROM documents")}
+            con.executemany("UPDATE documents SET collection=? WHERE source=?", [(c, n) for n, c in assigned.items()])
+        collections: dict[str, int] = {}
+        for name, n in per_doc_chunks.items():
+            collections[assigned[name]] = collections.get(assigned[name], 0) + int(n)
+
+        # Nothing added, changed, removed or regrouped, and the served generation has this index's settings:
+        # keep it instead of rebuilding the snapshot, BM25 and IVF
+        snap = self._snapshot
+        unchanged = (
+            len(skipped_docs) == len(doc_paths)
+            and not removed_docs
+            and all(previous.get(n) == c for n, c in assigned.items())
+            and snap is not None
+            and snap.generation == int(self._get_meta("generation") or 0)
+            and snap.docs_fingerprint == fp
+            and snap.embed_model == self.embed_model
+            and snap.quantization == self.quantization
+            and (self._get_meta("collections") or "") == collections_signature()
+        )
 
         self._set_meta("docs_fingerprint", fp)
         self._set_meta("embed_model", self.embed_model)
-        self._chunks = self._load_from_db()
+        self._set_meta("chunker", chunker)
+        self._set_meta("quantization", self.quantization)
+        self._set_meta("collections", collections_signature())
+        if unchanged:
+            logger.info("RAG reindex: nothing changed, keeping generation=%s", snap.generation)
+        else:
+            if progress is not None:
+                progress.publishing()
+            # Snapshot + BM25/IVF build off the event loop; the old generation serves until this swap
+            self._swap_snapshot(await asyncio.to_thread(self._publish_snapshot, fp))
         self._fingerprint = fp
+        self._stale = False
+        self._last_check = time.monotonic()
 
         per_doc_list = [{"source": k, "chunks": int(v)} for k, v in sorted(per_doc_chunks.items())]
         logger.info(
@@ -323,8 +990,18 @@ class EmbeddingRagIndex:
                 {
                     "docs_count": len(doc_paths),
                     "total_chunks": int(total_chunks),
+                    "embedded_chunks": int(embedded_chunks),
+                    "reused_chunks": int(reused_chunks),
+                    "skipped_docs": skipped_docs,
+                    "resumed_docs": resumed_docs,
+                    "removed_docs": removed_docs,
+                    "published": not unchanged,
+                    "collections": collections,
                     "per_doc": per_doc_list,
                     "embed_model": self.embed_model,
+                    "embed_batch_size": batch_size,
+                    "embed_concurrency": concurrency,
+                    "embed_chunks_per_sec": chunks_per_sec,
                     "seconds": round(time.time() - start_ts, 2),
                 },
                 ensure_ascii=False,
@@ -336,10 +1013,73 @@ class EmbeddingRagIndex:
             "embed_model": self.embed_model,
             "docs": [p.name for p in doc_paths],
             "chunks": total_chunks,
+            "embedded_chunks": embedded_chunks,
+            "reused_chunks": reused_chunks,
+            "skipped_docs": skipped_docs,
+            "resumed_docs": resumed_docs,
+            "removed_docs": removed_docs,
+            "published": not unchanged,
+            "generation": self.generation,
+            "collections": dict(sorted(collections.items())),
             "per_doc_chunks": per_doc_list,
+            "embed_batch_size": batch_size,
+            "embed_concurrency": concurrency,
+            "embed_seconds": round(embed_seconds, 2),
+            "chunks_per_sec": chunks_per_sec,
             "seconds": round(time.time() - start_ts, 2),
         }
 
+    async def embed_query(self, query: str) -> np.ndarray:
+        """
+        Query embedding with an LRU (+ optional TTL) cache in front of Ollama.
+        """
+        model = self.embed_model
+        emb = self.query_cache.get(model, query)
+        if emb is None:
+            emb = self.query_cache.put(model, query, await _ollama_embed(query, model=model))
+        return emb
+
+    async def _embed_query_timed(self, query: str) -> np.ndarray:
+        with span("embed_query"):
+            return await self.embed_query(query)
+
+    def _route(self, snap: IndexSnapshot, terms: list[str]) -> tuple[list[str], list[str]]:
+        """
+        (collections searched first, the rest): CORI over the query terms' document frequencies per
+        collection block, read from the BM25 postings (two binary searches per term and collection).
+        """
+        names = list(snap.collections)
+        first = _route_collections()
+        if first <= 0 or len(names) <= first or not terms:
+            return names, []
+        with span("route"):
+            df = snap.lexical.range_df(terms, [snap.collections[n] for n in names])
+            return route(names, df, snap.collection_tokens, first)
+
+    def _lexical_side(
+        self, snap: IndexSnapshot, query: str, min_hits: int, names: list[str] | None
+    ) -> tuple[tuple[np.ndarray, np.ndarray, np.ndarray], np.ndarray | None, list[str], list[str]]:
+        """
+        BM25 side of a search over the given collections (None: route the query first).
+        Returns (best lexical hits, every row passing the keyword filter (sorted; None without one),
+        collections searched, collections left for a second pass).
+        """
+        terms = query_terms(query)
+        rest: list[str] = []
+        if names is None:
+            names, rest = self._route(snap, terms)
+        with span("lexical"):
+            # BM25 over the query's terms (CJK bigrams / latin words / numbers)
+            ranges = None if len(names) == len(snap.collections) else [snap.collections[n] for n in names]
+            lex_rows, lex_scores, lex_matched = snap.lexical.search(terms, ranges)
+            eligible = None
+            if min_hits > 0:
+                keep = lex_matched >= min_hits
+                lex_rows, lex_scores, lex_matched = lex_rows[keep], lex_scores[keep], lex_matched[keep]
+                eligible = np.sort(lex_rows)
+            n_lex = _lexical_candidates()
+            return (lex_rows[:n_lex], lex_scores[:n_lex], lex_matched[:n_lex]), eligible, names, rest
+
     async def search(
         self,
         query: str,
@@ -348,51 +1088,237 @@ class EmbeddingRagIndex:
         min_score: float = 0.38,
         min_keyword_hits: int = 1,
         preselect_k: int | None = None,
+        collection: str | list[str] | None = None,
     ) -> list[dict]:
-        self.ensure_loaded()
-        if not self._chunks:
+        """
+        Hybrid (cosine + BM25) search. `collection` limits it to one or more named collections; without it
+        the query is routed: the likely collections (RAG_ROUTE_COLLECTIONS) are searched first and the others
+        only if that yields fewer than top_k hits.
+        """
+        if time.monotonic() - self._last_check >= self.reload_check_seconds:
+            # Reload check (docs fingerprint, sqlite meta, possibly mapping a new generation) off the event loop
+            await asyncio.to_thread(self.ensure_loaded)
+        snap = self._acquire_snapshot()
+        if snap is None:
             return []
-        q_emb = await _ollama_embed(query, model=self.embed_model)
-        scored: list[tuple[float, RagChunk]] = []
-        for c in self._chunks:
-            scored.append((_cosine(q_emb, c.embedding), c))
-        scored.sort(key=lambda x: x[0], reverse=True)
+        try:
+            return await self._search(snap, query, top_k, min_score, min_keyword_hits, preselect_k, collection)
+        finally:
+            snap.release()
 
-        # 1) Preselect a small top-N pool for filtering
+    async def _search(
+        self,
+        snap: IndexSnapshot,
+        query: str,
+        top_k: int,
+        min_score: float,
+        min_keyword_hits: int,
+        preselect_k: int | None,
+        collection: str | list[str] | None,
+    ) -> list[dict]:
+        if not len(snap):
+            return []
+        min_hits = max(0, int(min_keyword_hits))
+        names = None
+        if collection is not None:
+            names = [n for n in ([collection] if isinstance(collection, str) else collection) if n in snap.collections]
+            if not names:
+                return []
+        # The query embedding (network) and the BM25 side (CPU, scoring threads) do not depend on each other
+        q_emb, (lexical, eligible, names, rest) = await asyncio.gather(
+            self._embed_query_timed(query),
+            _offload(self._lexical_side, snap, query, min_hits, names),
+        )
+        if len(q_emb) != snap.dim:
+            logger.warning(
+                "RAG query embedding dim mismatch: got=%s index=%s (embed_model=%s)",
+                len(q_emb),
+                snap.dim,
+                self.embed_model,
+            )
+            return []
         if preselect_k is None:
             preselect_k = max(20, int(top_k) * 6)
-        pool = scored[: min(len(scored), max(1, int(preselect_k)))]
+        pool_k = max(1, int(preselect_k))
+        hits = await _offload(self._score, snap, q_emb, lexical, int(top_k), float(min_score), pool_k, names, eligible)
+        if rest and len(hits) < max(1, int(top_k)):
+            # The routed collections came up short: fill up from the others
+            lexical, eligible, rest, _ = await _offload(self._lexical_side, snap, query, min_hits, rest)
+            more = await _offload(
+                self._score, snap, q_emb, lexical, max(1, int(top_k)) - len(hits), float(min_score), pool_k, rest, eligible
+            )
+            hits += more
+        return hits
 
-        # 2) Filter with score threshold + keyword overlap (to avoid irrelevant matches)
-        keywords = _extract_keywords_for_filter(query)
-        filtered: list[tuple[float, RagChunk, int]] = []
-        for score, c in pool:
-            if float(score) < float(min_score):
-                continue
-            kh = _keyword_overlap_count(c.text, keywords)
-            if min_keyword_hits > 0 and kh < int(min_keyword_hits):
-                continue
-            filtered.append((float(score), c, int(kh)))
+    def _score(
+        self,
+        snap: IndexSnapshot,
+        q_emb: np.ndarray,
+        lexical: tuple[np.ndarray, np.ndarray, np.ndarray],
+        top_k: int,
+        min_score: float,
+        pool_k: int,
+        names: list[str],
+        eligible: np.ndarray | None = None,
+    ) -> list[dict]:
+        """
+        Vector scoring, fusion and result materialization over the given collections; runs on a scoring thread.
+        `eligible` (sorted rows passing the keyword filter, None without one) restricts both sides.
+        """
+        q_unit = _normalize_vec(q_emb)
+        lex_rows, lex_scores, lex_matched = lexical
+
+        with span("vector"):
+            if eligible is not None and eligible.size == 0:
+                return []
+            # Preselect a top-N pool per collection block (exact mat-vec + argpartition, or IVF probe),
+            # merged into one pool. With the keyword filter on, an exact block where few rows pass it is
+            # scored at those rows only: the lexical candidates narrow the scan instead of adding to it.
+            parts = []
+            scanned: list[tuple[np.ndarray, np.ndarray]] = []
+            fraction = _filtered_scan_fraction()
+            for name in names:
+                start, stop = snap.collections[name]
+                searcher = snap.searchers[name]
+                if eligible is not None and searcher.name == "exact":
+                    lo, hi = np.searchsorted(eligible, [start, stop])
+                    if hi - lo <= (stop - start) * fraction:
+                        rows = eligible[lo:hi]
+                        scores = np.asarray(snap.matrix[rows] @ q_unit, dtype=np.float32)
+                        scanned.append((rows, scores))
+                        local, _ = top_k_scores(scores, pool_k)
+                        parts.append((rows[local], scores[local]))
+                        continue
+                rows, scores = searcher.search(q_unit, pool_k)
+                parts.append((rows + start, scores))
+            vec_rows = np.concatenate([r for r, _ in parts])
+            vec_scores = np.concatenate([s for _, s in parts])
+            if len(parts) > 1:
+                order = np.argsort(-vec_scores, kind="stable")[:pool_k]
+                vec_rows, vec_scores = vec_rows[order], vec_scores[order]
+            if eligible is None:
+                extra = np.setdiff1d(lex_rows[:pool_k], vec_rows)
+            else:
+                # Keyword filter: keep the pool rows sharing enough query terms, and add cosine for every
+                # BM25 candidate (a chunk matching only a common term still enters through the pool)
+                keep = np.isin(vec_rows, eligible, assume_unique=True)
+                vec_rows, vec_scores = vec_rows[keep], vec_scores[keep]
+                extra = np.setdiff1d(lex_rows, vec_rows)
+            if extra.size:
+                # Cosine for the lexical hits outside the pool (looked up when their block was scanned)
+                extra_scores = np.empty(extra.size, dtype=np.float32)
+                missing = np.ones(extra.size, dtype=bool)
+                s_rows = np.concatenate([r for r, _ in scanned]) if scanned else np.empty(0, dtype=np.int64)
+                if s_rows.size:
+                    s_scores = np.concatenate([sc for _, sc in scanned])
+                    order = np.argsort(s_rows, kind="stable")
+                    s_rows, s_scores = s_rows[order], s_scores[order]
+                    pos = np.minimum(np.searchsorted(s_rows, extra), s_rows.size - 1)
+                    found = s_rows[pos] == extra
+                    extra_scores[found] = s_scores[pos[found]]
+                    missing = ~found
+                if missing.any():
+                    extra_scores[missing] = np.asarray(snap.matrix[extra[missing]] @ q_unit, dtype=np.float32)
+                vec_rows = np.concatenate([vec_rows, extra])
+                vec_scores = np.concatenate([vec_scores, extra_scores])
+                order = np.argsort(-vec_scores, kind="stable")
+                vec_rows, vec_scores = vec_rows[order], vec_scores[order]
+
+        if snap.quantization != "f32" and vec_rows.size:
+            with span("rerank"):
+                # Exact cosine for the rows that can reach the top: the vector pool and the best BM25 hits
+                head = np.union1d(vec_rows[:pool_k], lex_rows[:pool_k])
+                vec_rows, vec_scores = self._rerank_exact(snap, q_unit, vec_rows, vec_scores, head)
+
+        with span("fuse"):
+            # Filter by cosine threshold, then rank by reciprocal rank fusion of both lists
+            cosine = {int(r): float(s) for r, s in zip(vec_rows, vec_scores) if float(s) >= min_score}
+            bm25 = {int(r): (float(s), int(m)) for r, s, m in zip(lex_rows, lex_scores, lex_matched)}
+            fused = rrf_fuse([vec_rows, lex_rows], k=_rrf_k())
+            ranked = sorted(cosine, key=lambda r: (fused.get(r, 0.0), cosine[r]), reverse=True)
 
-        filtered.sort(key=lambda x: x[0], reverse=True)
         out: list[dict] = []
-        for score, c, kh in filtered[: max(1, int(top_k))]:
+        for row in ranked[: max(1, top_k)]:
+            # Text is decoded lazily, only for the rows returned
+            c = RagChunk(
+                source=snap.source(row),
+                chunk_index=snap.chunk_index(row),
+                text=snap.text(row),
+                chunk_id=snap.chunk_id(row),
+                heading=snap.heading(row),
+            )
+            bm25_score, hits = bm25.get(row, (0.0, 0))
             out.append(
                 {
-                    "score": float(score),
-                    "keyword_hits": int(kh),
+                    "score": cosine[row],
+                    "bm25": round(bm25_score, 4),
+                    "fused": round(fused.get(row, 0.0), 6),
+                    "keyword_hits": hits,
+                    "chunk_id": c.chunk_id,
+                    "collection": snap.collection(row),
                     "source": c.source,
                     "chunk_index": c.chunk_index,
+                    "heading": c.heading,
                     "text": c.text,
                 }
             )
         return out
 
+    def _reader(self) -> sqlite3.Connection:
+        """
+        This thread's read connection: re-ranks on the scoring threads run side by side (WAL readers) and
+        never wait on the shared connection, which a publish holds for the whole snapshot write.
+        """
+        con = getattr(self._readers, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.db_path, check_same_thread=False)
+            con.execute("PRAGMA busy_timeout=5000")
+            self._readers.con = con
+            with self._db_lock:
+                self._reader_cons.append(con)
+        return con
+
+    def _rerank_exact(
+        self, snap: IndexSnapshot, q_unit: np.ndarray, rows: np.ndarray, scores: np.ndarray, head: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Replace the quantized cosine of the `head` rows by the exact one from the float32 vectors in sqlite
+        and re-sort. Rows sqlite no longer has (document replaced by a reindex since) keep the approximation.
+        """
+        ids = [int(x) for x in snap.rows["chunk_id"][head]]
+        blobs: dict[int, bytes] = {}
+        con = self._reader()
+        for i in range(0, len(ids), 500):
+            part = ids[i : i + 500]
+            marks = ",".join("?" * len(part))
+            for cid, blob in con.execute(f"SELECT id, embedding FROM chunks WHERE id IN ({marks})", part):
+                blobs[int(cid)] = blob
+        found = [(r, blobs[cid]) for r, cid in zip(head, ids) if cid in blobs and len(blobs[cid]) == snap.dim * 4]
+        if not found:
+            return rows, scores
+        exact = _normalize_rows(np.stack([np.frombuffer(b, dtype="<f4") for _, b in found]).astype(np.float32)) @ q_unit
+        pos = {int(r): i for i, r in enumerate(rows)}
+        scores = np.array(scores, dtype=np.float32)
+        for (r, _), s in zip(found, exact):
+            scores[pos[int(r)]] = s
+        order = np.argsort(-scores, kind="stable")
+        return rows[order], scores[order]
+
     def status(self) -> dict:
-        doc_paths = list(_iter_docs_markdown(self.docs_dir))
+        doc_paths = list(iter_documents(self.docs_dir))
         fp = _fingerprint_files(doc_paths)
         cached_fp = self._get_meta("docs_fingerprint")
         cached_embed_model = self._get_meta("embed_model")
+        cached_chunker = self._get_meta("chunker")
+        cached_quantization = self._cached_quantization()
+        snap = self._snapshot
+        collections = []
+        if snap is not None:
+            for name, (start, stop) in snap.collections.items():
+                searcher = snap.searchers.get(name)
+                collections.append(
+                    {"name": name, "chunks": stop - start, "vector_backend": searcher.info() if searcher else None}
+                )
         return {
             "docs_dir": str(self.docs_dir),
             "db_path": str(self.db_path),
@@ -401,8 +1327,31 @@ class EmbeddingRagIndex:
             "cached_docs_fingerprint": cached_fp,
             "current_docs_fingerprint": fp,
             "cached_embed_model": cached_embed_model,
-            "in_memory_chunks": len(self._chunks),
-            "ready": bool(self._chunks) and cached_fp == fp and cached_embed_model == self.embed_model,
+            "chunker": chunker_signature(),
+            "cached_chunker": cached_chunker,
+            "quantization": self.quantization,
+            "cached_quantization": cached_quantization,
+            "vector_bytes": snap.vector_bytes if snap is not None else 0,
+            "collections": collections,
+            "collection_config": collections_signature(),
+            "cached_collection_config": self._get_meta("collections") or "",
+            "route_collections": _route_collections(),
+            "snapshot_dir": str(self.snapshot_dir),
+            "generation": self.generation,
+            "in_memory_chunks": len(self._snapshot) if self._snapshot is not None else 0,
+            "reload_check_seconds": self.reload_check_seconds,
+            "read_only": self.read_only,
+            "index_writer": self.writer_lock.holder(),
+            "query_cache": self.query_cache.stats(),
+            "lexical_index": self._snapshot.lexical.info() if self._snapshot is not None and self._snapshot.lexical else None,
+            "stale": bool(self._snapshot)
+            and (
+                cached_fp != fp
+                or cached_chunker != chunker_signature()
+                or cached_quantization != self.quantization
+                or (self._get_meta("collections") or "") != collections_signature()
+            ),
+            "ready": bool(self._snapshot) and cached_fp == fp and cached_embed_model == self.embed_model,
         }
 
 
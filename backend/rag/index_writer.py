@@ -0,0 +1,79 @@
+"""
+Standalone index writer for multi-worker deployments.
+
+Run the web workers with RAG_READ_ONLY=true and let this process own all index writes (it takes the
+same writer lock a worker would). Workers pick up each published generation on their next reload check
+(RAG_RELOAD_CHECK_SECONDS), without restart.
+
+    python -m backend.rag.index_writer              # reindex once, then exit
+    python -m backend.rag.index_writer --watch 30   # reindex whenever docs/ change, checked every 30 s
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from backend.http_clients import close_clients
+from backend.rag.embedding_index import EmbeddingRagIndex
+from backend.rag.writer_lock import IndexLocked
+
+
+logger = logging.getLogger("campus_assistant")
+
+
+def _needs_reindex(status: dict) -> bool:
+    return (
+        status["cached_docs_fingerprint"] != status["current_docs_fingerprint"]
+        or status["cached_chunker"] != status["chunker"]
+        or status["cached_embed_model"] != status["embed_model"]
+        or status["cached_quantization"] != status["quantization"]
+        or status["cached_collection_config"] != status["collection_config"]
+    )
+
+
+async def _run(index: EmbeddingRagIndex, watch: float) -> dict | None:
+    try:
+        while True:
+            result = None
+            if not watch or _needs_reindex(index.status()):
+                try:
+                    result = await index.reindex()
+                except IndexLocked as e:
+                    logger.warning("RAG index writer: %s", e)
+            if not watch:
+                return result
+            await asyncio.sleep(watch)
+    finally:
+        await close_clients()
+
+
+def main() -> None:
+    repo_root = Path(__file__).resolve().parents[2]
+    load_dotenv(repo_root / ".env", override=False)
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=Path, default=Path(os.getenv("CAMPUS_DOCS_DIR") or repo_root / "docs"))
+    ap.add_argument("--db", type=Path, default=Path(os.getenv("CAMPUS_DATA_DIR") or repo_root / "data") / "rag.sqlite")
+    ap.add_argument("--watch", type=float, default=0.0, help="keep running and check docs every N seconds")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s - %(message)s")
+    # This process is the writer even when it shares the workers' .env (RAG_READ_ONLY=true)
+    index = EmbeddingRagIndex(args.docs, args.db, read_only=False)
+    try:
+        result = asyncio.run(_run(index, args.watch))
+    except KeyboardInterrupt:
+        result = None
+    finally:
+        index.close()
+    if result is not None:
+        print(json.dumps({k: v for k, v in result.items() if k != "per_doc_chunks"}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
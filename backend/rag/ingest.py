@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+
+logger = logging.getLogger("campus_assistant")
+
+# A reader turns one source file into a stream of text lines for the chunker; it must not load
+# the whole file (corpora can be hundreds of MB).
+Reader = Callable[[Path], Iterator[str]]
+
+_READ_BLOCK = 1 << 16
+# Longest front-matter block looked for at the top of a markdown / text file
+_FRONT_MATTER_MAX_LINES = 40
+_FRONT_MATTER_RE = re.compile(r"^([A-Za-z_][\w-]*)\s*:\s*(.*?)\s*$")
+_READERS: dict[str, Reader] = {}
+
+
+def register_reader(suffixes: Iterable[str], reader: Reader) -> None:
+    """
+    Plug in a reader for more file types, e.g. register_reader([".csv"], my_csv_lines).
+    """
+    for s in suffixes:
+        _READERS[s.lower()] = reader
+
+
+def reader_for(path: Path) -> Reader | None:
+    return _READERS.get(path.suffix.lower())
+
+
+def supported_suffixes() -> list[str]:
+    return sorted(_READERS)
+
+
+def iter_documents(docs_dir: Path) -> Iterator[Path]:
+    """
+    Files directly under docs_dir that some reader understands (sub-directories such as teacher_pages/ are not indexed).
+    """
+    if not docs_dir.is_dir():
+        return
+    for p in sorted(docs_dir.iterdir()):
+        if p.name.startswith(".") or not p.is_file():
+            continue
+        if reader_for(p) is not None:
+            yield p
+
+
+def file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                break
+            h.update(block)
+    return h.hexdigest()
+
+
+def _split_front_matter(f) -> tuple[dict[str, str], list[str]]:
+    """
+    Consume a leading `---` / `key: value` lines / `---` block from an open text file.
+    Returns (fields, lines to put back); without a well-formed block nothing is consumed.
+    """
+    head: list[str] = []
+    for line in f:
+        head.append(line.rstrip("\r\n"))
+        if head[0].strip() != "---" or len(head) > _FRONT_MATTER_MAX_LINES:
+            return {}, head
+        if len(head) > 1 and head[-1].strip() == "---":
+            fields: dict[str, str] = {}
+            for entry in head[1:-1]:
+                if not entry.strip():
+                    continue
+                m = _FRONT_MATTER_RE.match(entry)
+                if m is None:
+                    return {}, head
+                fields[m.group(1).lower()] = m.group(2).strip("\"'")
+            return fields, []
+    return {}, head
+
+
+def read_front_matter(path: Path) -> dict[str, str]:
+    """
+    Fields of the front-matter block of a markdown / text file, e.g. {"collection": "law"}; {} if there is none.
+    """
+    if reader_for(path) is not read_text_lines:
+        return {}
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        return _split_front_matter(f)[0]
+
+
+def read_text_lines(path: Path) -> Iterator[str]:
+    # Markdown and plain text: the chunker understands both line by line (front matter is not content)
+    with open(path, "r", encoding="utf-8", errors="ignore", newline="") as f:
+        yield from _split_front_matter(f)[1]
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+class _HtmlLines(HTMLParser):
+    """
+    Incremental HTML -> text lines: block elements end a line, <h1>..<h6> become markdown headings
+    so the chunker keeps the heading path; script/style/nav chrome is dropped.
+    """
+
+    _BLOCK = {"p", "div", "br", "li", "tr", "table", "section", "article", "ul", "ol", "dt", "dd", "blockquote", "pre"}
+    _SKIP = {"script", "style", "noscript", "nav", "header", "footer", "template"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: list[str] = []
+        self._buf: list[str] = []
+        self._skip = 0
+        self._heading = 0
+
+    def _flush(self) -> None:
+        text = re.sub(r"\s+", " ", "".join(self._buf)).strip()
+        self._buf = []
+        if text:
+            self.lines.append(("#" * self._heading + " " + text) if self._heading else text)
+            self.lines.append("")
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip += 1
+        elif re.fullmatch(r"h[1-6]", tag):
+            self._flush()
+            self._heading = int(tag[1])
+        elif tag in self._BLOCK:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip = max(0, self._skip - 1)
+        elif re.fullmatch(r"h[1-6]", tag):
+            self._flush()
+            self._heading = 0
+        elif tag in self._BLOCK:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._buf.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def read_html_lines(path: Path) -> Iterator[str]:
+    parser = _HtmlLines()
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        while True:
+            block = f.read(_READ_BLOCK)
+            if not block:
+                break
+            parser.feed(block)
+            yield from parser.lines
+            parser.lines.clear()
+    parser.close()
+    yield from parser.lines
+
+
+def _jsonl_text_fields() -> list[str]:
+    return [s.strip() for s in os.getenv("RAG_JSONL_TEXT_FIELDS", "text,content,body").split(",") if s.strip()]
+
+
+def read_jsonl_lines(path: Path) -> Iterator[str]:
+    """
+    One JSON object per line: "title" becomes a heading, the first non-empty text field
+    (RAG_JSONL_TEXT_FIELDS) is the body. Malformed lines are skipped.
+    """
+    fields = _jsonl_text_fields()
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        for lineno, raw in enumerate(f, 1):
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                rec = json.loads(raw)
+            except ValueError:
+                logger.warning("RAG ingest skip malformed jsonl line: file=%s line=%s", path.name, lineno)
+                continue
+            if not isinstance(rec, dict):
+                continue
+            body = next((str(rec[k]) for k in fields if rec.get(k)), "")
+            if not body:
+                continue
+            title = str(rec.get("title") or "").strip()
+            if title:
+                yield f"# {title}"
+            yield from body.splitlines()
+            yield ""
+
+
+register_reader([".md", ".markdown", ".txt"], read_text_lines)
+register_reader([".html", ".htm"], read_html_lines)
+register_reader([".jsonl"], read_jsonl_lines)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import logging
+import math
+import os
+import re
+import unicodedata
+import zlib
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+
+logger = logging.getLogger("campus_assistant")
+
+# Terms are hashed into a fixed number of buckets, so no vocabulary has to be kept in memory;
+# the rare collision only merges two terms' postings.
+TERM_BUCKETS = 1 << 20
+
+_TOKEN_RE = re.compile(r"[一-鿿]+|[a-z0-9]+")
+
+# Question words / campus-wide terms that carry no retrieval signal; removed from queries before bigramming
+_STOP_WORDS = ("什么", "怎么", "如何", "可以", "是否", "老师", "同学", "上海", "大学", "校园", "请问", "一下")
+
+_ARTICLE_RE = re.compile(r"第\s*(\d{1,4})\s*条")
+_ZH_DIGITS = "零一二三四五六七八九"
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Chinese runs -> overlapping character bigrams (single chars kept as unigrams); latin/digit runs -> whole words.
+    So article numbers such as "第1042条" yield the exact token "1042".
+    """
+    s = unicodedata.normalize("NFKC", text or "").casefold()
+    out: list[str] = []
+    for m in _TOKEN_RE.finditer(s):
+        run = m.group(0)
+        if "一" <= run[0] <= "鿿":
+            if len(run) == 1:
+                out.append(run)
+            else:
+                out.extend(run[i : i + 2] for i in range(len(run) - 1))
+        elif len(run) >= 2 or run.isdigit():
+            out.append(run)
+    return out
+
+
+def _zh_number(n: int) -> str:
+    """
+    1042 -> 一千零四十二, 10 -> 十, 110 -> 一百一十 (the numbering used in statute text).
+    """
+    if n == 0:
+        return "零"
+    out = ""
+    zero = False
+    for value, unit in ((1000, "千"), (100, "百"), (10, "十"), (1, "")):
+        d = n // value % 10
+        if d == 0:
+            zero = bool(out)
+            continue
+        if zero:
+            out += "零"
+            zero = False
+        out += ("" if (unit == "十" and d == 1 and not out) else _ZH_DIGITS[d]) + unit
+    return out
+
+
+def query_terms(query: str) -> list[str]:
+    s = unicodedata.normalize("NFKC", query or "").casefold()
+    # "第1042条" -> also match the statute spelling "第一千零四十二条"
+    s = _ARTICLE_RE.sub(lambda m: f"{m.group(0)} 第{_zh_number(int(m.group(1)))}条", s)
+    for w in _STOP_WORDS:
+        s = s.replace(w, " ")
+    seen: dict[str, None] = {}
+    for t in tokenize(s):
+        if len(t) >= 2 or t.isdigit():
+            seen.setdefault(t, None)
+    return list(seen)
+
+
+def term_bucket(term: str) -> int:
+    return zlib.crc32(term.encode("utf-8")) % TERM_BUCKETS
+
+
+def term_vector(text: str) -> tuple[int, bytes, bytes]:
+    """
+    (token count, bucket ids as <i4 blob, term frequencies as <u2 blob) for storage in sqlite.
+    """
+    toks = tokenize(text)
+    if not toks:
+        return 0, b"", b""
+    buckets = np.fromiter((term_bucket(t) for t in toks), dtype=np.int64, count=len(toks))
+    ids, tfs = np.unique(buckets, return_counts=True)
+    return len(toks), ids.astype("<i4").tobytes(), np.minimum(tfs, 65535).astype("<u2").tobytes()
+
+
+class LexicalIndex:
+    """
+    BM25 over a bucket-hashed inverted index, aligned with snapshot rows:
+    - <gen>.bm25.offsets.npy : CSR offsets per bucket (TERM_BUCKETS + 1)
+    - <gen>.bm25.rows.npy    : snapshot row ids, grouped by bucket
+    - <gen>.bm25.tfs.npy     : term frequency per posting
+    - <gen>.bm25.doclen.npy  : token count per row
+    Arrays are memory-mapped, so only the postings of the query's terms are paged in.
+    """
+
+    def __init__(self, offsets: np.ndarray, rows: np.ndarray, tfs: np.ndarray, doc_len: np.ndarray, *, k1: float = 1.2, b: float = 0.75):
+        self.offsets = offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.n_rows = int(doc_len.shape[0])
+        self.avgdl = float(doc_len.mean()) if self.n_rows else 0.0
+        self.k1 = float(k1)
+        self.b = float(b)
+
+    @staticmethod
+    def _paths(base: Path) -> dict[str, Path]:
+        return {k: Path(f"{base}.{k}.npy") for k in ("offsets", "rows", "tfs", "doclen")}
+
+    @classmethod
+    def build(cls, base: Path, term_vectors: Iterable[tuple[int, bytes, bytes]]) -> LexicalIndex:
+        """
+        term_vectors: one (length, bucket blob, tf blob) per snapshot row, in row order.
+        """
+        lengths: list[int] = []
+        bucket_parts: list[np.ndarray] = []
+        tf_parts: list[np.ndarray] = []
+        row_parts: list[np.ndarray] = []
+        for row, (length, bucket_blob, tf_blob) in enumerate(term_vectors):
+            lengths.append(int(length))
+            b = np.frombuffer(bucket_blob, dtype="<i4")
+            if b.size:
+                bucket_parts.append(b)
+                tf_parts.append(np.frombuffer(tf_blob, dtype="<u2"))
+                row_parts.append(np.full(b.size, row, dtype=np.int32))
+        buckets = np.concatenate(bucket_parts) if bucket_parts else np.empty(0, dtype="<i4")
+        tfs = np.concatenate(tf_parts) if tf_parts else np.empty(0, dtype="<u2")
+        rows = np.concatenate(row_parts) if row_parts else np.empty(0, dtype=np.int32)
+        order = np.argsort(buckets, kind="stable")
+        offsets = np.zeros(TERM_BUCKETS + 1, dtype=np.int64)
+        np.cumsum(np.bincount(buckets, minlength=TERM_BUCKETS), out=offsets[1:])
+
+        arrays = {
+            "offsets": offsets,
+            "rows": rows[order],
+            "tfs": tfs[order],
+            "doclen": np.asarray(lengths, dtype=np.int32),
+        }
+        for k, path in cls._paths(base).items():
+            # Per-process temp name: two workers may build the same generation's index at once
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp.npy")
+            np.save(tmp, arrays[k])
+            os.replace(tmp, path)
+        return cls(arrays["offsets"], arrays["rows"], arrays["tfs"], arrays["doclen"])
+
+    @classmethod
+    def load(cls, base: Path, n_rows: int) -> LexicalIndex | None:
+        try:
+            a = {k: np.load(p, mmap_mode="r") for k, p in cls._paths(base).items()}
+        except (FileNotFoundError, OSError, ValueError):
+            return None
+        if a["doclen"].shape[0] != n_rows or a["offsets"].shape[0] != TERM_BUCKETS + 1:
+            return None
+        return cls(a["offsets"], a["rows"], a["tfs"], np.asarray(a["doclen"]))
+
+    def info(self) -> dict:
+        return {"backend": "bm25", "rows": self.n_rows, "postings": int(self.rows.shape[0]), "avgdl": round(self.avgdl, 1)}
+
+    def _postings(self, bucket: int, ranges: list[tuple[int, int]] | None) -> tuple[int, list[tuple[int, int]]]:
+        """
+        (df over all rows, posting slices restricted to the row ranges). Postings of a bucket are sorted by
+        row, so a range is two binary searches.
+        """
+        lo, hi = int(self.offsets[bucket]), int(self.offsets[bucket + 1])
+        if hi <= lo or ranges is None:
+            return hi - lo, [(lo, hi)] if hi > lo else []
+        pos = lo + np.searchsorted(self.rows[lo:hi], np.asarray(ranges, dtype=np.int64).reshape(-1))
+        return hi - lo, [(int(a), int(b)) for a, b in zip(pos[0::2], pos[1::2]) if b > a]
+
+    def range_df(self, terms: list[str], ranges: list[tuple[int, int]]) -> np.ndarray:
+        """
+        Rows containing each query term, per row range (terms x ranges); used to route queries to collections.
+        """
+        buckets = list(dict.fromkeys(term_bucket(t) for t in terms))
+        out = np.zeros((len(buckets), len(ranges)), dtype=np.int64)
+        bounds = np.asarray(ranges, dtype=np.int64).reshape(-1)
+        for i, bucket in enumerate(buckets):
+            lo, hi = int(self.offsets[bucket]), int(self.offsets[bucket + 1])
+            if hi > lo:
+                pos = np.searchsorted(self.rows[lo:hi], bounds)
+                out[i] = pos[1::2] - pos[0::2]
+        return out
+
+    def search(
+        self, terms: list[str], ranges: list[tuple[int, int]] | None = None
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns (rows, bm25 scores, number of distinct query terms matched), sorted by score desc.
+        `ranges` ([start, stop) row ranges, e.g. collections) limits the postings scored; idf / avgdl stay
+        corpus-wide, so scores are comparable across ranges.
+        """
+        if not terms or self.n_rows == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int32)
+        row_parts: list[np.ndarray] = []
+        score_parts: list[np.ndarray] = []
+        for bucket in dict.fromkeys(term_bucket(t) for t in terms):
+            df, slices = self._postings(bucket, ranges)
+            if not slices:
+                continue
+            rows = np.concatenate([np.asarray(self.rows[a:b], dtype=np.int64) for a, b in slices])
+            tf = np.concatenate([np.asarray(self.tfs[a:b], dtype=np.float32) for a, b in slices])
+            idf = math.log(1.0 + (self.n_rows - df + 0.5) / (df + 0.5))
+            dl = self.doc_len[rows].astype(np.float32)
+            norm = self.k1 * (1.0 - self.b + self.b * dl / max(self.avgdl, 1e-9))
+            row_parts.append(rows)
+            score_parts.append(idf * tf * (self.k1 + 1.0) / (tf + norm))
+        if not row_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int32)
+        all_rows = np.concatenate(row_parts)
+        uniq, inv = np.unique(all_rows, return_inverse=True)
+        scores = np.bincount(inv, weights=np.concatenate(score_parts)).astype(np.float32)
+        matched = np.bincount(inv).astype(np.int32)
+        order = np.argsort(-scores, kind="stable")
+        return uniq[order], scores[order], matched[order]
+
+
+def rrf_fuse(rankings: list[np.ndarray], k: int = 60) -> dict[int, float]:
+    """
+    Reciprocal rank fusion: sum over rankings of 1 / (k + rank), rank starting at 1.
+    """
+    fused: dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking.tolist(), start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    return fused
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+
+# Vector representations of a snapshot matrix (float32 is exact; int8 is re-ranked in float32).
+# No float16: numpy has no fast float16 kernel, so scoring it was several times slower than float32
+QUANTIZATION_MODES = ("f32", "int8")
+
+# Code rows widened per block while scoring: a query never materializes a float32 copy of the whole matrix,
+# and a block that stays in L2 makes the widen + mat-vec faster than one float32 mat-vec over all rows
+_BLOCK_ROWS = 256
+
+
+def quantization_mode(value: str | None = None) -> str:
+    """
+    f32 (default, exact) | int8 (per-vector scale); RAG_QUANTIZATION when not given.
+    """
+    v = (value if value is not None else os.getenv("RAG_QUANTIZATION", "f32")).strip().lower() or "f32"
+    v = {"float32": "f32", "i8": "int8"}.get(v, v)
+    if v not in QUANTIZATION_MODES:
+        raise ValueError(f"unknown RAG_QUANTIZATION: {v!r} (expected one of {', '.join(QUANTIZATION_MODES)})")
+    return v
+
+
+def quantize_int8(vec: np.ndarray) -> tuple[np.ndarray, float]:
+    """
+    Symmetric int8 codes of one vector and the scale that maps them back (vec ~= codes * scale).
+    """
+    peak = float(np.max(np.abs(vec))) if vec.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    return np.clip(np.rint(vec / scale), -127, 127).astype(np.int8), scale
+
+
+class QuantizedMatrix:
+    """
+    Read-only (count x dim) matrix stored as int8 codes with one float32 scale per row.
+    Supports what the searchers use on a plain float32 matrix: `.shape`, `m @ q` and `m[rows]` / `m[a:b]`,
+    the latter two returning float32 (dequantized).
+    """
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.codes.shape
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes) + int(self.scales.nbytes)
+
+    def __len__(self) -> int:
+        return int(self.codes.shape[0])
+
+    def row_range(self, start: int, stop: int) -> QuantizedMatrix:
+        """
+        Rows [start, stop) as another QuantizedMatrix (a view, nothing is dequantized).
+        """
+        return QuantizedMatrix(self.codes[start:stop], self.scales[start:stop])
+
+    def __getitem__(self, key) -> np.ndarray:
+        block = np.asarray(self.codes[key], dtype=np.float32)
+        block *= np.asarray(self.scales[key], dtype=np.float32)[..., None]
+        return block
+
+    def __matmul__(self, q: np.ndarray) -> np.ndarray:
+        """
+        Approximate m @ q: the query is quantized too, the integer dot products of the codes are accumulated
+        and the row scales times the query scale are applied once at the end.
+        """
+        n = len(self)
+        q_codes, q_scale = quantize_int8(np.asarray(q, dtype=np.float32).reshape(-1))
+        # numpy's integer matmul has no BLAS kernel (several times slower than float32), but int8 x int8
+        # sums stay below 2**24 up to 1040 dims, so float32 BLAS accumulates them exactly
+        q_codes = q_codes.astype(np.float32)
+        # Plain ndarray view: slicing a np.memmap per block adds measurable overhead
+        codes = np.asarray(self.codes)
+        out = np.empty(n, dtype=np.float32)
+        buf = np.empty((min(n, _BLOCK_ROWS), self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, n, _BLOCK_ROWS):
+            stop = min(n, start + _BLOCK_ROWS)
+            block = buf[: stop - start]
+            np.copyto(block, codes[start:stop], casting="unsafe")
+            np.matmul(block, q_codes, out=out[start:stop])
+        out *= self.scales
+        out *= np.float32(q_scale)
+        return out
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical form used as cache key: NFKC (full-width -> half-width), casefold, collapsed whitespace.
+    """
+    s = unicodedata.normalize("NFKC", text or "").casefold()
+    return re.sub(r"\s+", " ", s).strip()
+
+
+class EmbeddingCache:
+    """
+    In-process LRU cache of query embeddings keyed by (embed model, normalized query).
+    - size-bounded (least recently used entry is evicted first)
+    - optional TTL in seconds (<= 0 disables expiry)
+    """
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 0.0):
+        self.max_size = max(0, int(max_size))
+        self.ttl_seconds = float(ttl_seconds)
+        self._data: OrderedDict[tuple[str, str], tuple[float, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def get(self, model: str, query: str) -> np.ndarray | None:
+        key = (model, normalize_query(query))
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            ts, emb = item
+            if self.ttl_seconds > 0 and time.monotonic() - ts > self.ttl_seconds:
+                del self._data[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return emb
+
+    def put(self, model: str, query: str, embedding: list[float] | np.ndarray) -> np.ndarray:
+        emb = np.array(embedding, dtype=np.float32).reshape(-1)
+        emb.setflags(write=False)
+        if self.max_size <= 0:
+            return emb
+        key = (model, normalize_query(query))
+        with self._lock:
+            self._data[key] = (time.monotonic(), emb)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return emb
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else None,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
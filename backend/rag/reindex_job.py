@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable
+
+
+logger = logging.getLogger("campus_assistant")
+
+
+class ReindexProgress:
+    """
+    Counters a running reindex reports into; read concurrently by the progress API.
+    Progress within a document is estimated from the UTF-8 size of the chunks produced so far
+    against the file size (markup/whitespace make it slightly pessimistic).
+    """
+
+    def __init__(self):
+        self.phase = "pending"
+        self.docs_total = 0
+        self.docs_done = 0
+        self.docs_skipped = 0
+        self.current_doc: str | None = None
+        self.bytes_total = 0
+        self.bytes_done = 0
+        self.chunks_done = 0
+        self.chunks_embedded = 0
+        self._doc_size = 0
+        self._doc_bytes = 0
+        self._started = time.monotonic()
+        self._ended: float | None = None
+
+    def plan(self, docs_total: int, bytes_total: int) -> None:
+        self.phase = "ingesting"
+        self.docs_total = docs_total
+        self.bytes_total = bytes_total
+        self._started = time.monotonic()
+
+    def doc_skipped(self, size: int) -> None:
+        self.docs_done += 1
+        self.docs_skipped += 1
+        self.bytes_done += size
+
+    def doc_started(self, name: str, size: int) -> None:
+        self.current_doc = name
+        self._doc_size = size
+        self._doc_bytes = 0
+
+    def advance(self, chunks: int, embedded: int, nbytes: int) -> None:
+        self.chunks_done += chunks
+        self.chunks_embedded += embedded
+        # Never run past the file size: the estimate is settled in doc_done
+        step = max(0, min(nbytes, self._doc_size - self._doc_bytes))
+        self._doc_bytes += step
+        self.bytes_done += step
+
+    def doc_done(self) -> None:
+        self.bytes_done += self._doc_size - self._doc_bytes
+        self.docs_done += 1
+        self.current_doc = None
+        self._doc_size = self._doc_bytes = 0
+
+    def publishing(self) -> None:
+        self.phase = "publishing"
+        self.current_doc = None
+
+    def finish(self, state: str) -> None:
+        self.phase = state
+        self.current_doc = None
+        self._ended = time.monotonic()
+
+    def to_dict(self) -> dict:
+        elapsed = (self._ended or time.monotonic()) - self._started
+        frac = self.bytes_done / self.bytes_total if self.bytes_total else (0.0 if self.phase == "ingesting" else 1.0)
+        eta = None
+        if self.phase == "ingesting" and 0 < frac < 1 and elapsed > 0:
+            eta = round(elapsed * (1 - frac) / frac, 1)
+        return {
+            "phase": self.phase,
+            "docs_total": self.docs_total,
+            "docs_done": self.docs_done,
+            "docs_skipped": self.docs_skipped,
+            "current_doc": self.current_doc,
+            "chunks_done": self.chunks_done,
+            "chunks_embedded": self.chunks_embedded,
+            "chunks_per_sec": round(self.chunks_done / elapsed, 2) if elapsed > 0 else None,
+            "percent": round(100 * min(1.0, frac), 1),
+            "eta_seconds": eta,
+        }
+
+
+class ReindexJob:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.state = "queued"  # queued | running | done | failed | cancelled
+        self.created_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.progress = ReindexProgress()
+        self.result: dict | None = None
+        self.error: str | None = None
+        self.task: asyncio.Task | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ("done", "failed", "cancelled")
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": round(end - self.started_at, 2) if self.started_at else None,
+            "progress": self.progress.to_dict(),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class ReindexJobs:
+    """
+    Runs reindex as a background task, one at a time; the previous snapshot keeps serving until
+    the job publishes its new generation. The last `keep` jobs stay queryable by id.
+    """
+
+    def __init__(self, run: Callable[[ReindexProgress], Awaitable[dict]], *, keep: int = 20):
+        self._run = run
+        self._keep = max(1, int(keep))
+        self._jobs: dict[str, ReindexJob] = {}
+        self._current: ReindexJob | None = None
+
+    @property
+    def current(self) -> ReindexJob | None:
+        job = self._current
+        return job if job is not None and not job.finished else None
+
+    def start(self) -> tuple[ReindexJob, bool]:
+        """
+        (job, created): a reindex already in progress is returned instead of starting a second one.
+        """
+        running = self.current
+        if running is not None:
+            return running, False
+        job = ReindexJob(uuid.uuid4().hex[:12])
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self._keep:
+            oldest = next(iter(self._jobs))
+            if oldest == job.job_id:
+                break
+            del self._jobs[oldest]
+        self._current = job
+        job.task = asyncio.ensure_future(self._execute(job))
+        return job, True
+
+    async def _execute(self, job: ReindexJob) -> None:
+        job.state = "running"
+        job.started_at = time.time()
+        logger.info("RAG reindex job started: job_id=%s", job.job_id)
+        try:
+            job.result = await self._run(job.progress)
+            job.state = "done"
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+            raise
+        except Exception as e:
+            job.state = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+            logger.exception("RAG reindex job failed: job_id=%s", job.job_id)
+        finally:
+            job.finished_at = time.time()
+            job.progress.finish(job.state)
+            logger.info(
+                "RAG reindex job finished: job_id=%s state=%s seconds=%s",
+                job.job_id,
+                job.state,
+                round(job.finished_at - job.started_at, 2),
+            )
+
+    def get(self, job_id: str) -> ReindexJob | None:
+        return self._jobs.get(job_id)
+
+    def latest(self) -> ReindexJob | None:
+        return self._current
+
+    async def cancel_running(self) -> None:
+        """
+        On shutdown: the ingest checkpoint lets the next reindex resume where this one stopped.
+        """
+        job = self.current
+        if job is not None and job.task is not None:
+            job.task.cancel()
+            try:
+                await job.task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+from contextlib import ExitStack
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+
+from backend.rag.doc_collections import default_collection
+from backend.rag.quantize import QuantizedMatrix, quantize_int8
+
+
+logger = logging.getLogger("campus_assistant")
+
+SNAPSHOT_FORMAT = 2
+
+# One fixed-size record per chunk; row i of the vector file belongs to record i.
+ROW_DTYPE = np.dtype(
+    [
+        ("chunk_id", "<i8"),
+        ("source", "<i4"),
+        ("chunk_index", "<i4"),
+        ("text_offset", "<i8"),
+        ("text_len", "<i4"),
+        ("heading", "<i4"),
+    ]
+)
+
+_CURRENT = "CURRENT"
+_GEN_RE = re.compile(r"^g(\d+)\.")
+
+# Vector file(s) per quantization mode (row i of each belongs to record i)
+_VECTOR_EXTS = {"f32": ("f32",), "int8": ("i8", "scale")}
+
+
+def _gen_prefix(generation: int) -> str:
+    return f"g{int(generation):08d}"
+
+
+@dataclass(frozen=True)
+class SnapshotRow:
+    chunk_id: int
+    source: str
+    chunk_index: int
+    text: str
+    embedding: np.ndarray
+    heading: str = ""
+    collection: str = ""
+
+
+class IndexSnapshot:
+    """
+    Read-only view over a published index generation:
+    - <gen>.f32  : row-major float32 matrix (count x dim), rows pre-normalized; with int8 quantization
+                   (meta "quantization") <gen>.i8 int8 codes + <gen>.scale per-row scales instead
+    - <gen>.rows : ROW_DTYPE records (chunk id, source id, chunk index, text offset/len, heading id)
+    - <gen>.txt  : concatenated UTF-8 chunk texts
+    - <gen>.json : small metadata sidecar (dim, count, model, fingerprint, source names, heading paths,
+                   collections)
+    Rows are grouped by collection: each collection is one contiguous block of rows (its own vector block,
+    searched by its own vector backend).
+
+    Everything is memory-mapped, so several processes opening the same generation share pages
+    through the OS page cache, and chunk text is only decoded for the rows actually returned.
+    Searches lease the generation (acquire / release); once it is retired (swapped out) the text map and
+    its file are closed when the last lease is released.
+    """
+
+    def __init__(self, snapshot_dir: Path, meta: dict):
+        self.snapshot_dir = snapshot_dir
+        self.meta = meta
+        self.generation = int(meta["generation"])
+        self.count = int(meta["count"])
+        self.dim = int(meta["dim"])
+        self.embed_model = str(meta.get("embed_model") or "")
+        self.docs_fingerprint = str(meta.get("docs_fingerprint") or "")
+        self.sources: list[str] = list(meta.get("sources") or [])
+        self.headings: list[str] = list(meta.get("headings") or [])
+        self.quantization = str(meta.get("quantization") or "f32")
+        if self.quantization not in _VECTOR_EXTS:
+            raise ValueError(f"unsupported quantization: {self.quantization!r}")
+        # name -> (start row, stop row); older snapshots are one block of the default collection
+        self.collections: dict[str, tuple[int, int]] = {
+            str(name): (int(start), int(start) + int(count))
+            for name, start, count in (meta.get("collections") or [[default_collection(), 0, self.count]])
+        }
+        blocks = sorted((start, name) for name, (start, _stop) in self.collections.items())
+        self._block_starts = [start for start, _ in blocks]
+        self._block_names = [name for _, name in blocks]
+
+        prefix = snapshot_dir / _gen_prefix(self.generation)
+        self._prefix = prefix
+        # Vector search backend per collection block of `matrix` (exact / IVF), attached by EmbeddingRagIndex
+        self.searchers: dict[str, object] = {}
+        # BM25 index over the same rows (backend.rag.lexical.LexicalIndex), attached likewise
+        self.lexical = None
+        # Token count per collection (same order as `collections`), for the query router
+        self.collection_tokens: np.ndarray | None = None
+        if self.count > 0:
+            shape = (self.count, self.dim)
+            if self.quantization == "int8":
+                self.matrix = QuantizedMatrix(
+                    np.memmap(f"{prefix}.i8", dtype="i1", mode="r", shape=shape),
+                    np.memmap(f"{prefix}.scale", dtype="<f4", mode="r", shape=(self.count,)),
+                )
+            else:
+                self.matrix = np.memmap(f"{prefix}.f32", dtype="<f4", mode="r", shape=shape)
+            self.rows = np.memmap(f"{prefix}.rows", dtype=ROW_DTYPE, mode="r", shape=(self.count,))
+        else:
+            self.matrix = np.zeros((0, self.dim), dtype=np.float32)
+            self.rows = np.zeros(0, dtype=ROW_DTYPE)
+        self._text_file = open(f"{prefix}.txt", "rb")
+        size = os.fstat(self._text_file.fileno()).st_size
+        self._texts = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        self._lease_lock = threading.Lock()
+        self._leases = 0
+        self._retired = False
+
+    @classmethod
+    def open_current(cls, snapshot_dir: Path) -> IndexSnapshot | None:
+        pointer = snapshot_dir / _CURRENT
+        try:
+            name = pointer.read_text(encoding="utf-8").strip()
+            meta = json.loads((snapshot_dir / name).read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return None
+        if int(meta.get("format", 0)) != SNAPSHOT_FORMAT:
+            logger.warning("RAG snapshot format mismatch: %s (expected %s)", meta.get("format"), SNAPSHOT_FORMAT)
+            return None
+        try:
+            return cls(snapshot_dir, meta)
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning("RAG snapshot open failed: %s: %s", type(e).__name__, e)
+            return None
+
+    def path(self, ext: str) -> Path:
+        """
+        Path of an auxiliary file belonging to this generation (pruned together with it).
+        """
+        return Path(f"{self._prefix}.{ext}")
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def vector_bytes(self) -> int:
+        return int(self.matrix.nbytes)
+
+    def block(self, collection: str) -> np.ndarray | QuantizedMatrix:
+        """
+        The collection's rows of `matrix` (a view); block row i is snapshot row start + i.
+        """
+        start, stop = self.collections[collection]
+        if isinstance(self.matrix, QuantizedMatrix):
+            return self.matrix.row_range(start, stop)
+        return self.matrix[start:stop]
+
+    def collection(self, i: int) -> str:
+        return self._block_names[max(0, bisect.bisect_right(self._block_starts, int(i)) - 1)]
+
+    def acquire(self) -> bool:
+        """
+        Lease this generation for one search; False once it is retired (take the newly served one instead).
+        """
+        with self._lease_lock:
+            if self._retired:
+                return False
+            self._leases += 1
+            return True
+
+    def release(self) -> None:
+        with self._lease_lock:
+            self._leases -= 1
+            done = self._retired and self._leases == 0
+        if done:
+            self.close()
+
+    def retire(self) -> None:
+        """
+        No longer served: close now, or when the last in-flight search releases it.
+        """
+        with self._lease_lock:
+            self._retired = True
+            done = self._leases == 0
+        if done:
+            self.close()
+
+    def close(self) -> None:
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+        self._text_file.close()
+
+    def chunk_id(self, i: int) -> int:
+        return int(self.rows[i]["chunk_id"])
+
+    def source(self, i: int) -> str:
+        return self.sources[int(self.rows[i]["source"])]
+
+    def chunk_index(self, i: int) -> int:
+        return int(self.rows[i]["chunk_index"])
+
+    def heading(self, i: int) -> str:
+        return self.headings[int(self.rows[i]["heading"])]
+
+    def text(self, i: int) -> str:
+        r = self.rows[i]
+        off = int(r["text_offset"])
+        return bytes(self._texts[off : off + int(r["text_len"])]).decode("utf-8", errors="ignore")
+
+
+def write_snapshot(
+    snapshot_dir: Path,
+    *,
+    generation: int,
+    dim: int,
+    rows: Iterable[SnapshotRow],
+    embed_model: str,
+    docs_fingerprint: str,
+    quantization: str = "f32",
+) -> dict:
+    """
+    Stream rows into a new generation and atomically repoint CURRENT at it.
+    Rows are expected to carry already-normalized float32 embeddings, grouped by collection (all rows of
+    a collection in one run); `quantization` (f32 / int8) picks how they are stored in the vector file(s).
+    """
+    vector_exts = _VECTOR_EXTS[quantization]
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    prefix = _gen_prefix(generation)
+    tmp = snapshot_dir / f"{prefix}.tmp"
+
+    sources: list[str] = []
+    source_ids: dict[str, int] = {}
+    # Heading paths repeat across many chunks of a section: stored once in the sidecar
+    headings: list[str] = [""]
+    heading_ids: dict[str, int] = {"": 0}
+    # [name, first row, row count] per collection, in row order
+    collections: list[list] = []
+    count = 0
+    text_offset = 0
+    with ExitStack() as files:
+        vfs = [files.enter_context(open(f"{tmp}.{ext}", "wb")) for ext in vector_exts]
+        rf = files.enter_context(open(f"{tmp}.rows", "wb"))
+        tf = files.enter_context(open(f"{tmp}.txt", "wb"))
+        for row in rows:
+            vec = np.asarray(row.embedding, dtype="<f4").reshape(-1)
+            if vec.shape[0] != dim:
+                raise ValueError(f"embedding dim mismatch: {vec.shape[0]} != {dim} (chunk_id={row.chunk_id})")
+            collection = row.collection or default_collection()
+            if not collections or collections[-1][0] != collection:
+                if any(c[0] == collection for c in collections):
+                    raise ValueError(f"rows of collection {collection!r} are not contiguous (chunk_id={row.chunk_id})")
+                collections.append([collection, count, 0])
+            collections[-1][2] += 1
+            sid = source_ids.get(row.source)
+            if sid is None:
+                sid = source_ids[row.source] = len(sources)
+                sources.append(row.source)
+            hid = heading_ids.get(row.heading)
+            if hid is None:
+                hid = heading_ids[row.heading] = len(headings)
+                headings.append(row.heading)
+            text_bytes = row.text.encode("utf-8")
+            rec = np.array([(row.chunk_id, sid, row.chunk_index, text_offset, len(text_bytes), hid)], dtype=ROW_DTYPE)
+            if quantization == "int8":
+                codes, scale = quantize_int8(vec)
+                vfs[0].write(codes.tobytes())
+                vfs[1].write(np.float32(scale).astype("<f4").tobytes())
+            else:
+                vfs[0].write(vec.tobytes())
+            rf.write(rec.tobytes())
+            tf.write(text_bytes)
+            text_offset += len(text_bytes)
+            count += 1
+
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "generation": int(generation),
+        "count": count,
+        "dim": int(dim),
+        "embed_model": embed_model,
+        "docs_fingerprint": docs_fingerprint,
+        "sources": sources,
+        "headings": headings,
+        "quantization": quantization,
+        "collections": collections,
+    }
+    for ext in (*vector_exts, "rows", "txt"):
+        os.replace(f"{tmp}.{ext}", snapshot_dir / f"{prefix}.{ext}")
+    (snapshot_dir / f"{prefix}.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+    pointer_tmp = snapshot_dir / f"{_CURRENT}.tmp"
+    pointer_tmp.write_text(f"{prefix}.json", encoding="utf-8")
+    os.replace(pointer_tmp, snapshot_dir / _CURRENT)
+
+    _prune_generations(snapshot_dir, keep_from=int(generation) - 1)
+    return meta
+
+
+def _prune_generations(snapshot_dir: Path, keep_from: int) -> None:
+    # Readers that still map an older generation keep their pages (unlink only drops the name).
+    for p in snapshot_dir.iterdir():
+        m = _GEN_RE.match(p.name)
+        if m and int(m.group(1)) < keep_from:
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
@@ -1,68 +1,93 @@
 from __future__ import annotations
 
 import json
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
 from pathlib import Path
 
+from backend.rag.aho_corasick import OVERLAP_MODES, AhoCorasick
+from backend.rag.teacher_profiles import TeacherProfileStore
+
+
+def _default_overlap() -> str:
+    # none: leftmost-longest, non-overlapping | all: also report names nested in / overlapping other names
+    return os.getenv("TEACHER_MATCH_OVERLAP", "none").strip().lower() or "none"
+
 
 @dataclass
 class TeacherMatchService:
     teachers_json_path: Path
     max_hits: int = 3
+    overlap: str = field(default_factory=_default_overlap)
+    # Precomputed profile snippets (python -m backend.rag.teacher_profiles); optional
+    profile_store: TeacherProfileStore | None = None
 
-    _teacher_map: dict[str, str] | None = None
     _mtime: float | None = None
+    # (name -> url, matcher over the names), rebuilt and swapped as one object: find_mentions runs on
+    # scoring threads, so a concurrent reload must never pair a map with another map's matcher
+    _loaded: tuple[dict[str, str], AhoCorasick | None] | None = None
 
-    def _reload_if_needed(self) -> None:
+    def __post_init__(self) -> None:
+        self.overlap = (self.overlap or "none").strip().lower()
+        if self.overlap not in OVERLAP_MODES:
+            raise ValueError(f"unknown TEACHER_MATCH_OVERLAP: {self.overlap!r} (expected one of {OVERLAP_MODES})")
+
+    def _reload_if_needed(self) -> tuple[dict[str, str], AhoCorasick | None]:
         if not self.teachers_json_path.exists():
-            self._teacher_map = {}
+            self._loaded = ({}, None)
             self._mtime = None
-            return
+            return self._loaded
         mtime = self.teachers_json_path.stat().st_mtime
-        if self._teacher_map is not None and self._mtime == mtime:
-            return
+        loaded = self._loaded
+        if loaded is not None and self._mtime == mtime:
+            return loaded
         try:
             raw = self.teachers_json_path.read_text(encoding="utf-8", errors="ignore")
             data = json.loads(raw) if raw.strip() else {}
             if isinstance(data, dict):
-                self._teacher_map = {str(k).strip(): str(v).strip() for k, v in data.items() if str(k).strip()}
+                teacher_map = {str(k).strip(): str(v).strip() for k, v in data.items() if str(k).strip()}
             else:
-                self._teacher_map = {}
-            self._mtime = mtime
+                teacher_map = {}
         except Exception:
-            self._teacher_map = {}
-            self._mtime = mtime
+            teacher_map = {}
+        # Single-character names would match almost any message
+        loaded = (teacher_map, AhoCorasick(n for n in teacher_map if len(n) >= 2))
+        self._loaded = loaded
+        self._mtime = mtime
+        return loaded
 
     def find_mentions(self, user_message: str) -> list[dict]:
         msg = (user_message or "").strip()
         if not msg:
             return []
-        self._reload_if_needed()
-        teacher_map = self._teacher_map or {}
-        if not teacher_map:
+        teacher_map, matcher = self._reload_if_needed()
+        if not teacher_map or matcher is None:
             return []
 
-        hits: list[tuple[str, str]] = []
-        for name, url in teacher_map.items():
-            if len(name) < 2:
-                continue
-            if name in msg:
-                hits.append((name, url))
+        # In order of appearance in the message; a name mentioned twice is reported once
+        hits: dict[str, str] = {}
+        for _start, _end, pid in matcher.find(msg, overlap=self.overlap):
+            name = matcher.patterns[pid]
+            if name not in hits:
+                hits[name] = teacher_map[name]
                 if len(hits) >= self.max_hits:
                     break
 
-        return [{"name": n, "url": u} for n, u in hits]
+        return [{"name": n, "url": u} for n, u in hits.items()]
 
     def build_teacher_context(self, hits: list[dict]) -> str | None:
         if not hits:
             return None
         lines = ["【本地资料片段：teachers-ms-shu.json（教师名录命中）】"]
-        for h in hits:
-            name = str(h.get("name") or "").strip()
+        names = [str(h.get("name") or "").strip() for h in hits]
+        profiles = self.profile_store.snippets([n for n in names if n]) if self.profile_store is not None else {}
+        for h, name in zip(hits, names):
             url = str(h.get("url") or "").strip()
             if not name:
                 continue
             lines.append(f"- 教师：{name}")
+            if profiles.get(name):
+                lines.append(f"  资料：{profiles[name]}")
             if url:
                 lines.append(f"  主页/介绍页：{url}")
         return "\n".join(lines).strip()
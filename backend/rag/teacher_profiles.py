@@ -0,0 +1,388 @@
+"""
+Offline ingestion of saved teacher profile pages into a compact SQLite table.
+
+Profile pages (HTML saved from the school site) are parsed once; department, title, research areas,
+contact info and a short bio are extracted, and a size-capped snippet is precomputed per teacher.
+At chat time `TeacherMatchService.build_teacher_context` only reads those snippets by primary key.
+
+Run from the repo root:
+    python -m backend.rag.teacher_profiles --pages-dir docs/teacher_pages
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import asdict, dataclass
+from html.parser import HTMLParser
+from pathlib import Path
+
+from backend.rag.aho_corasick import AhoCorasick
+
+
+logger = logging.getLogger("campus_assistant")
+
+
+def _profile_max_chars() -> int:
+    return max(80, int(os.getenv("TEACHER_PROFILE_MAX_CHARS", "300")))
+
+
+_BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "tr", "td", "th", "table", "h1", "h2", "h3", "h4", "h5", "h6",
+    "section", "article", "dt", "dd", "span", "strong", "b",
+}
+_SKIP_TAGS = {"script", "style", "noscript", "nav", "footer", "form"}
+
+# Label -> field. Checked in order, so more specific labels come first.
+_LABELS: list[tuple[str, str]] = [
+    ("研究方向", "research"),
+    ("研究领域", "research"),
+    ("研究兴趣", "research"),
+    ("主要研究", "research"),
+    ("所在单位", "department"),
+    ("所在院系", "department"),
+    ("所属院系", "department"),
+    ("工作单位", "department"),
+    ("院系", "department"),
+    ("学院", "department"),
+    ("部门", "department"),
+    ("职称", "title"),
+    ("职务", "title"),
+    ("电子邮件", "email"),
+    ("电子邮箱", "email"),
+    ("邮箱", "email"),
+    ("e-mail", "email"),
+    ("email", "email"),
+    ("联系电话", "phone"),
+    ("办公电话", "phone"),
+    ("电话", "phone"),
+    ("办公地点", "office"),
+    ("办公室", "office"),
+    ("个人简介", "bio"),
+    ("简介", "bio"),
+    ("个人简历", "bio"),
+]
+_LABEL_RE = re.compile(
+    r"^\s*(?P<label>" + "|".join(re.escape(k) for k, _ in _LABELS) + r")\s*(?P<sep>[:：])?\s*(?P<value>.*)$",
+    re.IGNORECASE,
+)
+_LABEL_FIELDS = {k.lower(): v for k, v in _LABELS}
+_EMAIL_RE = re.compile(r"[A-Za-z0-9._%+\-]+@[A-Za-z0-9.\-]+\.[A-Za-z]{2,}")
+_PHONE_RE = re.compile(r"(?:\+?86[\s\-]?)?(?:0\d{2,3}[\s\-]?\d{7,8}|1[3-9]\d{9})")
+
+
+class _TextExtractor(HTMLParser):
+    """
+    Visible text of a page as lines (block tags break lines), plus <title> / first <h1>.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: list[str] = []
+        self.title = ""
+        self.h1 = ""
+        self._buf: list[str] = []
+        self._skip = 0
+        self._in_title = False
+        self._in_h1 = False
+
+    def _flush(self) -> None:
+        line = re.sub(r"\s+", " ", "".join(self._buf)).strip()
+        self._buf = []
+        if line:
+            self.lines.append(line)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        if tag == "title":
+            self._in_title = True
+        if tag == "h1" and not self.h1:
+            self._in_h1 = True
+        if tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS and self._skip:
+            self._skip -= 1
+        if tag == "title":
+            self._in_title = False
+        if tag == "h1":
+            self._in_h1 = False
+        if tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip:
+            return
+        if self._in_h1:
+            self.h1 += data
+        self._buf.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+        self.title = self.title.strip()
+        self.h1 = self.h1.strip()
+
+
+@dataclass
+class TeacherProfile:
+    name: str
+    url: str = ""
+    department: str = ""
+    title: str = ""
+    research: str = ""
+    email: str = ""
+    phone: str = ""
+    office: str = ""
+    bio: str = ""
+
+    def snippet(self, max_chars: int) -> str:
+        parts = [
+            f"{label}：{value}"
+            for label, value in (
+                ("院系", self.department),
+                ("职称", self.title),
+                ("研究方向", self.research),
+                ("邮箱", self.email),
+                ("电话", self.phone),
+                ("办公室", self.office),
+                ("简介", self.bio),
+            )
+            if value
+        ]
+        s = "；".join(parts)
+        return s if len(s) <= max_chars else s[: max_chars - 1] + "…"
+
+
+def _clip(s: str, limit: int) -> str:
+    s = re.sub(r"\s+", " ", s).strip(" :：;；,，")
+    return s if len(s) <= limit else s[: limit - 1] + "…"
+
+
+def extract_profile(html: str, name: str, url: str = "") -> TeacherProfile:
+    """
+    Pull labelled fields out of a profile page. Handles both "标签：值" on one line and
+    table layouts where the value is in the next cell.
+    """
+    p = _TextExtractor()
+    p.feed(html)
+    p.close()
+
+    fields: dict[str, list[str]] = {}
+    current: str | None = None
+    for line in p.lines:
+        m = _LABEL_RE.match(line)
+        # "标签：值", or a bare label cell; prose that merely starts with a label word is not a label
+        if m and (m.group("sep") or not m.group("value")):
+            current = _LABEL_FIELDS[m.group("label").lower()]
+            value = m.group("value").strip()
+            if value:
+                fields.setdefault(current, []).append(value)
+            # bio continues over the following lines; other labels take only the next value
+            continue
+        if current is not None:
+            fields.setdefault(current, []).append(line)
+            if current != "bio":
+                current = None
+
+    text = "\n".join(p.lines)
+    email = " ".join(fields.get("email", [])).replace("[at]", "@").replace("(at)", "@").replace("#", "@")
+    em = _EMAIL_RE.search(email) or _EMAIL_RE.search(text.replace("[at]", "@").replace("(at)", "@"))
+    phone_src = " ".join(fields.get("phone", [])) or text
+    ph = _PHONE_RE.search(phone_src)
+    return TeacherProfile(
+        name=name,
+        url=url,
+        department=_clip(" ".join(fields.get("department", [])[:1]), 40),
+        title=_clip(" ".join(fields.get("title", [])[:1]), 30),
+        research=_clip("；".join(fields.get("research", [])[:3]), 120),
+        email=em.group(0) if em else "",
+        phone=ph.group(0) if ph else "",
+        office=_clip(" ".join(fields.get("office", [])[:1]), 40),
+        bio=_clip(" ".join(fields.get("bio", [])), 200),
+    )
+
+
+class TeacherProfileStore:
+    """
+    teacher_profiles(name PK, ...extracted fields, snippet): written by the offline ingestion,
+    read by primary key on the chat path.
+    """
+
+    def __init__(self, db_path: Path):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self._con: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._con is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(self.db_path, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS teacher_profiles (
+                  name TEXT PRIMARY KEY,
+                  url TEXT NOT NULL,
+                  department TEXT NOT NULL,
+                  title TEXT NOT NULL,
+                  research TEXT NOT NULL,
+                  email TEXT NOT NULL,
+                  phone TEXT NOT NULL,
+                  office TEXT NOT NULL,
+                  bio TEXT NOT NULL,
+                  snippet TEXT NOT NULL,
+                  source_file TEXT NOT NULL,
+                  content_hash TEXT NOT NULL,
+                  updated_at REAL NOT NULL
+                )
+                """
+            )
+            con.execute("CREATE INDEX IF NOT EXISTS idx_teacher_profiles_department ON teacher_profiles(department)")
+            con.execute("CREATE INDEX IF NOT EXISTS idx_teacher_profiles_source ON teacher_profiles(source_file)")
+            self._con = con
+        return self._con
+
+    def close(self) -> None:
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+    def snippets(self, names: list[str]) -> dict[str, str]:
+        if not names or not self.db_path.exists():
+            return {}
+        marks = ",".join("?" * len(names))
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT name, snippet FROM teacher_profiles WHERE name IN ({marks})", list(names)
+            ).fetchall()
+        return {str(n): str(s) for n, s in rows if s}
+
+    def stats(self) -> dict:
+        if not self.db_path.exists():
+            return {"db_path": str(self.db_path), "profiles": 0}
+        with self._lock:
+            n = int(self._connect().execute("SELECT COUNT(*) FROM teacher_profiles").fetchone()[0])
+        return {"db_path": str(self.db_path), "profiles": n}
+
+    def ingest_dir(self, pages_dir: Path, teacher_map: dict[str, str], *, max_chars: int | None = None) -> dict:
+        """
+        Parse every *.html / *.htm under pages_dir. A page is matched to a directory entry by file stem
+        (teacher name, or the page id from the directory URL), else by the first name found in <title>/<h1>.
+        Pages whose content hash and extraction settings (max_chars) are unchanged are skipped; profiles of
+        deleted pages, and of changed pages that no longer match a teacher, are removed.
+        """
+        start_ts = time.time()
+        max_chars = max_chars or _profile_max_chars()
+        by_page_id = {Path(u.split("?", 1)[0]).stem: n for n, u in teacher_map.items() if u}
+        matcher = AhoCorasick(n for n in teacher_map if len(n) >= 2)
+        pages = sorted(p for p in pages_dir.rglob("*") if p.suffix.lower() in {".html", ".htm"}) if pages_dir.exists() else []
+
+        with self._lock, self._connect() as con:
+            known = {str(f): str(h) for f, h in con.execute("SELECT source_file, content_hash FROM teacher_profiles")}
+            current_files = {str(p.relative_to(pages_dir)) for p in pages}
+            removed = sorted(set(known) - current_files)
+            for f in removed:
+                con.execute("DELETE FROM teacher_profiles WHERE source_file=?", (f,))
+
+        ingested: list[str] = []
+        skipped: list[str] = []
+        unmatched: list[str] = []
+        for path in pages:
+            rel = str(path.relative_to(pages_dir))
+            raw = path.read_bytes()
+            # The snippet depends on max_chars too: a new cap re-extracts every page
+            content_hash = f"{hashlib.sha256(raw).hexdigest()}:{max_chars}"
+            if known.get(rel) == content_hash:
+                skipped.append(rel)
+                continue
+            html = raw.decode("utf-8", errors="ignore")
+            name = path.stem if path.stem in teacher_map else by_page_id.get(path.stem)
+            if name is None:
+                head = _TextExtractor()
+                head.feed(html)
+                head.close()
+                found = matcher.find(f"{head.h1} {head.title}")
+                name = matcher.patterns[found[0][2]] if found else None
+            if name is None:
+                unmatched.append(rel)
+                with self._lock, self._connect() as con:
+                    con.execute("DELETE FROM teacher_profiles WHERE source_file=?", (rel,))
+                continue
+            prof = extract_profile(html, name, teacher_map.get(name, ""))
+            row = asdict(prof)
+            with self._lock, self._connect() as con:
+                con.execute("DELETE FROM teacher_profiles WHERE source_file=?", (rel,))
+                con.execute(
+                    "INSERT INTO teacher_profiles(name, url, department, title, research, email, phone, office, bio, "
+                    "snippet, source_file, content_hash, updated_at) VALUES(?,?,?,?,?,?,?,?,?,?,?,?,?) "
+                    "ON CONFLICT(name) DO UPDATE SET url=excluded.url, department=excluded.department, "
+                    "title=excluded.title, research=excluded.research, email=excluded.email, phone=excluded.phone, "
+                    "office=excluded.office, bio=excluded.bio, snippet=excluded.snippet, "
+                    "source_file=excluded.source_file, content_hash=excluded.content_hash, updated_at=excluded.updated_at",
+                    (
+                        *(row[k] for k in ("name", "url", "department", "title", "research", "email", "phone", "office", "bio")),
+                        prof.snippet(max_chars),
+                        rel,
+                        content_hash,
+                        time.time(),
+                    ),
+                )
+            ingested.append(name)
+
+        result = {
+            "ok": True,
+            "pages": len(pages),
+            "ingested": len(ingested),
+            "skipped": len(skipped),
+            "removed": removed,
+            "unmatched": unmatched,
+            "seconds": round(time.time() - start_ts, 2),
+        }
+        logger.info("Teacher profiles ingested: %s", json.dumps(result, ensure_ascii=False))
+        return result
+
+
+def _load_teacher_map(path: Path) -> dict[str, str]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8", errors="ignore") or "{}")
+    except (FileNotFoundError, ValueError):
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {str(k).strip(): str(v).strip() for k, v in data.items() if str(k).strip()}
+
+
+def main() -> None:
+    repo_root = Path(__file__).resolve().parents[2]
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages-dir", type=Path, default=repo_root / "docs" / "teacher_pages")
+    ap.add_argument("--teachers", type=Path, default=repo_root / "docs" / "teachers-ms-shu.json")
+    ap.add_argument("--db", type=Path, default=repo_root / "data" / "teachers.sqlite")
+    ap.add_argument("--max-chars", type=int, default=0, help="snippet cap (default TEACHER_PROFILE_MAX_CHARS=300)")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s - %(message)s")
+    store = TeacherProfileStore(args.db)
+    try:
+        result = store.ingest_dir(args.pages_dir, _load_teacher_map(args.teachers), max_chars=args.max_chars or None)
+    finally:
+        store.close()
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single worker there
+    fcntl = None
+
+
+logger = logging.getLogger("campus_assistant")
+
+
+class IndexLocked(RuntimeError):
+    """
+    This process may not write the index right now: another process holds the writer lock,
+    a reindex is already running here, or the worker is read-only (RAG_READ_ONLY).
+    """
+
+
+class IndexWriterLock:
+    """
+    Cross-process single-writer lock for one index (flock on <db>.lock).
+
+    Only the holder modifies rag.sqlite and publishes snapshot generations; every other worker just maps
+    the published generations. The kernel drops the lock when the holder exits, so a crashed writer never
+    leaves it stuck; the holder's pid/host/start time are written into the file for status pages.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: int | None = None
+        self._info: dict | None = None
+        # flock is per open file: serialize use within this process separately
+        self._lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def acquire(self, blocking: bool = False) -> bool:
+        """
+        False if another process (or this one) already holds the lock; with `blocking`, wait for another
+        process to release it instead (still False if this process holds it).
+        """
+        with self._lock:
+            if self._fd is not None:
+                return False
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            if fcntl is not None:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    return False
+            info = {"pid": os.getpid(), "host": socket.gethostname(), "since": round(time.time(), 3)}
+            os.ftruncate(fd, 0)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, json.dumps(info).encode("utf-8"))
+            self._fd, self._info = fd, info
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            fd, self._fd, self._info = self._fd, None, None
+        if fd is None:
+            return
+        try:
+            # An empty file means "free" to holder() in other processes
+            os.ftruncate(fd, 0)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def holder(self) -> dict | None:
+        """
+        Current holder ({pid, host, since}) or None. Reads the file only, never probes the lock itself
+        (a probe could make a concurrent acquire fail).
+        """
+        if self._info is not None:
+            return dict(self._info)
+        try:
+            raw = self.path.read_bytes()
+        except FileNotFoundError:
+            return None
+        if not raw.strip():
+            return None
+        try:
+            info = json.loads(raw)
+        except ValueError:
+            # Written concurrently by a holder that just acquired it
+            return {}
+        pid = info.get("pid")
+        if info.get("host") == socket.gethostname() and isinstance(pid, int) and not _pid_alive(pid):
+            # Left behind by a writer that crashed; the lock itself is already free
+            return None
+        return info
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
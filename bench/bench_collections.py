@@ -0,0 +1,176 @@
+"""
+Per-query work with named collections: search everything vs. routed (CORI router) vs. an explicit filter.
+
+Builds a corpus of about --chunks chunks: the real docs plus synthetic files drawn from one real
+document each, so every collection grows with its source (law = civil code, guidance = student
+handbook, ...). Collections come from RAG_COLLECTIONS globs. Queries are snippets of real chunks of
+each collection. For each mode the script reports ms/query, rows in the searched blocks per query, how often
+the query's own collection is among the routed ones, and the overlap of the top-k with searching
+everything. Query embeddings are cached before timing (the stub is not part of the numbers).
+
+Run from the repo root:
+    python -m bench.bench_collections --chunks 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from bench.bench_load import _latency
+from bench.corpus import write_synthetic
+from bench.stub_server import start_stub
+
+# Collection -> file name globs of the shipped docs; synthetic files are named "<collection>__..."
+RULES = {
+    "admissions": ["*招生*"],
+    "guidance": ["*student_guidance*"],
+    "hr": ["*教职工*"],
+    "it": ["*vpn*"],
+    "law": ["civil_code*"],
+}
+
+
+def _build(docs_dir: Path, out_dir: Path, chunks: int, seed: int) -> dict[str, list]:
+    """
+    Copy docs_dir and add synthetic files per source document; returns collection -> real chunks (query pool).
+    """
+    from backend.rag.chunker import chunk_lines
+    from backend.rag.doc_collections import collection_for
+    from backend.rag.ingest import iter_documents, reader_for
+
+    shutil.copytree(docs_dir, out_dir)
+    pools = {p: list(chunk_lines(reader_for(p)(p))) for p in iter_documents(out_dir)}
+    total = sum(len(v) for v in pools.values())
+    rng = random.Random(seed)
+    by_collection: dict[str, list] = {}
+    file_no = 0
+    for p, pool in pools.items():
+        collection = collection_for(p)
+        by_collection.setdefault(collection, []).extend(pool)
+        need = max(0, round(chunks * len(pool) / total) - len(pool))
+        while need > 0 and pool:
+            file_no += 1
+            n = min(200, need)
+            path = write_synthetic(out_dir, pool, file_no, n, rng)
+            path.rename(out_dir / f"{collection}__{path.name}")
+            need -= n
+    return by_collection
+
+
+async def _run(args, docs: Path, data: Path, pools: dict[str, list]) -> dict:
+    from backend.http_clients import close_clients
+    from backend.rag.embedding_index import EmbeddingRagIndex
+    from backend.rag.lexical import query_terms
+
+    index = EmbeddingRagIndex(docs, data / "rag.sqlite")
+    res = await index.reindex()
+    snap = index._snapshot
+    sizes = {name: stop - start for name, (start, stop) in snap.collections.items()}
+
+    rng = random.Random(args.seed + 1)
+    queries: list[tuple[str, str]] = []
+    for collection, pool in sorted(pools.items()):
+        for c in rng.sample(pool, min(args.queries, len(pool))):
+            text = c.text.strip().replace("\n", " ")
+            start = rng.randrange(max(1, len(text) - args.query_chars))
+            queries.append((collection, text[start : start + args.query_chars]))
+
+    scored: list[int] = []
+    score = index._score
+
+    def counting_score(snap_, q_emb, lexical, top_k, min_score, pool_k, names, eligible=None):
+        scored[-1] += sum(sizes[n] for n in names)
+        return score(snap_, q_emb, lexical, top_k, min_score, pool_k, names, eligible)
+
+    index._score = counting_score
+    search_kw = {"min_score": 0.0, "min_keyword_hits": args.min_keyword_hits}
+    for _, q in queries:
+        await index.embed_query(q)
+
+    baseline: dict[str, list[int]] = {}
+    modes = []
+    for mode in ("all", "routed", "filtered"):
+        os.environ["RAG_ROUTE_COLLECTIONS"] = "0" if mode == "all" else str(args.route)
+        latencies: list[float] = []
+        scored.clear()
+        overlap: list[float] = []
+        routed_hit = 0
+        for collection, q in queries:
+            scored.append(0)
+            t0 = time.perf_counter()
+            hits = await index.search(q, args.k, collection=collection if mode == "filtered" else None, **search_kw)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            ids = [h["chunk_id"] for h in hits]
+            if mode == "all":
+                baseline[q] = ids
+            elif baseline.get(q):
+                overlap.append(len(set(ids) & set(baseline[q])) / len(baseline[q]))
+            if mode == "routed":
+                routed_hit += collection in index._route(snap, query_terms(q))[0]
+        row = {
+            "mode": mode,
+            "latency_ms": _latency(latencies),
+            "rows_searched_per_query": round(sum(scored) / len(scored)),
+            "fraction_searched": round(sum(scored) / len(scored) / len(snap), 4),
+        }
+        if mode != "all":
+            row[f"overlap@{args.k}_with_all"] = round(sum(overlap) / max(1, len(overlap)), 4)
+        if mode == "routed":
+            row["own_collection_routed"] = round(routed_hit / len(queries), 4)
+        modes.append(row)
+    index.close()
+    await close_clients()
+    return {
+        "bench": "collections",
+        "chunks": res["chunks"],
+        "collections": sizes,
+        "queries": len(queries),
+        "k": args.k,
+        "min_keyword_hits": args.min_keyword_hits,
+        "route_collections": args.route,
+        "modes": modes,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", default="docs")
+    ap.add_argument("--chunks", type=int, default=50000)
+    ap.add_argument("--queries", type=int, default=20, help="per collection")
+    ap.add_argument("--query-chars", type=int, default=16)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--route", type=int, default=1, help="RAG_ROUTE_COLLECTIONS for the routed mode")
+    ap.add_argument("--min-keyword-hits", type=int, default=0, help="RAG_MIN_KEYWORD_HITS (0: no keyword filter)")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+
+    os.environ.update(
+        {
+            "RAG_COLLECTIONS": ";".join(f"{c}={','.join([*globs, f'{c}__*'])}" for c, globs in RULES.items()),
+            "RAG_SCORING_THREADS": "0",
+            "LOG_LEVEL": "WARNING",
+        }
+    )
+    server, _cfg, base_url = start_stub(dim=args.dim)
+    os.environ["OLLAMA_BASE_URL"] = base_url
+    tmp = Path(tempfile.mkdtemp(prefix="bench_collections_"))
+    try:
+        pools = _build(Path(args.docs), tmp / "docs", args.chunks, args.seed)
+        result = asyncio.run(_run(args, tmp / "docs", tmp / "data", pools))
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
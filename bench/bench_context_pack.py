@@ -0,0 +1,174 @@
+"""
+Prompt size and LLM latency with and without context packing, on a fixed question set.
+
+Indexes docs/ into a temporary directory (embeddings from the local stub unless --ollama-url is given),
+retrieves top-k hits per question, and builds the RAG context two ways:
+- unpacked: every hit verbatim (the previous behaviour)
+- packed  : adjacent chunks merged, repeated spans removed, capped at --budget tokens
+It reports estimated prompt tokens for both (plus merge/dedup alone, without the budget),
+then times one /api/chat call per prompt.
+Without --ollama-url the chat goes to the stub, whose latency grows with prompt size
+(--prefill-ms-per-1k-chars), so the latency column only illustrates the trend; point it at a
+real Ollama for actual numbers.
+
+Run from the repo root:
+    python -m bench.bench_context_pack --top-k 8 --budget 1800
+    python -m bench.bench_context_pack --ollama-url http://localhost:11434 --model qwen2.5:7b
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+QUESTIONS = [
+    "图书馆的开放时间是什么？",
+    "宿舍报修怎么申请？",
+    "校外怎么用VPN登录资产平台？",
+    "春季高考的录取原则是什么？",
+    "聘期考核的时间安排是怎样的？",
+    "新生入学需要准备哪些材料？",
+    "民法典第1042条规定了什么？",
+    "奖学金评定有哪些条件？",
+    "校园卡丢了怎么办？",
+    "转专业需要满足什么要求？",
+]
+
+
+def _unpacked(hits: list[dict]) -> str:
+    lines = ["【本地资料片段：Embedding RAG TopK】"]
+    for h in hits:
+        lines.append(f"- 来源：{h['source']}#{h['chunk_index']}（score={h['score']:.3f}）")
+        lines.append(h["text"])
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def _packed(hits: list[dict], budget: int) -> tuple[str, dict]:
+    from backend.rag.context_pack import pack_context
+
+    blocks, stats = pack_context(hits, budget)
+    lines = ["【本地资料片段：Embedding RAG TopK】"]
+    for b in blocks:
+        lines.append(f"- 来源：{b.label}（score={b.score:.3f}）")
+        lines.append(b.text)
+        lines.append("")
+    return "\n".join(lines).strip(), stats
+
+
+def _messages(context: str, q: str) -> list[dict]:
+    return [
+        {"role": "system", "content": "你是热心的大学校园生活助手。"},
+        {"role": "user", "content": f"{context}\n\n【用户问题】\n{q}"},
+    ]
+
+
+async def _chat_ms(client, base_url: str, model: str, messages: list[dict]) -> float:
+    t0 = time.perf_counter()
+    r = await client.post(
+        f"{base_url}/api/chat",
+        json={"model": model, "messages": messages, "stream": False, "options": {"num_predict": 64}},
+    )
+    r.raise_for_status()
+    return (time.perf_counter() - t0) * 1000
+
+
+async def _run(args) -> dict:
+    from backend.http_clients import close_clients, get_client
+    from backend.rag.context_pack import estimate_tokens
+    from backend.rag.embedding_index import EmbeddingRagIndex
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_pack_"))
+    try:
+        shutil.copytree(Path(args.docs), tmp / "docs")
+        idx = EmbeddingRagIndex(tmp / "docs", tmp / "rag.sqlite")
+        await idx.reindex()
+        client = get_client("ollama")
+        base_url = os.environ["OLLAMA_BASE_URL"].rstrip("/")
+
+        rows = []
+        for q in QUESTIONS:
+            hits = await idx.search(q, top_k=args.top_k, min_score=args.min_score, min_keyword_hits=1)
+            if not hits:
+                continue
+            raw_ctx = _unpacked(hits)
+            packed_ctx, stats = _packed(hits, args.budget)
+            merged_ctx, _ = _packed(hits, 0)
+            raw_msgs, packed_msgs = _messages(raw_ctx, q), _messages(packed_ctx, q)
+            raw_ms = statistics.median([await _chat_ms(client, base_url, args.model, raw_msgs) for _ in range(args.repeat)])
+            packed_ms = statistics.median(
+                [await _chat_ms(client, base_url, args.model, packed_msgs) for _ in range(args.repeat)]
+            )
+            rows.append(
+                {
+                    "question": q,
+                    "hits": len(hits),
+                    "blocks": stats["blocks"],
+                    "tokens_unpacked": estimate_tokens(raw_ctx),
+                    "tokens_merged_only": estimate_tokens(merged_ctx),
+                    "tokens_packed": estimate_tokens(packed_ctx),
+                    "llm_ms_unpacked": round(raw_ms, 1),
+                    "llm_ms_packed": round(packed_ms, 1),
+                }
+            )
+        idx.close()
+        await close_clients()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    t_raw = sum(r["tokens_unpacked"] for r in rows)
+    t_packed = sum(r["tokens_packed"] for r in rows)
+    t_merged = sum(r["tokens_merged_only"] for r in rows)
+    return {
+        "bench": "context_pack",
+        "llm": args.ollama_url or "stub",
+        "top_k": args.top_k,
+        "budget": args.budget,
+        "questions": len(rows),
+        "tokens_unpacked": t_raw,
+        "tokens_merged_only": t_merged,
+        "tokens_packed": t_packed,
+        "merge_dedup_saved_pct": round(100 * (1 - t_merged / t_raw), 1) if t_raw else None,
+        "tokens_saved_pct": round(100 * (1 - t_packed / t_raw), 1) if t_raw else None,
+        "llm_ms_unpacked_mean": round(statistics.fmean(r["llm_ms_unpacked"] for r in rows), 1) if rows else None,
+        "llm_ms_packed_mean": round(statistics.fmean(r["llm_ms_packed"] for r in rows), 1) if rows else None,
+        "per_question": rows,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", default="docs")
+    ap.add_argument("--top-k", type=int, default=8)
+    ap.add_argument("--budget", type=int, default=1800)
+    ap.add_argument("--min-score", type=float, default=0.0, help="stub embeddings score low; use 0.38 with a real model")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--ollama-url", default="", help="real Ollama for embeddings + chat (default: local stub)")
+    ap.add_argument("--model", default="qwen2.5:7b")
+    ap.add_argument("--prefill-ms-per-1k-chars", type=float, default=150.0, help="stub only")
+    args = ap.parse_args()
+
+    server = None
+    if args.ollama_url:
+        os.environ["OLLAMA_BASE_URL"] = args.ollama_url
+    else:
+        from bench.stub_server import start_stub
+
+        server, _cfg, base_url = start_stub(dim=256, prefill_ms_per_1k_chars=args.prefill_ms_per_1k_chars)
+        os.environ["OLLAMA_BASE_URL"] = base_url
+    try:
+        print(json.dumps(asyncio.run(_run(args)), indent=2, ensure_ascii=False))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
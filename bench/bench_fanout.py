@@ -0,0 +1,176 @@
+"""
+Event-loop lag and throughput with many simultaneous chats, retrieval scoring inline vs. on the scoring threads.
+
+Runs the app in-process (ASGI transport, so the app and the lag probe share one event loop) over a
+synthetic corpus (bench.corpus) with the local stub as the model, and fires --concurrency chats at
+once, --rounds times, in two modes:
+- inline   : RAG_SCORING_THREADS=0, BM25 / mat-vec / fusion run on the event loop
+- offloaded: scoring on the thread pool (RAG_SCORING_THREADS, default min(4, CPUs))
+In both modes the query embedding, BM25 and teacher matching are already issued concurrently.
+A probe task sleeps 5 ms in a loop and records how late it wakes up (event-loop lag): time when no
+other connection's I/O can be served.
+
+Run from the repo root:
+    python -m bench.bench_fanout --chunks 20000 --concurrency 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from bench.bench_context_pack import QUESTIONS
+from bench.bench_load import REPO_ROOT, _free_port, _latency
+from bench.corpus import build_corpus
+
+_PROBE_S = 0.005
+
+
+async def _probe(stop: asyncio.Event, lags_ms: list[float]) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(_PROBE_S)
+        lags_ms.append(max(0.0, (time.perf_counter() - t0 - _PROBE_S) * 1000))
+
+
+async def _mode(client: httpx.AsyncClient, name: str, args) -> dict:
+    lags: list[float] = []
+    latencies: list[float] = []
+    outcomes: dict[str, int] = {}
+
+    async def one(r: int, c: int) -> None:
+        q = f"{QUESTIONS[c % len(QUESTIONS)]}（{name}-{r}-{c}）"
+        t0 = time.perf_counter()
+        resp = await client.post("/api/chat", json={"message": q})
+        latencies.append((time.perf_counter() - t0) * 1000)
+        kind = resp.json().get("type", "?") if resp.status_code == 200 else f"http_{resp.status_code}"
+        outcomes[kind] = outcomes.get(kind, 0) + 1
+
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(stop, lags))
+    t0 = time.perf_counter()
+    for r in range(args.rounds):
+        await asyncio.gather(*(one(r, c) for c in range(args.concurrency)))
+    wall = time.perf_counter() - t0
+    stop.set()
+    await probe
+    return {
+        "mode": name,
+        "requests": len(latencies),
+        "seconds": round(wall, 3),
+        "requests_per_sec": round(len(latencies) / wall, 2),
+        "latency": _latency(latencies),
+        "loop_lag": _latency(lags),
+        "loop_lag_over_50ms": sum(1 for x in lags if x > 50),
+        "outcomes": outcomes,
+    }
+
+
+def _wait_stub(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            httpx.post(f"{base_url}/api/embed", json={"input": ["ping"]}, timeout=2).raise_for_status()
+            return
+        except httpx.HTTPError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+async def _run(args) -> dict:
+    from backend import app as app_module
+    from backend.http_clients import close_clients
+    from backend.rag.embedding_index import _scoring_threads
+
+    res = await app_module.rag_index.reindex()
+    transport = httpx.ASGITransport(app=app_module.app)
+    rows = []
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        await client.post("/api/chat", json={"message": "预热"})
+        for name, threads in (("inline", "0"), ("offloaded", args.threads)):
+            if threads:
+                os.environ["RAG_SCORING_THREADS"] = threads
+            else:
+                os.environ.pop("RAG_SCORING_THREADS", None)
+            row = await _mode(client, name, args)
+            row["scoring_threads"] = _scoring_threads()
+            rows.append(row)
+    app_module.rag_index.close()
+    await close_clients()
+    return {
+        "bench": "fanout",
+        "chunks": res["chunks"],
+        "concurrency": args.concurrency,
+        "rounds": args.rounds,
+        "min_keyword_hits": args.min_keyword_hits,
+        "cpus": os.cpu_count(),
+        "modes": rows,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", default="docs")
+    ap.add_argument("--chunks", type=int, default=20000)
+    ap.add_argument("--concurrency", type=int, default=50)
+    ap.add_argument("--rounds", type=int, default=4)
+    ap.add_argument("--threads", default="", help="RAG_SCORING_THREADS for the offloaded mode (default: min(4, CPUs))")
+    ap.add_argument("--min-keyword-hits", type=int, default=0, help="RAG_MIN_KEYWORD_HITS (0: no keyword filter)")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--chat-ms", type=float, default=100.0, help="stub: generation time per chat call")
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_fanout_"))
+    # The stub runs in its own process: in a thread of this one it would compete for the GIL
+    # and show up as event-loop lag of the app
+    port = _free_port()
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "bench.stub_server", "--port", str(port), "--dim", str(args.dim), "--chat-ms", str(args.chat_ms)],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    build_corpus(Path(args.docs), tmp / "docs", args.chunks, seed=args.seed)
+    # Read when backend.app is imported
+    os.environ.update(
+        {
+            "CAMPUS_DOCS_DIR": str(tmp / "docs"),
+            "CAMPUS_DATA_DIR": str(tmp / "data"),
+            "OLLAMA_BASE_URL": base_url,
+            "LLM_PROVIDER": "ollama",
+            "ANSWER_CACHE_ENABLED": "false",
+            "RAG_MIN_KEYWORD_HITS": str(args.min_keyword_hits),
+            "RAG_MIN_SCORE": "0",
+            # Measure the app, not the generation queue
+            "OLLAMA_MAX_CONCURRENCY": str(args.concurrency),
+            "OLLAMA_MAX_QUEUE": str(args.concurrency * 2),
+            "OLLAMA_MAX_CONNECTIONS": str(args.concurrency * 2),
+            "LOG_LEVEL": "WARNING",
+            "LOG_LLM_IO": "false",
+            "LOG_CHAT_TRACE": "false",
+        }
+    )
+    try:
+        _wait_stub(base_url)
+        result = asyncio.run(_run(args))
+    finally:
+        stub.terminate()
+        stub.wait(timeout=15)
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Latency saved by the shared keep-alive client vs. a fresh httpx.AsyncClient per call.
+
+Starts the local stub server and issues sequential /api/chat calls both ways.
+(Plain HTTP on loopback, so this measures TCP setup + client construction only; TLS
+handshakes to a remote DeepSeek endpoint add considerably more per fresh client.)
+
+Run from the repo root:
+    python -m bench.bench_http_pool --requests 300
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+import httpx
+
+from bench.stub_server import start_stub
+
+
+def _summary(samples: list[float]) -> dict:
+    s = sorted(samples)
+    return {
+        "mean_ms": round(statistics.fmean(s), 3),
+        "p50_ms": round(s[len(s) // 2], 3),
+        "p99_ms": round(s[min(len(s) - 1, int(len(s) * 0.99))], 3),
+    }
+
+
+async def _run(base_url: str, n: int) -> dict:
+    from backend.http_clients import close_clients, get_client
+
+    payload = {"model": "stub", "messages": [{"role": "user", "content": "你好"}], "stream": False}
+
+    fresh: list[float] = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        async with httpx.AsyncClient(timeout=30) as client:
+            (await client.post(f"{base_url}/api/chat", json=payload)).raise_for_status()
+        fresh.append((time.perf_counter() - t0) * 1000)
+
+    pooled: list[float] = []
+    client = get_client("ollama")
+    for _ in range(n):
+        t0 = time.perf_counter()
+        (await client.post(f"{base_url}/api/chat", json=payload)).raise_for_status()
+        pooled.append((time.perf_counter() - t0) * 1000)
+    await close_clients()
+
+    out = {"fresh_client": _summary(fresh), "pooled_client": _summary(pooled)}
+    out["saved_ms_per_request"] = round(out["fresh_client"]["mean_ms"] - out["pooled_client"]["mean_ms"], 3)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="server-side latency added by the stub")
+    args = ap.parse_args()
+    server, _, base_url = start_stub(latency_ms=args.latency_ms)
+    os.environ["OLLAMA_BASE_URL"] = base_url
+    try:
+        res = asyncio.run(_run(base_url, args.requests))
+    finally:
+        server.shutdown()
+    print(json.dumps({"bench": "http_pool", "requests": args.requests, **res}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+End-to-end benchmark suite against the local Ollama stub (no model server needed).
+
+Scenarios (--scenarios, comma separated):
+- reindex : corpus scaled to each --sizes value (bench.corpus), full reindex throughput,
+            then a no-change reindex
+- search  : EmbeddingRagIndex.search latency per corpus size, cold (query embedded by the stub)
+            and warm (query embedding cached, i.e. retrieval work only)
+- chat    : the real app under uvicorn in a subprocess (corpus of --chat-chunks), K concurrent
+            clients posting /api/chat with distinct questions; p50/p99 latency, throughput, outcomes
+
+The stub simulates the model: --embed-ms-per-input per embedded text, --chat-ms per generation.
+Results are printed (and written to --out) as JSON with the commit they were measured on;
+--baseline compares against an earlier result file so regressions show up as percentage changes.
+
+Run from the repo root:
+    python -m bench.bench_load --sizes 1000,5000,20000 --clients 1,8,32 --out bench_load.json
+    python -m bench.bench_load --scenarios search --sizes 20000 --baseline bench_load.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from bench.bench_context_pack import QUESTIONS
+from bench.corpus import build_corpus
+from bench.stub_server import start_stub
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+def _latency(samples_ms: list[float]) -> dict:
+    s = sorted(samples_ms)
+    if not s:
+        return {}
+
+    def pct(p: float) -> float:
+        return round(s[min(len(s) - 1, int(len(s) * p))], 3)
+
+    return {
+        "mean_ms": round(sum(s) / len(s), 3),
+        "p50_ms": pct(0.50),
+        "p90_ms": pct(0.90),
+        "p99_ms": pct(0.99),
+        "max_ms": round(s[-1], 3),
+    }
+
+
+def _dir_bytes(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file()) if path.exists() else 0
+
+
+def _commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+# ---- reindex / search -------------------------------------------------------------------------
+
+
+async def _index_scenarios(args, tmp: Path, stub_cfg, scenarios: set[str]) -> dict:
+    from backend.http_clients import close_clients
+    from backend.rag.embedding_index import EmbeddingRagIndex
+
+    reindex_rows: list[dict] = []
+    search_rows: list[dict] = []
+    for size in args.sizes:
+        docs = tmp / f"corpus_{size}"
+        build_corpus(Path(args.docs), docs, size, seed=args.seed)
+        db = tmp / f"rag_{size}.sqlite"
+        idx = EmbeddingRagIndex(docs, db)
+
+        embedded0 = stub_cfg.embedded
+        requests0 = stub_cfg.requests
+        t0 = time.perf_counter()
+        res = await idx.reindex()
+        full_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        await idx.reindex()
+        noop_s = time.perf_counter() - t0
+        chunks = idx.served_chunks
+
+        if "reindex" in scenarios:
+            reindex_rows.append(
+                {
+                    "chunks": chunks,
+                    "target_chunks": size,
+                    "docs": len(res.get("docs") or []),
+                    "seconds": round(full_s, 3),
+                    "chunks_per_sec": round(chunks / full_s, 1) if full_s > 0 else None,
+                    "embedded_texts": stub_cfg.embedded - embedded0,
+                    "embed_requests": stub_cfg.requests - requests0,
+                    "noop_reindex_seconds": round(noop_s, 3),
+                    "db_bytes": _dir_bytes(db),
+                    "snapshot_bytes": _dir_bytes(idx.snapshot_dir),
+                }
+            )
+
+        if "search" in scenarios:
+            qs = QUESTIONS * max(1, args.queries // len(QUESTIONS))
+            idx.query_cache.clear()
+            cold: list[float] = []
+            for i, q in enumerate(qs):
+                t0 = time.perf_counter()
+                await idx.search(f"{q}（{size}-{i}）", top_k=args.top_k, min_score=0.0)
+                cold.append((time.perf_counter() - t0) * 1000)
+            warm: list[float] = []
+            hits = 0
+            for q in qs:
+                t0 = time.perf_counter()
+                found = await idx.search(q, top_k=args.top_k, min_score=0.0)
+                warm.append((time.perf_counter() - t0) * 1000)
+                hits += len(found)
+            search_rows.append(
+                {
+                    "chunks": chunks,
+                    "target_chunks": size,
+                    "queries": len(qs),
+                    "cold": _latency(cold),
+                    "warm": _latency(warm),
+                    "mean_hits": round(hits / len(qs), 2),
+                }
+            )
+        idx.close()
+    await close_clients()
+    out: dict = {}
+    if "reindex" in scenarios:
+        out["reindex"] = reindex_rows
+    if "search" in scenarios:
+        out["search"] = search_rows
+    return out
+
+
+# ---- concurrent /api/chat ---------------------------------------------------------------------
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _wait_ready(client: httpx.AsyncClient, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"app exited with code {proc.returncode}")
+        try:
+            if (await client.get("/api/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise TimeoutError("app did not become ready")
+
+
+async def _reindex_app(client: httpx.AsyncClient, timeout: float) -> dict:
+    job = (await client.post("/api/rag/reindex")).json()
+    status_url = job["status_url"]
+    deadline = time.monotonic() + timeout
+    while job["state"] in ("queued", "running"):
+        if time.monotonic() > deadline:
+            raise TimeoutError("reindex did not finish")
+        await asyncio.sleep(0.2)
+        job = (await client.get(status_url)).json()
+    if job["state"] != "done":
+        raise RuntimeError(f"reindex {job['state']}: {job.get('error')}")
+    return job
+
+
+async def _chat_clients(client: httpx.AsyncClient, clients: int, per_client: int) -> dict:
+    latencies: list[float] = []
+    outcomes: dict[str, int] = {}
+
+    async def one_client(c: int) -> None:
+        for i in range(per_client):
+            # Distinct questions: identical prompts would be coalesced into one upstream call
+            q = f"{QUESTIONS[(c + i) % len(QUESTIONS)]}（客户端{c}第{i}次）"
+            t0 = time.perf_counter()
+            try:
+                r = await client.post("/api/chat", json={"message": q})
+                kind = r.json().get("type", "?") if r.status_code == 200 else f"http_{r.status_code}"
+            except httpx.HTTPError as e:
+                kind = type(e).__name__
+            latencies.append((time.perf_counter() - t0) * 1000)
+            outcomes[kind] = outcomes.get(kind, 0) + 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one_client(c) for c in range(clients)))
+    wall = time.perf_counter() - t0
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "seconds": round(wall, 3),
+        "requests_per_sec": round(len(latencies) / wall, 2) if wall > 0 else None,
+        **_latency(latencies),
+        "outcomes": outcomes,
+    }
+
+
+async def _chat_scenario(args, tmp: Path, stub_url: str) -> dict:
+    docs = tmp / "corpus_chat"
+    build_corpus(Path(args.docs), docs, args.chat_chunks, seed=args.seed)
+    port = _free_port()
+    env = {
+        **os.environ,
+        "CAMPUS_DOCS_DIR": str(docs),
+        "CAMPUS_DATA_DIR": str(tmp / "app_data"),
+        "OLLAMA_BASE_URL": stub_url,
+        "LLM_PROVIDER": "ollama",
+        # Every request should run the full pipeline
+        "ANSWER_CACHE_ENABLED": "false",
+        "LOG_LEVEL": "WARNING",
+        "LOG_LLM_IO": "false",
+        "LOG_CHAT_TRACE": "false",
+    }
+    log_path = tmp / "app.log"
+    with open(log_path, "wb") as log:
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "backend.app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+            cwd=REPO_ROOT,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    limits = httpx.Limits(max_connections=max(args.clients) + 4, max_keepalive_connections=max(args.clients) + 4)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.request_timeout, limits=limits) as client:
+            await _wait_ready(client, proc, timeout=60)
+            job = await _reindex_app(client, timeout=args.request_timeout * 10)
+            rows = [await _chat_clients(client, k, args.requests_per_client) for k in args.clients]
+            status = (await client.get("/api/rag/status")).json()
+    except Exception:
+        sys.stderr.write(log_path.read_text(encoding="utf-8", errors="ignore")[-4000:])
+        raise
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    return {
+        "chat": {
+            "chunks": status.get("in_memory_chunks"),
+            "reindex_seconds": job.get("seconds"),
+            "chat_ms": args.chat_ms,
+            "runs": rows,
+        }
+    }
+
+
+# ---- baseline comparison ----------------------------------------------------------------------
+
+
+def _numbers(obj, prefix: str = "") -> dict[str, float]:
+    out: dict[str, float] = {}
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            out.update(_numbers(v, f"{prefix}.{k}" if prefix else k))
+    elif isinstance(obj, (int, float)) and not isinstance(obj, bool):
+        out[prefix] = float(obj)
+    return out
+
+
+def _rows_by_key(result: dict) -> dict[str, dict]:
+    # Rows are matched across runs by corpus size / client count, not by position
+    rows: dict[str, dict] = {}
+    for r in result.get("reindex") or []:
+        rows[f"reindex[target={r.get('target_chunks')}]"] = r
+    for r in result.get("search") or []:
+        rows[f"search[target={r.get('target_chunks')}]"] = r
+    for r in (result.get("chat") or {}).get("runs") or []:
+        rows[f"chat[clients={r.get('clients')}]"] = r
+    return rows
+
+
+def compare(new: dict, old: dict) -> dict:
+    """
+    Percentage change of every numeric metric present in both runs (positive = larger in the new run).
+    """
+    old_rows = _rows_by_key(old)
+    out: dict = {"baseline_commit": old.get("commit")}
+    for key, row in _rows_by_key(new).items():
+        if key not in old_rows:
+            continue
+        before = _numbers(old_rows[key])
+        changes = {}
+        for name, v in _numbers(row).items():
+            b = before.get(name)
+            if b:
+                changes[name] = {"old": b, "new": v, "change_pct": round(100 * (v - b) / b, 1)}
+        out[key] = changes
+    return out
+
+
+async def _run(args, stub_cfg, stub_url: str) -> dict:
+    scenarios = set(args.scenarios)
+    tmp = Path(tempfile.mkdtemp(prefix="bench_load_"))
+    result: dict = {
+        "bench": "load",
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "config": {
+            "dim": args.dim,
+            "embed_ms_per_input": args.embed_ms_per_input,
+            "chat_ms": args.chat_ms,
+            "top_k": args.top_k,
+            "embed_batch_size": os.getenv("EMBED_BATCH_SIZE", "32"),
+            "embed_concurrency": os.getenv("EMBED_CONCURRENCY", "4"),
+        },
+    }
+    try:
+        if scenarios & {"reindex", "search"}:
+            result.update(await _index_scenarios(args, tmp, stub_cfg, scenarios))
+        if "chat" in scenarios:
+            result.update(await _chat_scenario(args, tmp, stub_url))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scenarios", default="reindex,search,chat")
+    ap.add_argument("--docs", default="docs")
+    ap.add_argument("--sizes", default="1000,5000,20000", help="corpus sizes in chunks (reindex / search)")
+    ap.add_argument("--queries", type=int, default=100, help="search queries per corpus size")
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--chat-chunks", type=int, default=2000, help="corpus size for the chat scenario")
+    ap.add_argument("--clients", default="1,8,32", help="concurrent chat clients, one run per value")
+    ap.add_argument("--requests-per-client", type=int, default=10)
+    ap.add_argument("--request-timeout", type=float, default=120.0)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--embed-ms-per-input", type=float, default=0.5, help="stub: embedding time per text")
+    ap.add_argument("--chat-ms", type=float, default=200.0, help="stub: generation time per chat call")
+    ap.add_argument("--seed", type=int, default=11)
+    ap.add_argument("--out", default="", help="also write the JSON result to this file")
+    ap.add_argument("--baseline", default="", help="earlier result file to compare against")
+    args = ap.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    args.sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    args.clients = [int(x) for x in args.clients.split(",") if x.strip()]
+
+    server, cfg, base_url = start_stub(dim=args.dim, embed_ms_per_input=args.embed_ms_per_input, chat_ms=args.chat_ms)
+    os.environ["OLLAMA_BASE_URL"] = base_url
+    try:
+        result = asyncio.run(_run(args, cfg, base_url))
+    finally:
+        server.shutdown()
+    if args.baseline:
+        result["vs_baseline"] = compare(result, json.loads(Path(args.baseline).read_text(encoding="utf-8")))
+    text = json.dumps(result, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Memory and accuracy of the int8 snapshot matrix (codes + per-vector scale) against float32.
+
+Fills a real rag.sqlite with synthetic embeddings (the Gaussian-cluster mixture of bench.bench_ann),
+publishes one snapshot generation per mode and runs the same queries through the index's own scoring
+path (min_keyword_hits=0: preselect pool, then the float32 re-rank from sqlite for quantized modes).
+Per mode it reports the vector file bytes, ms/query for the bare matrix scan and for the whole scoring
+step, recall of the preselected pool and of the final top-k against float32, and the score error
+before and after the re-rank.
+
+Run from the repo root:
+    python -m bench.bench_quant --rows 100000 --dim 768
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from bench.bench_ann import synthetic_corpus
+
+
+def _fill(index, matrix: np.ndarray) -> None:
+    with index._tx() as con:
+        con.executemany(
+            "INSERT INTO chunks(source, chunk_index, text, heading, embedding, text_hash) VALUES(?,?,?,?,?,?)",
+            (
+                (f"synthetic_{i // 200:05d}.md", i % 200, f"合成分块 {i}", "", matrix[i].astype("<f4").tobytes(), str(i))
+                for i in range(len(matrix))
+            ),
+        )
+
+
+def _ms(fn, qs: np.ndarray) -> float:
+    t0 = time.perf_counter()
+    for q in qs:
+        fn(q)
+    return (time.perf_counter() - t0) * 1000 / len(qs)
+
+
+def run(rows: int, dim: int, queries: int, k: int, pool_k: int, modes: list[str], seed: int) -> dict:
+    from backend.rag.embedding_index import EmbeddingRagIndex
+    from backend.rag.snapshot import _VECTOR_EXTS
+
+    matrix = synthetic_corpus(rows, dim, clusters=max(8, rows // 500), seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    picks = rng.choice(rows, size=queries, replace=False)
+    qs = matrix[picks] + 0.3 * rng.standard_normal((queries, dim)).astype(np.float32)
+    qs /= np.linalg.norm(qs, axis=1, keepdims=True)
+    # Ground truth straight from the float32 vectors (chunk ids are 1-based row numbers)
+    exact = qs @ matrix.T
+    truth_pool = [set(np.argsort(-s)[:pool_k].tolist()) for s in exact]
+    truth_top = [set(np.argsort(-s)[:k].tolist()) for s in exact]
+    no_lexical = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int32))
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench_quant_"))
+    results = []
+    try:
+        index = EmbeddingRagIndex(tmp / "docs", tmp / "rag.sqlite")
+        _fill(index, matrix)
+        baseline = None
+        for mode in modes:
+            index._set_meta("quantization", mode)
+            snap = index._publish_snapshot("bench")
+            # Everything is in the default collection: one block starting at row 0
+            name = next(iter(snap.collections))
+            disk = sum(snap.path(ext).stat().st_size for ext in _VECTOR_EXTS[mode])
+            # Page the matrix in once, so the timings compare scans of resident memory
+            snap.matrix @ qs[0]
+
+            pool_recall, top_recall, err_before, err_after = [], [], [], []
+            for qi, q in enumerate(qs):
+                rows_found, approx = snap.searchers[name].search(q, pool_k)
+                pool_recall.append(len(truth_pool[qi] & set(rows_found.tolist())) / pool_k)
+                err_before.append(float(np.max(np.abs(approx - exact[qi][rows_found]))))
+                hits = index._score(snap, q, no_lexical, k, 0.0, pool_k, [name])
+                found = [h["chunk_id"] - 1 for h in hits]
+                top_recall.append(len(truth_top[qi] & set(found)) / k)
+                err_after.append(max(abs(h["score"] - float(exact[qi][r])) for h, r in zip(hits, found)))
+
+            scan_ms = _ms(lambda q: snap.matrix @ q, qs)
+            score_ms = _ms(lambda q: index._score(snap, q, no_lexical, k, 0.0, pool_k, [name]), qs)
+            row = {
+                "quantization": mode,
+                "vector_bytes": snap.vector_bytes,
+                "vector_file_bytes": disk,
+                "scan_ms_per_query": round(scan_ms, 3),
+                "score_ms_per_query": round(score_ms, 3),
+                f"pool_recall@{pool_k}": round(float(np.mean(pool_recall)), 4),
+                f"recall@{k}": round(float(np.mean(top_recall)), 4),
+                "max_score_error_before_rerank": round(max(err_before), 6),
+                "max_score_error_after_rerank": round(max(err_after), 6),
+            }
+            if baseline is None:
+                baseline = row
+            row["size_vs_f32"] = round(row["vector_bytes"] / baseline["vector_bytes"], 3)
+            row["scan_speedup_vs_f32"] = round(baseline["scan_ms_per_query"] / max(scan_ms, 1e-9), 2)
+            results.append(row)
+        index.close()
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "bench": "quant",
+        "rows": rows,
+        "dim": dim,
+        "queries": queries,
+        "k": k,
+        "preselect_k": pool_k,
+        "vector_backend": os.getenv("RAG_ANN_BACKEND"),
+        "modes": results,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=100000)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--preselect-k", type=int, default=30)
+    ap.add_argument("--modes", default="f32,int8", help="first one is the baseline")
+    ap.add_argument("--backend", default="exact", help="RAG_ANN_BACKEND for the preselect (exact / ivf)")
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+    os.environ["RAG_ANN_BACKEND"] = args.backend
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    modes = [m.strip() for m in args.modes.split(",") if m.strip()]
+    print(json.dumps(run(args.rows, args.dim, args.queries, args.k, args.preselect_k, modes, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Per-query latency of EmbeddingRagIndex vector scoring across corpus sizes.
+
+Compares the vectorized matrix path (`top_k_cosine`) with the previous
+pure-Python per-chunk cosine loop, and checks that both agree on the top-k.
+
+Run from the repo root:
+    python -m bench.bench_search --sizes 1000,5000,20000 --dim 768
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+
+import numpy as np
+
+from backend.rag.ann import top_k_cosine as _top_k_cosine
+from backend.rag.embedding_index import _normalize_rows, _normalize_vec
+
+
+def _py_cosine(a: list[float], b: list[float]) -> float:
+    # Reference: the original per-chunk implementation
+    dot = sum(x * y for x, y in zip(a, b))
+    na = max(1e-12, sum(x * x for x in a) ** 0.5)
+    nb = max(1e-12, sum(x * x for x in b) ** 0.5)
+    return dot / (na * nb)
+
+
+def _py_top_k(rows: list[list[float]], q: list[float], k: int) -> list[tuple[int, float]]:
+    scored = [(i, _py_cosine(q, r)) for i, r in enumerate(rows)]
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return scored[:k]
+
+
+def run(sizes: list[int], dim: int, queries: int, k: int, py_max: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in sizes:
+        raw = rng.standard_normal((n, dim)).astype(np.float32)
+        matrix = _normalize_rows(raw.copy())
+        qs = rng.standard_normal((queries, dim)).astype(np.float32)
+
+        t0 = time.perf_counter()
+        for q in qs:
+            _top_k_cosine(matrix, _normalize_vec(q), k)
+        np_ms = (time.perf_counter() - t0) * 1000 / queries
+
+        row: dict = {"chunks": n, "dim": dim, "numpy_ms_per_query": round(np_ms, 3)}
+
+        if n <= py_max:
+            rows = raw.tolist()
+            py_qs = random.Random(seed).sample(range(queries), k=min(queries, 3))
+            t0 = time.perf_counter()
+            max_diff = 0.0
+            same_order = True
+            for qi in py_qs:
+                ref = _py_top_k(rows, qs[qi].tolist(), k)
+                idx, scores = _top_k_cosine(matrix, _normalize_vec(qs[qi]), k)
+                same_order = same_order and [i for i, _ in ref] == [int(i) for i in idx]
+                max_diff = max(max_diff, max(abs(s - float(v)) for (_, s), v in zip(ref, scores)))
+            py_ms = (time.perf_counter() - t0) * 1000 / len(py_qs)
+            row.update(
+                {
+                    "python_ms_per_query": round(py_ms, 3),
+                    "speedup": round(py_ms / max(np_ms, 1e-9), 1),
+                    "max_score_diff": max_diff,
+                    "same_top_k_order": same_order,
+                }
+            )
+        results.append(row)
+    return {"bench": "search", "k": k, "queries": queries, "results": results}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1000,5000,20000,100000")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("--k", type=int, default=30)
+    ap.add_argument("--py-max", type=int, default=5000, help="largest corpus to also time with the pure-Python loop")
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+    sizes = [int(x) for x in args.sizes.split(",") if x.strip()]
+    print(json.dumps(run(sizes, args.dim, args.queries, args.k, args.py_max, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+Multi-worker consistency check: N uvicorn workers serving one index while a reindex publishes a new generation.
+
+Starts the app with `uvicorn --workers N` against the local stub, indexes a synthetic corpus, adds a
+document, then fires several concurrent POST /api/rag/reindex (spread over the workers) while K clients
+keep calling /api/rag/status and /api/chat. Checks:
+- every response comes from a worker serving a published generation (never an empty / missing index)
+- all workers agree on the chunk count of each generation, and no worker ever goes back a generation
+- exactly one new generation is published (one writer; the other workers answer 409)
+- every worker switches to the new generation within about RAG_RELOAD_CHECK_SECONDS, without restart
+- no chat request fails during the reindex
+
+Run from the repo root:
+    python -m bench.bench_workers --workers 4 --chunks 3000 --clients 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from bench.bench_context_pack import QUESTIONS
+from bench.bench_load import REPO_ROOT, _free_port, _latency, _wait_ready
+from bench.corpus import build_corpus, source_chunks, write_synthetic
+from bench.stub_server import start_stub
+
+
+async def _settled(client: httpx.AsyncClient, workers: int, timeout: float, min_generation: int = 1) -> dict[int, int]:
+    """
+    Poll until no reindex is running and every worker serves the same generation >= min_generation.
+    """
+    deadline = time.monotonic() + timeout
+    seen: dict[int, int] = {}
+    while time.monotonic() < deadline:
+        st = (await client.get("/api/rag/status")).json()
+        if st["index_writer"] is None and st["cached_docs_fingerprint"] == st["current_docs_fingerprint"]:
+            seen[st["worker_pid"]] = st["generation"] or 0
+            gens = set(seen.values())
+            if len(seen) >= workers and len(gens) == 1 and min(gens) >= min_generation:
+                return seen
+        await asyncio.sleep(0.05)
+    raise TimeoutError(f"workers did not settle: {seen}")
+
+
+async def _observe(client: httpx.AsyncClient, c: int, stop: asyncio.Event, obs: list[dict], chat_ms: list[float]) -> None:
+    i = 0
+    while not stop.is_set():
+        try:
+            st = (await client.get("/api/rag/status")).json()
+            obs.append(
+                {
+                    "t": time.monotonic(),
+                    "pid": st["worker_pid"],
+                    "generation": st["generation"],
+                    "chunks": st["in_memory_chunks"],
+                }
+            )
+        except (httpx.HTTPError, ValueError) as e:
+            obs.append({"t": time.monotonic(), "error": type(e).__name__})
+        t0 = time.perf_counter()
+        try:
+            r = await client.post("/api/chat", json={"message": f"{QUESTIONS[(c + i) % len(QUESTIONS)]}（观察者{c}第{i}次）"})
+            ok = r.status_code == 200 and r.json().get("type") in ("answer", "busy")
+        except (httpx.HTTPError, ValueError):
+            ok = False
+        chat_ms.append((time.perf_counter() - t0) * 1000 if ok else -1.0)
+        i += 1
+
+
+async def _run(args, tmp: Path, stub_url: str) -> dict:
+    docs = tmp / "docs"
+    build_corpus(Path(args.docs), docs, args.chunks, seed=args.seed)
+    port = _free_port()
+    env = {
+        **os.environ,
+        "CAMPUS_DOCS_DIR": str(docs),
+        "CAMPUS_DATA_DIR": str(tmp / "data"),
+        "OLLAMA_BASE_URL": stub_url,
+        "LLM_PROVIDER": "ollama",
+        "ANSWER_CACHE_ENABLED": "false",
+        "RAG_RELOAD_CHECK_SECONDS": str(args.reload_check),
+        "LOG_LEVEL": "WARNING",
+        "LOG_LLM_IO": "false",
+        "LOG_CHAT_TRACE": "false",
+    }
+    log_path = tmp / "app.log"
+    with open(log_path, "wb") as log:
+        proc = subprocess.Popen(
+            [
+                sys.executable, "-m", "uvicorn", "backend.app:app",
+                "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning",
+            ],
+            cwd=REPO_ROOT,
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+    # A fresh connection per request, so requests spread over the workers
+    limits = httpx.Limits(max_keepalive_connections=0)
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=120, limits=limits) as client:
+            await _wait_ready(client, proc, timeout=60)
+            t0 = time.perf_counter()
+            first = await client.post("/api/rag/reindex")
+            first.raise_for_status()
+            before = await _settled(client, args.workers, timeout=600)
+            initial_s = time.perf_counter() - t0
+            gen0 = next(iter(before.values()))
+
+            write_synthetic(docs, source_chunks(Path(args.docs)), 90000, args.add_chunks, random.Random(args.seed + 1))
+
+            stop = asyncio.Event()
+            obs: list[dict] = []
+            chat_ms: list[float] = []
+            observers = [asyncio.create_task(_observe(client, c, stop, obs, chat_ms)) for c in range(args.clients)]
+            await asyncio.sleep(0.5)
+            t_start = time.monotonic()
+            posts = await asyncio.gather(*(client.post("/api/rag/reindex") for _ in range(args.posts)))
+            after = await _settled(client, args.workers, timeout=600, min_generation=gen0 + 1)
+            t_done = time.monotonic()
+            await asyncio.sleep(0.5)
+            stop.set()
+            await asyncio.gather(*observers)
+            final_status = (await client.get("/api/rag/status")).json()
+    except Exception:
+        sys.stderr.write(log_path.read_text(encoding="utf-8", errors="ignore")[-4000:])
+        raise
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    post_outcomes: dict[str, int] = {}
+    for r in posts:
+        key = str(r.status_code) if r.status_code != 202 else ("202_started" if r.json().get("created") else "202_joined")
+        post_outcomes[key] = post_outcomes.get(key, 0) + 1
+
+    good = [o for o in obs if "error" not in o]
+    chunks_by_gen: dict[int, set[int]] = {}
+    last_gen: dict[int, int] = {}
+    regressions = 0
+    switched_at: dict[int, float] = {}
+    gen1 = next(iter(after.values()))
+    for o in sorted(good, key=lambda o: o["t"]):
+        chunks_by_gen.setdefault(o["generation"] or 0, set()).add(o["chunks"])
+        prev = last_gen.get(o["pid"])
+        if prev is not None and (o["generation"] or 0) < prev:
+            regressions += 1
+        last_gen[o["pid"]] = max(prev or 0, o["generation"] or 0)
+        if o["generation"] == gen1 and o["pid"] not in switched_at:
+            switched_at[o["pid"]] = o["t"]
+    first_seen = min(switched_at.values()) if switched_at else None
+
+    checks = {
+        "never_empty": all(o["generation"] and o["chunks"] for o in good),
+        "workers_agree_per_generation": all(len(v) == 1 for v in chunks_by_gen.values()),
+        "no_generation_regression": regressions == 0,
+        "single_new_generation": gen1 == gen0 + 1,
+        "no_request_errors": len(good) == len(obs) and all(ms >= 0 for ms in chat_ms),
+    }
+    return {
+        "bench": "workers",
+        "workers": args.workers,
+        "clients": args.clients,
+        "reload_check_seconds": args.reload_check,
+        "initial_reindex_seconds": round(initial_s, 2),
+        "generations": {"before": gen0, "after": gen1},
+        "chunks": {str(g): sorted(v) for g, v in sorted(chunks_by_gen.items())},
+        "reindex_posts": post_outcomes,
+        "reindex_seconds": round(t_done - t_start, 2),
+        "workers_seen": len(last_gen),
+        "switch_spread_seconds": round(max(switched_at.values()) - first_seen, 2) if switched_at else None,
+        "status_samples": len(obs),
+        "chat": {"requests": len(chat_ms), **_latency([ms for ms in chat_ms if ms >= 0])},
+        "index_writer_after": final_status["index_writer"],
+        "checks": checks,
+        "consistent": all(checks.values()),
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", default="docs")
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--chunks", type=int, default=3000)
+    ap.add_argument("--add-chunks", type=int, default=400, help="size of the document added before the reindex")
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--posts", type=int, default=6, help="concurrent POST /api/rag/reindex")
+    ap.add_argument("--reload-check", type=float, default=1.0, help="RAG_RELOAD_CHECK_SECONDS for the workers")
+    ap.add_argument("--embed-ms-per-input", type=float, default=2.0, help="stub: slows the reindex down")
+    ap.add_argument("--chat-ms", type=float, default=50.0)
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+
+    server, _cfg, base_url = start_stub(dim=256, embed_ms_per_input=args.embed_ms_per_input, chat_ms=args.chat_ms)
+    tmp = Path(tempfile.mkdtemp(prefix="bench_workers_"))
+    try:
+        result = asyncio.run(_run(args, tmp, base_url))
+    finally:
+        server.shutdown()
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if not result["consistent"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Synthetic corpus generator: scales docs/ up to roughly N chunks for benchmarks.
+
+The real documents are copied as-is (plus non-document files such as teachers-ms-shu.json); the rest
+is filled with synthetic markdown files built from the real chunks. Every synthetic section gets its
+own heading and a unique marker sentence, so the text is realistic Chinese prose but no chunk is a
+byte-for-byte duplicate (duplicates would be served from the embedding cache and skew reindex numbers).
+Output is deterministic for a given seed.
+
+Run from the repo root:
+    python -m bench.corpus --chunks 20000 --out /tmp/campus_corpus
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import shutil
+from pathlib import Path
+
+from backend.rag.chunker import DocChunk, chunk_lines
+from backend.rag.ingest import iter_documents, reader_for
+
+# Synthetic files are split so no single document dominates a reindex
+SECTIONS_PER_FILE = 200
+
+
+def source_chunks(docs_dir: Path) -> list[DocChunk]:
+    out: list[DocChunk] = []
+    for p in iter_documents(docs_dir):
+        out.extend(chunk_lines(reader_for(p)(p)))
+    return out
+
+
+def write_synthetic(out_dir: Path, pool: list[DocChunk], file_no: int, sections: int, rng: random.Random) -> Path:
+    """
+    One synthetic markdown file of `sections` sections (about one chunk each) drawn from `pool`.
+    """
+    lines = [f"# 合成资料 {file_no:05d}", ""]
+    for j in range(sections):
+        src = rng.choice(pool)
+        # Keeps the source heading path recognizable; the marker makes the chunk unique
+        title = src.heading.split(" > ")[-1] if src.heading else "资料"
+        lines += [f"## {title}（{file_no}-{j + 1}）", "", f"本节为合成资料第{file_no}份第{j + 1}节。", src.text, ""]
+    path = out_dir / f"synthetic_{file_no:05d}.md"
+    path.write_text("\n".join(lines), encoding="utf-8")
+    return path
+
+
+def build_corpus(docs_dir: Path, out_dir: Path, chunks: int, *, seed: int = 11) -> dict:
+    """
+    Write a corpus of about `chunks` chunks to out_dir (replaced if it exists). Returns a summary;
+    the exact chunk count is whatever the chunker makes of it (reported by reindex).
+    """
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+    for p in sorted(docs_dir.iterdir()):
+        if p.is_file() and not p.name.startswith("."):
+            shutil.copy2(p, out_dir / p.name)
+
+    pool = source_chunks(docs_dir)
+    if not pool:
+        raise ValueError(f"no indexable documents in {docs_dir}")
+    need = max(0, chunks - len(pool))
+    rng = random.Random(seed)
+    files = 0
+    written = 0
+    while written < need:
+        n = min(SECTIONS_PER_FILE, need - written)
+        write_synthetic(out_dir, pool, files + 1, n, rng)
+        files += 1
+        written += n
+    return {
+        "docs_dir": str(out_dir),
+        "source_chunks": len(pool),
+        "synthetic_files": files,
+        "synthetic_sections": written,
+        "target_chunks": chunks,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", default="docs")
+    ap.add_argument("--out", required=True)
+    ap.add_argument("--chunks", type=int, default=20000)
+    ap.add_argument("--seed", type=int, default=11)
+    args = ap.parse_args()
+    print(json.dumps(build_corpus(Path(args.docs), Path(args.out), args.chunks, seed=args.seed), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
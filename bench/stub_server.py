@@ -0,0 +1,182 @@
+"""
+Local stand-in for Ollama / DeepSeek so benchmarks run without a model server.
+
+Endpoints:
+- POST /api/embed          {model, input:[...]}  -> {embeddings:[[...]]}
+- POST /api/embeddings     {model, prompt}       -> {embedding:[...]}
+- POST /api/chat           {model, messages}     -> {message:{role, content}}
+                           (stream=true: NDJSON chunks)
+- POST /chat/completions   {model, messages}     -> {choices:[{message:{role, content}}]}
+                           (stream=true: SSE "data:" chunks, then [DONE])
+
+Embeddings are deterministic (hashed character bigrams), so the same text always maps to the same vector.
+Chat endpoints can simulate prompt processing time proportional to the prompt size (--prefill-ms-per-1k-chars),
+embed endpoints a per-text cost on top of the request latency (--embed-ms-per-input), and
+--chat-ms adds a fixed generation time to chat calls only.
+
+Run standalone:
+    python -m bench.stub_server --port 11435 --latency-ms 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+def stub_embedding(text: str, dim: int) -> list[float]:
+    v = np.zeros(dim, dtype=np.float32)
+    s = text or " "
+    for i in range(max(1, len(s) - 1)):
+        h = int.from_bytes(hashlib.blake2b(s[i : i + 2].encode("utf-8"), digest_size=8).digest(), "little")
+        v[h % dim] += 1.0 if (h >> 32) & 1 else -1.0
+    return v.tolist()
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        dim: int = 768,
+        answer: str = "这是测试回答。请以学校官方通知为准。",
+        token_ms: float = 0.0,
+        prefill_ms_per_1k_chars: float = 0.0,
+        embed_ms_per_input: float = 0.0,
+        chat_ms: float = 0.0,
+    ):
+        self.latency_ms = float(latency_ms)
+        self.dim = int(dim)
+        self.answer = answer
+        self.token_ms = float(token_ms)
+        self.prefill_ms_per_1k_chars = float(prefill_ms_per_1k_chars)
+        self.embed_ms_per_input = float(embed_ms_per_input)
+        self.chat_ms = float(chat_ms)
+        self.requests = 0
+        self.embedded = 0
+        self.lock = threading.Lock()
+
+
+def _make_handler(cfg: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def _send_json(self, status: int, obj: dict) -> None:
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_chunked(self, content_type: str, pieces: list[bytes]) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for piece in pieces:
+                if cfg.token_ms > 0:
+                    time.sleep(cfg.token_ms / 1000.0)
+                self.wfile.write(f"{len(piece):x}\r\n".encode() + piece + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _embed_cost(self, n: int) -> None:
+            with cfg.lock:
+                cfg.embedded += n
+            if cfg.embed_ms_per_input > 0:
+                time.sleep(n * cfg.embed_ms_per_input / 1000.0)
+
+        def do_POST(self) -> None:
+            n = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(n) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": "bad json"})
+                return
+            with cfg.lock:
+                cfg.requests += 1
+            if cfg.latency_ms > 0:
+                time.sleep(cfg.latency_ms / 1000.0)
+            if cfg.prefill_ms_per_1k_chars > 0 and body.get("messages"):
+                chars = sum(len(str(m.get("content") or "")) for m in body["messages"])
+                time.sleep(chars / 1000.0 * cfg.prefill_ms_per_1k_chars / 1000.0)
+            if cfg.chat_ms > 0 and body.get("messages"):
+                time.sleep(cfg.chat_ms / 1000.0)
+
+            if self.path == "/api/embed":
+                inputs = body.get("input") or []
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+                self._embed_cost(len(inputs))
+                self._send_json(200, {"embeddings": [stub_embedding(t, cfg.dim) for t in inputs]})
+            elif self.path == "/api/embeddings":
+                self._embed_cost(1)
+                self._send_json(200, {"embedding": stub_embedding(body.get("prompt") or "", cfg.dim)})
+            elif self.path == "/api/chat" and body.get("stream"):
+                lines = [
+                    json.dumps({"message": {"role": "assistant", "content": ch}, "done": False}, ensure_ascii=False)
+                    for ch in cfg.answer
+                ] + [json.dumps({"message": {"role": "assistant", "content": ""}, "done": True})]
+                self._send_chunked("application/x-ndjson", [(ln + "\n").encode("utf-8") for ln in lines])
+            elif self.path == "/api/chat":
+                self._send_json(200, {"message": {"role": "assistant", "content": cfg.answer}, "done": True})
+            elif self.path == "/chat/completions" and body.get("stream"):
+                events = [
+                    "data: " + json.dumps({"choices": [{"delta": {"content": ch}}]}, ensure_ascii=False)
+                    for ch in cfg.answer
+                ] + ["data: [DONE]"]
+                self._send_chunked("text/event-stream", [(e + "\n\n").encode("utf-8") for e in events])
+            elif self.path == "/chat/completions":
+                self._send_json(200, {"choices": [{"message": {"role": "assistant", "content": cfg.answer}}]})
+            else:
+                self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    return Handler
+
+
+def start_stub(port: int = 0, **kwargs) -> tuple[ThreadingHTTPServer, StubConfig, str]:
+    """
+    Start the stub in a daemon thread. Returns (server, config, base_url); call server.shutdown() when done.
+    """
+    cfg = StubConfig(**kwargs)
+    server = ThreadingHTTPServer(("127.0.0.1", port), _make_handler(cfg))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, cfg, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--token-ms", type=float, default=0.0, help="delay between streamed tokens")
+    ap.add_argument("--prefill-ms-per-1k-chars", type=float, default=0.0, help="simulated prompt processing time")
+    ap.add_argument("--embed-ms-per-input", type=float, default=0.0, help="simulated embedding time per text")
+    ap.add_argument("--chat-ms", type=float, default=0.0, help="simulated generation time per chat call")
+    args = ap.parse_args()
+    cfg = StubConfig(
+        latency_ms=args.latency_ms,
+        dim=args.dim,
+        token_ms=args.token_ms,
+        prefill_ms_per_1k_chars=args.prefill_ms_per_1k_chars,
+        embed_ms_per_input=args.embed_ms_per_input,
+        chat_ms=args.chat_ms,
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), _make_handler(cfg))
+    print(f"stub listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
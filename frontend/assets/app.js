@@ -75,6 +75,136 @@
 
     chatInner.appendChild(wrap);
     scrollToBottom();
+    return bubble;
+  }
+
+  function setBubbleMarkdown(bubble, text, meta) {
+    bubble.innerHTML = renderMarkdownToSafeHtml(text);
+    if (meta) {
+      const small = document.createElement('span');
+      small.className = 'small';
+      small.textContent = meta;
+      bubble.appendChild(small);
+    }
+  }
+
+  function parseSseEvent(block) {
+    let event = 'message';
+    const dataLines = [];
+    block.split('\n').forEach(function (line) {
+      if (line.indexOf('event:') === 0) event = line.slice(6).trim();
+      else if (line.indexOf('data:') === 0) dataLines.push(line.slice(5).replace(/^ /, ''));
+    });
+    let data = {};
+    try {
+      data = dataLines.length ? JSON.parse(dataLines.join('\n')) : {};
+    } catch (e) {
+      data = {};
+    }
+    return { event: event, data: data };
+  }
+
+  async function sendNonStreaming(msg) {
+    const resp = await fetch('/api/chat', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ message: msg })
+    });
+    const data = await resp.json();
+    removeTyping();
+
+    if (data && data.type === 'human') {
+      showModal('人工客服', data.answer || '请联系学长：zhangdreamer@126.com');
+      return;
+    }
+    const answer = (data && data.answer) ? String(data.answer) : '（未获取到答案）';
+    addMessage('ai', answer, `回答于 ${nowTime()}`);
+  }
+
+  async function sendStreaming(msg) {
+    const resp = await fetch('/api/chat/stream', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+      body: JSON.stringify({ message: msg })
+    });
+    if (!resp.ok || !resp.body || !window.TextDecoder) {
+      return sendNonStreaming(msg);
+    }
+
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+    let answer = '';
+    let bubble = null;
+    let sourcesCount = 0;
+    let renderFrame = 0;
+
+    function render(meta) {
+      renderFrame = 0;
+      if (!bubble) return;
+      setBubbleMarkdown(bubble, answer, meta);
+      scrollToBottom();
+    }
+
+    function scheduleRender() {
+      if (renderFrame) return;
+      renderFrame = window.requestAnimationFrame(function () { render(null); });
+    }
+
+    function handle(evt) {
+      if (evt.event === 'human') {
+        removeTyping();
+        showModal('人工客服', evt.data.answer || '请联系学长：zhangdreamer@126.com');
+        return;
+      }
+      if (evt.event === 'meta') {
+        sourcesCount = (evt.data.sources || []).length;
+        return;
+      }
+      if (evt.event === 'token') {
+        if (!bubble) {
+          removeTyping();
+          bubble = addMessage('ai', '', null);
+        }
+        answer += String(evt.data.t || '');
+        scheduleRender();
+        return;
+      }
+      if (evt.event === 'busy') {
+        removeTyping();
+        answer = String(evt.data.answer || '当前提问的同学较多，请稍后再试～');
+        if (!bubble) bubble = addMessage('ai', '', null);
+        return;
+      }
+      if (evt.event === 'error') {
+        removeTyping();
+        answer += (answer ? '\n\n' : '') + String(evt.data.message || '请求失败');
+        if (!bubble) bubble = addMessage('ai', '', null);
+      }
+    }
+
+    while (true) {
+      const chunk = await reader.read();
+      if (chunk.done) break;
+      buffer += decoder.decode(chunk.value, { stream: true }).replace(/\r\n/g, '\n');
+      let idx;
+      while ((idx = buffer.indexOf('\n\n')) >= 0) {
+        const block = buffer.slice(0, idx);
+        buffer = buffer.slice(idx + 2);
+        if (block.trim()) handle(parseSseEvent(block));
+      }
+    }
+    // The last event may end without the blank line: flush the decoder and handle what is left
+    buffer += decoder.decode().replace(/\r\n/g, '\n');
+    if (buffer.trim()) handle(parseSseEvent(buffer));
+
+    // A frame still queued would redraw the bubble without the footer after the final render
+    if (renderFrame) window.cancelAnimationFrame(renderFrame);
+    removeTyping();
+    if (!bubble && !answer) return;
+    if (!bubble) bubble = addMessage('ai', '', null);
+    const refs = sourcesCount ? ` · 参考 ${sourcesCount} 个资料片段` : '';
+    render(`回答于 ${nowTime()}${refs}`);
   }
 
   function addTyping() {
@@ -150,20 +280,7 @@
     addTyping();
 
     try {
-      const resp = await fetch('/api/chat', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: msg })
-      });
-      const data = await resp.json();
-      removeTyping();
-
-      if (data && data.type === 'human') {
-        showModal('人工客服', data.answer || '请联系学长：zhangdreamer@126.com');
-        return;
-      }
-      const answer = (data && data.answer) ? String(data.answer) : '（未获取到答案）';
-      addMessage('ai', answer, `回答于 ${nowTime()}`);
+      await sendStreaming(msg);
     } catch (e) {
       removeTyping();
       addMessage('ai', `请求失败：${String(e)}`, `错误于 ${nowTime()}`);